@@ -0,0 +1,99 @@
+#!/usr/bin/env python2.7
+"""Measure end to end eject makespan against the PV124T simulator.
+
+Ejects the same batch of tapes from a fresh pv124t_simulator.Simulator for every combination of
+rate limiter and eject order, the same way tape_bulk_eject.py's main() does (persistent session,
+MailslotWaiter between tapes). Prints the makespan in device seconds along with how many requests
+the simulator received and how many of them it rejected with 401.
+
+Everything runs `SCALE` times faster than real time so the whole table takes under a minute.
+"""
+
+from __future__ import print_function
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pv124t_simulator import demo_positions, Simulator  # noqa pylint:disable=wrong-import-position
+from tape_bulk_eject import (  # noqa pylint:disable=wrong-import-position
+    AdaptiveRateLimiter, Autoloader, MailslotWaiter, plan_ejects, RateLimiter, Session,
+)
+
+DELAYS = (5, 10, 15)
+ORDERS = {
+    'barcode': (lambda inventory, tapes: sorted(tapes), False),
+    'plan': (plan_ejects, False),
+    'plan+stage': (plan_ejects, True),
+}
+SCALE = 0.01
+TAPES = ('A00000L3', 'A00001L3', 'A00002L3', 'A00003L3', 'A00006L3', 'A00009L3', 'A00010L3')
+
+
+def run(rate_limiter_factory, order, prestage, state_dir, **simulator_kwargs):
+    """Eject TAPES from a fresh simulator.
+
+    :param rate_limiter_factory: Callable taking the host name and state_dir, returning a rate
+        limiter.
+    :param order: Callable taking the inventory and tapes and returning the eject order.
+    :param bool prestage: Move the next tape into the picker while the mailslot is occupied.
+    :param str state_dir: Directory for AdaptiveRateLimiter state files.
+    :param dict simulator_kwargs: Passed to Simulator().
+
+    :return: Simulator instance and makespan in device seconds.
+    :rtype: tuple
+    """
+    simulator = Simulator(demo_positions(), scale=SCALE, **simulator_kwargs)
+    host_name = simulator.serve()
+    try:
+        start = time.time()
+        autoloader = Autoloader(host_name, 'admin', 'password',
+                                rate_limiter_factory(host_name, state_dir), Session(host_name))
+        autoloader.check_creds()
+        autoloader.update_inventory()
+        with MailslotWaiter() as waiter:
+            waiter.MAXIMUM = MailslotWaiter.MAXIMUM * SCALE
+            for tape in order(autoloader.inventory, TAPES):
+                if prestage:
+                    autoloader.stage(tape)
+                waiter.wait(autoloader)
+                autoloader.eject(tape)
+        makespan = (time.time() - start) / SCALE
+        autoloader.session.close()
+    finally:
+        simulator.close()
+    return simulator, makespan
+
+
+def main():
+    """Main function of program."""
+    logging.basicConfig(level=logging.ERROR)
+    limiters = list()
+    for delay in DELAYS:
+        limiters.append(('fixed {}s'.format(delay), lambda h, d, delay=delay: RateLimiter(
+            delay * SCALE, Autoloader.DELAY_ERROR * SCALE)))
+    limiters.append(('adaptive', lambda h, d: AdaptiveRateLimiter(
+        h, Autoloader.DELAY * SCALE, SCALE, 60 * SCALE, os.path.join(d, 'state.json'))))
+
+    print('{:<12} {:<10} {:>10} {:>9} {:>6} {:>7}'.format(
+        'delay', 'order', 'makespan', 'requests', '401s', 'retries'))
+    state_dir = tempfile.mkdtemp()
+    try:
+        for name, factory in limiters:
+            for order in sorted(ORDERS):
+                simulator, makespan = run(factory, ORDERS[order][0], ORDERS[order][1], state_dir,
+                                          drive_lock_seconds=60)
+                print('{:<12} {:<10} {:>9.0f}s {:>9} {:>6} {:>7}'.format(
+                    name, order, makespan, simulator.requests, simulator.unauthorized,
+                    simulator.failed_moves))
+    finally:
+        shutil.rmtree(state_dir)
+
+
+if __name__ == '__main__':
+    main()
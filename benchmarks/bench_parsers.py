@@ -0,0 +1,150 @@
+#!/usr/bin/env python2.7
+"""Compare commands.html parser backends (TapePos vs TapePosRegex).
+
+Parses each page with every backend the same way Autoloader.update_inventory() does (fed in
+Autoloader.CHUNK_SIZE chunks) and prints the best time of several runs. Also verifies both backends
+produce the same inventory.
+
+Pages benchmarked:
+* Any commands.html files captured from a real autoloader given on the command line.
+* Every inventory page in any cassettes (*.jsonl) recorded with tape_bulk_eject.py --record.
+* A page modeled after the 124T's commands.html (16 slots, drive, picker, mailslot).
+* Synthetic pages for libraries with hundreds of slots.
+"""
+
+from __future__ import print_function
+
+import functools
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tape_bulk_eject import Autoloader, Cassette, PARSERS  # noqa pylint:disable=wrong-import-position
+
+REPEAT = 5
+
+TEMPLATE = """<html>
+<head>
+<title>Dell PowerVault 124T - Commands</title>
+<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">
+<link rel="stylesheet" href="style.css" type="text/css">
+<script language="JavaScript" type="text/javascript">
+function from_to(pos) {{
+    var form = document.forms['move'];
+    if (form.from.value == '') {{ form.from.value = pos; }} else {{ form.to.value = pos; }}
+}}
+</script>
+</head>
+<body bgcolor="#FFFFFF" leftmargin="0" topmargin="0" marginwidth="0" marginheight="0">
+<table width="100%" border="0" cellspacing="0" cellpadding="0">
+{nav}
+</table>
+<form name="move" method="post" action="move.cgi">
+<center>
+<table border="0" cellspacing="2" cellpadding="0"><tr>
+{slots}
+</tr></table>
+</center>
+<input type="hidden" name="from" value=""><input type="hidden" name="to" value="">
+<input type="submit" name="submit" value="submit">
+</form>
+{footer}
+</body>
+</html>
+"""
+
+
+def slot_html(position, tape):
+    """Render one <img /> tag the way the autoloader does.
+
+    :param str position: Position in from_to() (e.g. 'slot1' or 'drive').
+    :param str tape: Barcode or 'Empty'.
+
+    :return: HTML.
+    :rtype: str
+    """
+    image = 'empty.gif' if tape == 'Empty' else 'tape.gif'
+    return ('<td align="center" class="slot"><img src="images/{}" width="24" height="60" '
+            'border="0" title="{}" onClick="from_to({})" style="cursor: pointer"></td>\n').format(
+                image, tape, position)
+
+
+def page(slots):
+    """Build a commands.html page.
+
+    :param int slots: Number of storage slots.
+
+    :return: HTML.
+    :rtype: str
+    """
+    html = list()
+    for i in range(1, slots + 1):
+        html.append(slot_html('slot{}'.format(i), 'Empty' if i % 5 == 0 else '{:05d}FA'.format(i)))
+    html.append(slot_html('drive', 'A{:05d}L3'.format(slots + 1)))
+    html.append(slot_html('picker', 'Empty'))
+    html.append(slot_html('mailslot', 'A{:05d}L3'.format(slots + 2)))
+    nav = '\n'.join('<tr><td class="nav"><a href="page{0}.html">Page {0}</a></td></tr>'.format(i)
+                    for i in range(40))
+    footer = '\n'.join('<p class="footer">Status line {}</p>'.format(i) for i in range(40))
+    return TEMPLATE.format(nav=nav, slots=''.join(html), footer=footer)
+
+
+def parse(parser_class, html):
+    """Parse a page like Autoloader.update_inventory() does.
+
+    :param parser_class: TapePos or TapePosRegex.
+    :param str html: Page to parse.
+
+    :return: Inventory.
+    :rtype: dict
+    """
+    inventory = dict()
+    parser = parser_class(inventory)
+    for i in range(0, len(html), Autoloader.CHUNK_SIZE):
+        parser.feed(html[i:i + Autoloader.CHUNK_SIZE])
+        if parser.done:
+            break
+    return inventory
+
+
+def main(paths):
+    """Main function of program.
+
+    :param list paths: Captured commands.html files or cassettes to benchmark too.
+    """
+    pages = list()
+    for path in paths:
+        if path.endswith('.jsonl'):
+            interactions = Cassette(path, replay=True).interactions
+            for i, interaction in enumerate(interactions):
+                if interaction['status'] == 200 and interaction['path'] != '/config_ops.html':
+                    name = '{} #{}'.format(os.path.basename(path), i)
+                    pages.append((name, interaction['body'].encode('latin-1')))
+            continue
+        with open(path) as handle:
+            pages.append((os.path.basename(path), handle.read()))
+    pages.append(('124T-like (16 slots)', page(16)))
+    for slots in (100, 500, 1000):
+        pages.append(('synthetic ({} slots)'.format(slots), page(slots)))
+
+    backends = sorted(PARSERS)
+    print('{:<24} {:>9} {:>7} '.format('page', 'bytes', 'tapes') +
+          ' '.join('{:>10}'.format(b + ' ms') for b in backends) + '  speedup')
+    for name, html in pages:
+        inventories = [parse(PARSERS[b], html) for b in backends]
+        if any(i != inventories[0] for i in inventories):
+            raise AssertionError('Backends disagree on {}'.format(name))
+        number = max(1, 20000 // len(html))
+        times = list()
+        for backend in backends:
+            timer = timeit.Timer(functools.partial(parse, PARSERS[backend], html))
+            times.append(min(timer.repeat(REPEAT, number)) / number * 1000)
+        print('{:<24} {:>9} {:>7} '.format(name, len(html), len(inventories[0])) +
+              ' '.join('{:>10.3f}'.format(t) for t in times) +
+              '  {:>6.1f}x'.format(times[backends.index('html')] / times[backends.index('regex')]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
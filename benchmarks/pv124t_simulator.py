@@ -0,0 +1,316 @@
+#!/usr/bin/env python2.7
+"""Local stand-in for the PowerVault 124T web interface.
+
+Serves commands.html, config_ops.html, and move.cgi like the real autoloader so tape_bulk_eject.py
+can be exercised end to end without hardware. Models:
+* Move latency (picker, slot, or drive source) plus a penalty for switching magazines.
+* One move at a time. The HTTP response to move.cgi is sent after the move finishes.
+* Mailslot occupancy. A simulated operator removes a tape some time after it lands in the mailslot
+  and inserts the next tape to import some time after it's emptied.
+* Drive locks. Tapes in the drive can't be moved until the drive unlocks.
+* 401 rate limiting. commands.html and move.cgi requests arriving too soon after the previous one,
+  any request during a move, and requests with bad credentials get HTTP 401 like the real device.
+
+All durations are in device seconds and multiplied by `scale` so benchmarks can run faster than
+real time.
+
+Run directly to serve a demo inventory: python pv124t_simulator.py [port]
+"""
+
+from __future__ import print_function
+
+import base64
+import BaseHTTPServer
+import os
+import SocketServer
+import sys
+import threading
+import time
+import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parsers import slot_html, TEMPLATE  # noqa pylint:disable=wrong-import-position
+from tape_bulk_eject import MAGAZINE_SIZE, MOVE_SECONDS  # noqa pylint:disable=wrong-import-position
+
+POSITIONS = dict(drive=17, mailslot=18, picker=19)
+SLOTS = 16
+
+
+class Simulator(object):
+    """Simulated autoloader state machine.
+
+    :ivar list arrivals: Tapes the operator inserts into the empty mailslot, in order.
+    :ivar str auth: Expected Authorization header.
+    :ivar float drive_unlock: Device time when the drive unlocks.
+    :ivar list ejected: Tapes the operator removed from the mailslot, in order.
+    :ivar int failed_moves: Number of move.cgi requests that didn't move anything.
+    :ivar float magazine_seconds: Extra move latency when switching magazines.
+    :ivar float mailslot_since: Device time the current mailslot tape arrived.
+    :ivar float min_interval: 401 requests arriving sooner than this after the previous one.
+    :ivar dict move_seconds: Move latency by source ('drive', 'picker', or 'slot').
+    :ivar int moves: Number of successful moves.
+    :ivar float operator_seconds: How long the operator takes to empty the mailslot.
+    :ivar dict positions: Tape barcodes by position (1-16, 17 drive, 18 mailslot, 19 picker).
+    :ivar int requests: Number of HTTP requests received.
+    :ivar float scale: Multiply all durations by this.
+    :ivar int trips: Number of times the operator emptied and/or refilled the mailslot.
+    :ivar int unauthorized: Number of HTTP 401 responses sent.
+    """
+
+    def __init__(self, positions, user_name='admin', pass_word='password', scale=1.0,
+                 min_interval=5, operator_seconds=20, drive_lock_seconds=0, magazine_seconds=15,
+                 move_seconds=None, arrivals=None):
+        """Constructor.
+
+        :param dict positions: Tape barcodes by position number (1-16, 17 drive, 19 picker).
+        :param str user_name: HTTP username to accept.
+        :param str pass_word: HTTP password to accept.
+        :param float scale: Multiply all durations by this (e.g. 0.01 runs 100x faster).
+        :param float min_interval: 401 requests arriving sooner than this after the previous one.
+        :param float operator_seconds: How long the operator takes to empty the mailslot.
+        :param float drive_lock_seconds: The drive stays locked this long after starting.
+        :param float magazine_seconds: Extra move latency when switching magazines.
+        :param dict move_seconds: Move latency by source. Defaults to MOVE_SECONDS.
+        :param list arrivals: Tapes the operator inserts into the empty mailslot, in order.
+        """
+        self.arrivals = list(arrivals or ())
+        self.auth = 'Basic {}'.format(base64.standard_b64encode(':'.join((user_name, pass_word))))
+        self.drive_unlock = drive_lock_seconds
+        self.ejected = list()
+        self.failed_moves = 0
+        self.magazine_seconds = magazine_seconds
+        self.mailslot_since = 0.0
+        self.min_interval = min_interval
+        self.move_seconds = move_seconds or MOVE_SECONDS
+        self.moves = 0
+        self.operator_seconds = operator_seconds
+        self.positions = dict(positions)
+        self.requests = 0
+        self.scale = scale
+        self.trips = 0
+        self.unauthorized = 0
+
+        self._inserted = set()
+        self._last_magazine = None
+        self._last_request = None
+        self._lock = threading.Lock()
+        self._moving = False
+        self._server = None
+        self._start = time.time()
+
+    def now(self):
+        """Device time since the simulator started.
+
+        :return: Seconds.
+        :rtype: float
+        """
+        return (time.time() - self._start) / self.scale
+
+    def operator(self):
+        """Empty and/or refill the mailslot if the operator had enough time to get to it.
+
+        Ejected tapes are swapped for the next arrival in the same trip.
+        """
+        mailslot = POSITIONS['mailslot']
+        if self.now() - self.mailslot_since < self.operator_seconds:
+            return
+        if self.positions.get(mailslot) in self._inserted:
+            return  # Leave tapes to import alone.
+        if mailslot in self.positions:
+            self.ejected.append(self.positions.pop(mailslot))
+        elif not self.arrivals:
+            return
+        if self.arrivals:
+            self.positions[mailslot] = self.arrivals.pop(0)
+            self._inserted.add(self.positions[mailslot])
+        self.mailslot_since = self.now()
+        self.trips += 1
+
+    def render(self):
+        """Build commands.html from current positions.
+
+        :return: HTML.
+        :rtype: str
+        """
+        html = list()
+        for position in range(1, SLOTS + 1):
+            tape = self.positions.get(position, 'Empty')
+            html.append(slot_html('slot{}'.format(position), tape))
+        for name in ('drive', 'picker', 'mailslot'):
+            html.append(slot_html(name, self.positions.get(POSITIONS[name], 'Empty')))
+        return TEMPLATE.format(nav='', slots=''.join(html), footer='')
+
+    def move(self, source, destination):
+        """Move a tape. Blocks for the move's duration (scaled).
+
+        :param int source: Position number to move from.
+        :param int destination: Position number to move to.
+
+        :return: If the tape moved.
+        :rtype: bool
+        """
+        with self._lock:
+            self.operator()
+            tape = self.positions.get(source)
+            if not tape or destination in self.positions:
+                return False
+            if source == POSITIONS['drive'] and self.now() < self.drive_unlock:
+                return False
+            if source == POSITIONS['drive']:
+                latency = self.move_seconds['drive']
+            elif source == POSITIONS['picker']:
+                latency = self.move_seconds['picker']
+            else:
+                latency = self.move_seconds['slot']
+                slot = source if source <= SLOTS else destination
+                magazine = (slot - 1) // MAGAZINE_SIZE
+                if self._last_magazine is not None and magazine != self._last_magazine:
+                    latency += self.magazine_seconds
+                self._last_magazine = magazine
+            self._moving = True
+        time.sleep(latency * self.scale)
+        with self._lock:
+            self._moving = False
+            self.moves += 1
+            self.positions[destination] = self.positions.pop(source)
+            if POSITIONS['mailslot'] in (source, destination):
+                self.mailslot_since = self.now()
+        return True
+
+    def handle(self, method, path, headers, body):
+        """Handle one HTTP request.
+
+        :param str method: 'GET' or 'POST'.
+        :param str path: Request path (e.g. '/commands.html').
+        :param dict headers: Request headers.
+        :param str body: POST data.
+
+        :return: HTTP status code and response body.
+        :rtype: tuple
+        """
+        with self._lock:
+            self.requests += 1
+            now = self.now()
+            too_soon = False
+            if path != '/config_ops.html':  # Only the robot pages are rate limited.
+                last, self._last_request = self._last_request, now
+                too_soon = last is not None and now - last < self.min_interval
+            if headers.get('Authorization') != self.auth or too_soon or self._moving:
+                self.unauthorized += 1
+                return 401, '<html><body>401 Unauthorized</body></html>'
+            self.operator()
+        if path == '/config_ops.html':
+            return 200, '<html><body>Configuration</body></html>'
+        if path == '/commands.html' and method == 'GET':
+            return 200, self.render()
+        if path == '/move.cgi' and method == 'POST':
+            query = urlparse.parse_qs(body)
+            try:
+                source, destination = int(query['from'][0]), int(query['to'][0])
+            except (KeyError, ValueError):
+                return 400, '<html><body>Bad Request</body></html>'
+            if not self.move(source, destination):
+                with self._lock:
+                    self.failed_moves += 1
+            with self._lock:
+                self._last_request = self.now()  # Rate limit counts from the end of the move.
+                self.operator()
+            return 200, self.render()
+        return 404, '<html><body>Not Found</body></html>'
+
+    def serve(self, port=0):
+        """Start the HTTP server in a background thread.
+
+        :param int port: TCP port to listen on. Random if 0.
+
+        :return: Host name and port for Autoloader (e.g. '127.0.0.1:8080').
+        :rtype: str
+        """
+        simulator = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            """Forwards requests to the simulator. Keep-alive like the real device."""
+
+            protocol_version = 'HTTP/1.1'
+
+            def respond(self, method):
+                """Send the simulator's response.
+
+                :param str method: 'GET' or 'POST'.
+                """
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else ''
+                status, html = simulator.handle(method, self.path, self.headers, body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(html)))
+                self.end_headers()
+                self.wfile.write(html)
+
+            def do_GET(self):  # noqa pylint:disable=invalid-name
+                """Handle GET."""
+                self.respond('GET')
+
+            def do_POST(self):  # noqa pylint:disable=invalid-name
+                """Handle POST."""
+                self.respond('POST')
+
+            def log_message(self, *_):
+                """Silence request logging."""
+
+        class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            """One thread per connection so a blocked move doesn't block other clients."""
+
+            daemon_threads = True
+
+        self._server = Server(('127.0.0.1', port), Handler)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return '127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def close(self):
+        """Stop the HTTP server."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def demo_positions():
+    """A mostly full autoloader with a tape in the drive.
+
+    Barcodes alternate between magazines (slot 1 A00001L3, slot 9 A00002L3, slot 2 A00003L3, ...)
+    like a library whose tapes have been shuffled around over time.
+
+    :return: Tape barcodes by position number.
+    :rtype: dict
+    """
+    positions = dict()
+    for i in range(1, SLOTS + 1):
+        if i % 4:
+            magazine, distance = divmod(i - 1, MAGAZINE_SIZE)
+            positions[i] = 'A{:05d}L3'.format(distance * 2 + magazine + 1)
+    positions[POSITIONS['drive']] = 'A00000L3'
+    return positions
+
+
+def main(port):
+    """Main function of program.
+
+    :param int port: TCP port to listen on.
+    """
+    simulator = Simulator(demo_positions())
+    host_name = simulator.serve(port)
+    print('Serving demo inventory on http://{}/ (user admin, pass password)'.format(host_name))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    simulator.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8124)
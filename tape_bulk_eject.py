@@ -16,19 +16,46 @@ from __future__ import print_function
 
 import argparse
 import base64
-import HTMLParser
+import bisect
+import collections
+import contextlib
+import errno
+import fcntl
+import fnmatch
+import hashlib
+import httplib
+import itertools
 import json
 import logging
+import math
 import os
+import Queue
+import random
 import re
+import select
 import signal
+import socket
+import SocketServer
+import stat
+import StringIO
 import sys
+import threading
 import time
+import types
 import urllib2
 
 __author__ = '@Robpol86'
 __license__ = 'MIT'
 
+GLOB_CHARS = '*?['
+MAGAZINE_SIZE = 8
+MOVE_SECONDS = dict(drive=90, picker=10, slot=30)
+
+Move = collections.namedtuple('Move', 'tape source destination')
+Readable = collections.namedtuple('Readable', 'sock')
+Sleep = collections.namedtuple('Sleep', 'seconds')
+TapeResult = collections.namedtuple('TapeResult', 'tape status source seconds reason')
+
 
 class HandledError(Exception):
     """Raised on a handled error Causes exit code 1.
@@ -46,223 +73,3114 @@ class AutoloaderError(Exception):
     and even rate limiting.
     """
 
-    pass
+    pass
+
+
+class Cancelled(Exception):
+    """Thrown into a coroutine waiting on Sleep or Readable when its Task is cancelled."""
+
+    pass
+
+
+class RetryError(Exception):
+    """Raised when the retry policy gives up on a tape. The rest of the batch can go on.
+
+    :ivar str failure: Last failure ('unauthorized', 'drive_locked', or 'not_moved').
+    :ivar str reason: Why the retry policy gave up.
+    :ivar str tape: The tape.
+    """
+
+    def __init__(self, tape, failure, reason):
+        """Constructor.
+
+        :param str tape: The tape.
+        :param str failure: Last failure ('unauthorized', 'drive_locked', or 'not_moved').
+        :param str reason: Why the retry policy gave up.
+        """
+        super(RetryError, self).__init__(tape, failure, reason)
+        self.failure = failure
+        self.reason = reason
+        self.tape = tape
+
+
+class LockoutError(RetryError):
+    """Raised when the autoloader refuses every request (locked out or invalid credentials).
+
+    Unlike other RetryErrors the rest of the batch can't go on, every tape would fail the same way.
+    """
+
+    pass
+
+
+class Return(Exception):
+    """Raised by a coroutine to return a value. Python 2.7 generators can't return values.
+
+    :ivar value: The return value.
+    """
+
+    def __init__(self, value=None):
+        """Constructor.
+
+        :param value: The return value.
+        """
+        super(Return, self).__init__(value)
+        self.value = value
+
+
+class InfoFilter(logging.Filter):
+    """Filter out non-info and non-debug logging statements.
+
+    From: https://stackoverflow.com/questions/16061641/python-logging-split/16066513#16066513
+    """
+
+    def filter(self, record):
+        """Filter method.
+
+        :param record: Log record object.
+
+        :return: Keep or ignore this record.
+        :rtype: bool
+        """
+        return record.levelno <= logging.INFO
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as JSON lines for log shippers.
+
+    :cvar tuple EXTRA: Record attributes included when set through logging's `extra` argument.
+    """
+
+    EXTRA = ('host', 'request_id')
+
+    def format(self, record):
+        """Format method.
+
+        :param record: Log record object.
+
+        :return: One JSON object.
+        :rtype: str
+        """
+        entry = dict(time=record.created, level=record.levelname, logger=record.name,
+                     message=record.getMessage())
+        for key in self.EXTRA:
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, sort_keys=True)
+
+
+class Payload(object):
+    """Summary of a device payload for debug logs: size, SHA-1 digest, and an optional excerpt.
+
+    Only hashed when the log record is emitted, not when debug logging is disabled.
+
+    :ivar str data: The payload.
+    :ivar int excerpt: Include up to this many bytes of the payload itself.
+    """
+
+    def __init__(self, data, excerpt=0):
+        """Constructor.
+
+        :param str data: The payload.
+        :param int excerpt: Include up to this many bytes of the payload itself.
+        """
+        self.data = data
+        self.excerpt = excerpt
+
+    def __str__(self):
+        """Format the summary.
+
+        :return: E.g. "1234 byte(s) (sha1 0123456789ab)".
+        :rtype: str
+        """
+        summary = '{} byte(s) (sha1 {})'.format(len(self.data),
+                                                hashlib.sha1(self.data).hexdigest()[:12])
+        if self.excerpt and self.data:
+            cut = '...' if len(self.data) > self.excerpt else ''
+            summary += ': {!r}{}'.format(self.data[:self.excerpt], cut)
+        return summary
+
+
+class Inventory(object):
+    """Tape positions of one autoloader, indexed both ways.
+
+    Behaves like a dict of tape barcodes to positions ('1' through '16', 'drive', 'mailslot', or
+    'picker') but also keeps an array of tapes by position so tape_at() and mailslot are O(1)
+    instead of scanning values(). A position holds one tape: setting a tape to an occupied position
+    evicts the tape that was there.
+
+    :cvar tuple NAMED: Positions that aren't numbered slots. Indexed before the slots.
+
+    :ivar list positions: Tape (or None) by position index. Grows as needed for large libraries.
+    :ivar dict tapes: Position by tape.
+    """
+
+    __slots__ = ('positions', 'tapes')
+    NAMED = ('drive', 'mailslot', 'picker')
+
+    def __init__(self, tapes=None):
+        """Constructor.
+
+        :param dict tapes: Initial tape positions.
+        """
+        self.positions = [None] * (len(self.NAMED) + 16)
+        self.tapes = dict()
+        if tapes:
+            self.update(tapes)
+
+    def __contains__(self, tape):
+        """If the tape is in the autoloader."""
+        return tape in self.tapes
+
+    def __delitem__(self, tape):
+        """Remove a tape."""
+        self.positions[self.index(self.tapes.pop(tape))] = None
+
+    def __eq__(self, other):
+        """Compare tape positions with another Inventory or dict."""
+        return self.tapes == (other.tapes if isinstance(other, Inventory) else other)
+
+    def __getitem__(self, tape):
+        """Position of a tape."""
+        return self.tapes[tape]
+
+    def __iter__(self):
+        """Iterate tapes."""
+        return iter(self.tapes)
+
+    def __len__(self):
+        """Number of tapes."""
+        return len(self.tapes)
+
+    def __ne__(self, other):
+        """Opposite of __eq__()."""
+        return not self == other
+
+    def __repr__(self):
+        """Represent like a dict."""
+        return 'Inventory({!r})'.format(self.tapes)
+
+    def __setitem__(self, tape, position):
+        """Put a tape in a position."""
+        index = self.index(position)
+        if index >= len(self.positions):
+            self.positions.extend([None] * (index + 1 - len(self.positions)))
+        if tape in self.tapes:
+            self.positions[self.index(self.tapes[tape])] = None
+        evicted = self.positions[index]
+        if evicted is not None and evicted != tape:
+            del self.tapes[evicted]
+        self.positions[index] = tape
+        self.tapes[tape] = position
+
+    @classmethod
+    def index(cls, position):
+        """Array index of a position.
+
+        :param str position: Slot number or named position (e.g. '3' or 'drive').
+
+        :return: Index into self.positions.
+        :rtype: int
+        """
+        if position in cls.NAMED:
+            return cls.NAMED.index(position)
+        return len(cls.NAMED) - 1 + int(position)
+
+    @property
+    def mailslot(self):
+        """Tape in the mailslot or None."""
+        return self.positions[1]
+
+    def clear(self):
+        """Remove all tapes."""
+        self.positions = [None] * len(self.positions)
+        self.tapes.clear()
+
+    def get(self, tape, default=None):
+        """Position of a tape or default if not in the autoloader."""
+        return self.tapes.get(tape, default)
+
+    def items(self):
+        """List of (tape, position) tuples."""
+        return self.tapes.items()
+
+    def keys(self):
+        """List of tapes."""
+        return self.tapes.keys()
+
+    def match(self, patterns):
+        """Find tapes matching shell-style patterns (e.g. '0001*' or '000[12]?FA').
+
+        Builds one sorted index of barcodes per call and only tests the tapes sharing each
+        pattern's literal prefix, so every pattern is resolved against the same snapshot.
+
+        :param iter patterns: fnmatch patterns.
+
+        :return: Matching tapes by pattern.
+        :rtype: dict
+        """
+        barcodes = sorted(self.tapes)
+        matches = dict()
+        for pattern in patterns:
+            prefix = re.split('[{}]'.format(re.escape(GLOB_CHARS)), pattern, 1)[0]
+            found = matches[pattern] = list()
+            for tape in itertools.islice(barcodes, bisect.bisect_left(barcodes, prefix), None):
+                if not tape.startswith(prefix):
+                    break
+                if fnmatch.fnmatchcase(tape, pattern):
+                    found.append(tape)
+        return matches
+
+    def pop(self, tape, *default):
+        """Remove a tape and return its position."""
+        if tape not in self.tapes:
+            return self.tapes.pop(tape, *default)
+        position = self.tapes[tape]
+        del self[tape]
+        return position
+
+    def tape_at(self, position):
+        """Tape in a position.
+
+        :param str position: Slot number or named position (e.g. '3' or 'drive').
+
+        :return: Tape barcode or None if empty.
+        :rtype: str
+        """
+        index = self.index(position)
+        return self.positions[index] if index < len(self.positions) else None
+
+    def update(self, tapes):
+        """Put tapes in positions.
+
+        :param dict tapes: Tape positions.
+        """
+        for tape, position in tapes.items():
+            self[tape] = position
+
+    def values(self):
+        """List of occupied positions."""
+        return self.tapes.values()
+
+    def diff(self, tapes):
+        """Compare with a newer snapshot.
+
+        :param dict tapes: Newer tape positions (Inventory or dict).
+
+        :return: Sorted Move tuples. Source is None for new tapes, destination for removed tapes.
+        :rtype: list
+        """
+        old, new = self.tapes, tapes
+        return sorted(Move(t, old.get(t), new.get(t)) for t in set(old).union(new)
+                      if old.get(t) != new.get(t))
+
+    def replace(self, tapes):
+        """Update to a newer snapshot, only touching positions that changed.
+
+        :param dict tapes: Newer tape positions (Inventory or dict).
+
+        :return: Moves applied, from diff().
+        :rtype: list
+        """
+        moves = self.diff(tapes)
+        for move in moves:
+            if move.source is not None:
+                del self[move.tape]
+        for move in moves:
+            if move.destination is not None:
+                self[move.tape] = move.destination
+        return moves
+
+
+class TapePosHandler(object):
+    """Handles tags found in commands.html and gets current tape positions.
+
+    Shared by all parser backends so they produce the same inventory and errors. Meant to be fed
+    the HTML in chunks as it's received. Everything after </center> is irrelevant so callers should
+    stop feeding once done is True.
+
+    :cvar RE_ONCLICK: <img /> onclick attribute parser (e.g. onClick="from_to(mailslot)").
+
+    :ivar bool done: If </center> was seen. Nothing left to parse.
+    :ivar bool in_center_tag: If parser is within <center /> on the page. There's only one.
+    :ivar dict inventory: Populates this with the current inventory parsed from HTML.
+    :ivar bool matched: If any <img /> onclick attribute matched RE_ONCLICK. Else invalid HTML.
+    """
+
+    RE_ONCLICK = re.compile(r'from_to\((?:slot(\d+)|(drive|picker|mailslot))\)')
+
+    def __init__(self, inventory):
+        """Constructor."""
+        self.done = False
+        self.in_center_tag = False
+        self.inventory = inventory
+        self.matched = False
+
+    def handle_starttag(self, tag, attrs):
+        """Called on all starting tags.
+
+        :param str tag: Current HTML tag (e.g. 'center' or 'img').
+        :param list attrs: List of attributes (key value pairs) on this HTML tag.
+        """
+        if self.done:
+            return
+        if tag == 'center':
+            self.in_center_tag = True
+        elif tag == 'img':
+            attributes = dict(attrs)
+            if not self.matched and self.RE_ONCLICK.search(attributes.get('onclick') or ''):
+                self.matched = True
+            if self.in_center_tag and 'onclick' in attributes and 'title' in attributes:
+                self.update_slot(attributes)
+
+    def handle_endtag(self, tag):
+        """Called on all ending/closing tags.
+
+        :param str tag: Current HTML tag (e.g. 'center' or 'img').
+        """
+        if tag == 'center':
+            self.in_center_tag = False
+            self.done = True
+
+    def update_slot(self, attrs):
+        """Update self.inventory with current state of a single slot.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+
+        :param dict attrs: Attributes of <img /> tag representing a slot.
+        """
+        onclick, tape = attrs['onclick'], attrs['title']
+        if tape == 'Empty':
+            return
+        try:
+            slot = [i for i in self.RE_ONCLICK.match(onclick).groups() if i][0]
+        except AttributeError:
+            logger = logging.getLogger('TapePos.update_slot')
+            logger.error('Attribute "onclick" in img tag is invalid: %s', onclick)
+            raise HandledError
+        self.inventory[tape] = slot
+
+
+class TapePos(TapePosHandler):
+    """Parses commands.html with the standard library's HTMLParser. Slow but thorough.
+
+    HTMLParser is only imported when this backend is used since TapePosRegex is the default.
+
+    :ivar parser: HTMLParser.HTMLParser instance calling back into this handler.
+    """
+
+    def __init__(self, inventory):
+        """Constructor."""
+        from HTMLParser import HTMLParser
+        TapePosHandler.__init__(self, inventory)
+        self.parser = HTMLParser()
+        self.parser.handle_starttag = self.handle_starttag
+        self.parser.handle_endtag = self.handle_endtag
+
+    def feed(self, data):
+        """Parse the next chunk of HTML.
+
+        :param str data: HTML chunk.
+        """
+        self.parser.feed(data)
+
+
+class TapePosRegex(TapePosHandler):
+    """Parses commands.html by only scanning for <center> and <img> tags.
+
+    Much faster than TapePos since all text and every other tag is skipped by a single compiled
+    regex instead of being tokenized. Comments, <script>, and <style> are skipped like HTMLParser
+    does. Attributes are only parsed for <img> tags.
+
+    :cvar RE_ATTR: Attribute parser (e.g. title="00001FA" or onClick='from_to(slot1)').
+    :cvar RE_TOKEN: Matches a comment/script/style to skip, <center>, </center>, <img>, or an
+        incomplete one of those at the end of the buffer (waits for the next chunk).
+
+    :ivar str buffer: Unparsed HTML. Only an incomplete tag, comment, script, or style.
+    """
+
+    RE_ATTR = re.compile(
+        r'([^\s/>"\'=][^\s/>=]*)(\s*=+\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]*)))?'
+    )
+    RE_TOKEN = re.compile(
+        r'<!--.*?-->|<(script|style)\b.*?</(?:script|style)\s*>'
+        r'|<(/?)(center|img)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>'
+        r'|<!--|<(?:script|style)\b|<(?:[^>"\']|"[^"]*"|\'[^\']*\')*(?:"[^"]*|\'[^\']*)?\Z',
+        re.DOTALL | re.IGNORECASE
+    )
+
+    def __init__(self, inventory):
+        """Constructor."""
+        super(TapePosRegex, self).__init__(inventory)
+        self.buffer = ''
+
+    def feed(self, data):
+        """Parse the next chunk of HTML. Same interface as HTMLParser.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+
+        :param str data: Next chunk of HTML.
+        """
+        html = self.buffer + data
+        keep_from = len(html)
+        for match in self.RE_TOKEN.finditer(html):
+            skipped, closing, tag = match.group(1, 2, 3)
+            if tag is None:
+                if not skipped and not match.group().endswith('-->'):
+                    keep_from = match.start()  # Incomplete, wait for the next chunk.
+                    break
+                continue
+            tag = tag.lower()
+            if closing:
+                self.handle_endtag(tag)
+                if self.done:
+                    break
+            elif tag == 'img':
+                self.handle_starttag(tag, self.parse_attrs(match.group(4)))
+            else:
+                self.handle_starttag(tag, [])
+        self.buffer = html[keep_from:]
+
+    def parse_attrs(self, text):
+        """Parse tag attributes the same way HTMLParser does.
+
+        :param str text: Everything between the tag name and the closing >.
+
+        :return: List of attributes (key value pairs). Value is None for attributes without one.
+        :rtype: list
+        """
+        attrs = [(n.lower(), (d or s or b) if e else None)
+                 for n, e, d, s, b in self.RE_ATTR.findall(text)]
+        if '&' in text:
+            from HTMLParser import HTMLParser
+            unescape = HTMLParser().unescape
+            attrs = [(n, unescape(v) if v and '&' in v else v) for n, v in attrs]
+        return attrs
+
+
+PARSERS = dict(html=TapePos, regex=TapePosRegex)
+
+
+class Task(object):
+    """One coroutine scheduled on an EventLoop.
+
+    Coroutines are generators. They yield Sleep(seconds) or Readable(sock) to wait, another
+    coroutine to run it and get what it raises with Return, or None to let other tasks run.
+    Exceptions propagate up to the coroutine that yielded the failed one like regular calls.
+
+    :ivar bool done: If the coroutine finished (returned, raised, or was cancelled).
+    :ivar Exception exception: What the coroutine raised, if anything.
+    :ivar result: What the coroutine raised with Return.
+    :ivar sock: Socket the coroutine is waiting on, if any.
+    :ivar list stack: Running coroutines, the innermost last.
+    :ivar float wake: Unix time the coroutine is sleeping until (None if waiting on sock).
+    """
+
+    def __init__(self, coroutine):
+        """Constructor.
+
+        :param coroutine: Generator to run.
+        """
+        self.done = False
+        self.exception = None
+        self.result = None
+        self.sock = None
+        self.stack = [coroutine]
+        self.wake = 0.0
+        self._send = (None, None)
+
+    def cancel(self):
+        """Throw Cancelled into the coroutine instead of waiting for its Sleep or Readable."""
+        if not self.done:
+            self._send = (None, Cancelled())
+            self.sock, self.wake = None, 0.0
+
+    def step(self):
+        """Run the coroutine until it waits on something or finishes."""
+        value, exception = self._send
+        self._send = (None, None)
+        while self.stack:
+            try:
+                if exception is None:
+                    yielded = self.stack[-1].send(value)
+                else:
+                    yielded = self.stack[-1].throw(exception)
+            except StopIteration:
+                self.stack.pop()
+                value, exception = None, None
+                continue
+            except Return as exc:
+                self.stack.pop()
+                value, exception = exc.value, None
+                continue
+            except Exception as exc:  # pylint: disable=broad-except
+                self.stack.pop()
+                value, exception = None, exc
+                continue
+            value, exception = None, None
+            if isinstance(yielded, types.GeneratorType):
+                self.stack.append(yielded)
+            elif isinstance(yielded, Readable):
+                self.sock, self.wake = yielded.sock, None
+                return
+            else:
+                self.wake = time.time() + (yielded.seconds if yielded else 0)
+                return
+        self.done = True
+        self.result, self.exception = value, exception
+
+
+class EventLoop(object):
+    """Runs coroutines concurrently in one thread, waiting on sockets and timers with select().
+
+    Lets one process drive many autoloaders and other tasks (e.g. status reporting) without
+    threads. The blocking API runs each call in its own EventLoop (see run_until_complete()).
+
+    :ivar list tasks: Tasks that haven't finished yet.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.tasks = list()
+
+    def spawn(self, coroutine):
+        """Schedule a coroutine.
+
+        :param coroutine: Generator to run.
+
+        :return: Task instance.
+        :rtype: Task
+        """
+        task = Task(coroutine)
+        self.tasks.append(task)
+        return task
+
+    def run(self, until=None):
+        """Run tasks until every task (or just `until`) is done.
+
+        :param Task until: Stop once this task is done.
+        """
+        while self.tasks and not (until and until.done):
+            for task in [t for t in self.tasks if t.sock is None and t.wake <= time.time()]:
+                task.step()
+            self.tasks = [t for t in self.tasks if not t.done]
+            if not self.tasks or (until and until.done):
+                break
+            waiting = [t for t in self.tasks if t.sock is not None]
+            wakes = [t.wake for t in self.tasks if t.sock is None]
+            timeout = max(0, min(wakes) - time.time()) if wakes else None
+            if not waiting:
+                time.sleep(timeout)
+                continue
+            try:
+                readable = select.select([t.sock for t in waiting], [], [], timeout)[0]
+            except select.error as exc:
+                if exc.args[0] != errno.EINTR:  # Signals interrupt select() in Python 2.7.
+                    raise
+                continue
+            for task in waiting:
+                if task.sock in readable:
+                    task.sock, task.wake = None, 0.0
+
+    def run_until_complete(self, coroutine):
+        """Run a coroutine (and any other tasks) until it's done.
+
+        :param coroutine: Generator to run.
+
+        :return: What the coroutine raised with Return. Re-raises anything else it raised.
+        """
+        task = self.spawn(coroutine)
+        self.run(until=task)
+        if task.exception is not None:
+            raise task.exception  # pylint: disable=raising-bad-type
+        return task.result
+
+
+class RateLimiter(object):
+    """Fixed delays between queries. The conservative choice, never learns anything.
+
+    With a state file the delays are shared with other processes querying the same autoloader
+    (e.g. a cron job and an operator). Each query holds an exclusive lock on STATE_FILE.lock from
+    the delay before it until it's done, and last_access is saved to the state file for the next
+    process in line. Other processes poll the lock every POLL seconds.
+
+    :cvar float POLL: Number of seconds between attempts to take the lock from another process.
+
+    :ivar float delay: Number of seconds to wait between queries.
+    :ivar float delay_error: Number of seconds to wait after an error from the autoloader.
+    :ivar float gap: Number of seconds between the previous access and the last query.
+    :ivar float last_access: Unix time of last HTTP query or reply, whichever came last.
+    :ivar str lock_file: Lock shared with other processes. Delays aren't shared if None.
+    :ivar str state_file: JSON file last_access (and other state) is shared through.
+    """
+
+    POLL = 1.0
+
+    def __init__(self, delay, delay_error, state_file=None):
+        """Constructor.
+
+        :param float delay: Number of seconds to wait between queries.
+        :param float delay_error: Number of seconds to wait after an error from the autoloader.
+        :param str state_file: Share delays with other processes through this file.
+        """
+        self.delay = delay
+        self.delay_error = delay_error
+        self.gap = 0.0
+        self.last_access = time.time() - delay
+        self.lock_file = '{}.lock'.format(state_file) if state_file else None
+        self.state_file = state_file
+        self._lock = None
+
+    def acquire(self):
+        """Take the lock shared with other processes and load the last_access they saved.
+
+        :return: False if another process holds the lock. True if taken or not sharing.
+        :rtype: bool
+        """
+        if self.lock_file is None or self._lock is not None:
+            return True
+        logger = logging.getLogger('RateLimiter.acquire')
+        try:
+            handle = open(self.lock_file, 'a')
+        except IOError as exc:
+            logger.warning('Failed to open %s, not sharing delays: %s', self.lock_file, str(exc))
+            self.lock_file = None
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as exc:
+            handle.close()
+            if exc.errno in (errno.EACCES, errno.EAGAIN):
+                return False
+            logger.warning('Failed to lock %s, not sharing delays: %s', self.lock_file, str(exc))
+            self.lock_file = None
+            return True
+        self._lock = handle
+        self.load_state(self.read_state())
+        return True
+
+    def release(self):
+        """Save last_access for other processes, release the lock. Call when the query is done."""
+        if self._lock is None:
+            return
+        try:
+            self.write_state(last_access=self.last_access)
+        finally:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+            self._lock.close()
+            self._lock = None
+
+    def read_state(self):
+        """Read the state file. Ignores missing/corrupt files.
+
+        :return: State saved by this or other processes.
+        :rtype: dict
+        """
+        logger = logging.getLogger('RateLimiter.read_state')
+        try:
+            with open(self.state_file) as handle:
+                state = json.load(handle)
+        except (IOError, ValueError) as exc:
+            logger.debug('Not loading %s: %s', self.state_file, str(exc))
+            return dict()
+        return state if isinstance(state, dict) else dict()
+
+    def load_state(self, state):
+        """Apply state saved by other processes.
+
+        :param dict state: From read_state().
+        """
+        try:
+            self.last_access = max(self.last_access, float(state.get('last_access', 0)))
+        except (TypeError, ValueError):
+            pass
+
+    def write_state(self, **values):
+        """Atomically update keys in the state file, keeping the others.
+
+        :param dict values: Keys and values to save.
+
+        :return: If the file was written.
+        :rtype: bool
+        """
+        logger = logging.getLogger('RateLimiter.write_state')
+        state = self.read_state()
+        state.update(values)
+        try:
+            atomic_write(self.state_file, json.dumps(state, sort_keys=True))
+        except (IOError, OSError) as exc:
+            logger.warning('Failed to write %s: %s', self.state_file, str(exc))
+            return False
+        return True
+
+    def wait(self):
+        """Sleep until the next query is allowed and update last_access.
+
+        When sharing delays this also takes the lock. Call release() once the query is done.
+
+        :return: Number of seconds slept.
+        :rtype: float
+        """
+        return EventLoop().run_until_complete(self.wait_async())
+
+    def wait_async(self):
+        """Coroutine version of wait(). Other tasks keep running while this one sleeps.
+
+        :raise Return: Number of seconds slept.
+        """
+        logger = logging.getLogger('RateLimiter.wait')
+        slept = 0.0
+        try:
+            while True:
+                sleep_for = max(0, self.delay - (time.time() - self.last_access))
+                if sleep_for:
+                    logger.debug('Sleeping for %d second(s).', sleep_for)
+                    yield Sleep(sleep_for)
+                    logger.debug('Done sleeping.')
+                    slept += sleep_for
+                if self._lock is not None or self.lock_file is None:
+                    break
+                # Sleep without the lock first so other processes that are ready can go first.
+                # Once taken, check again in case another process queried in the meantime.
+                if not self.acquire():
+                    logger.debug('Another process is querying the autoloader, waiting.')
+                    yield Sleep(self.POLL)
+                    slept += self.POLL
+        except BaseException:  # Cancelled (or closed) while sleeping with the lock.
+            self.release()
+            raise
+        self.gap = time.time() - self.last_access
+        self.last_access = time.time()
+        logger.debug('Set last_access to %f', self.last_access)
+        raise Return(slept)
+
+    def replied(self):
+        """Called when the autoloader finished replying (accepted or not).
+
+        Delays count from here too since move.cgi only replies once the move is done.
+        """
+        self.last_access = time.time()
+
+    def success(self):
+        """Called after the autoloader accepted a query."""
+        pass
+
+    def failure(self):
+        """Called after the autoloader replied with HTTP 401."""
+        pass
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """Learns the smallest safe delay between queries for a single autoloader.
+
+    Shrinks the delay after a streak of successful queries and backs off multiplicatively on HTTP
+    401 replies. Only queries sent about the delay after the previous one count towards the
+    streak, a query after a long idle gap (e.g. polling the mailslot) proves nothing. After an
+    error it waits as long as the (backed off) delay. The learned delay is saved to a per-host
+    state file every time it changes (Control+C exits immediately) and loaded on the next run,
+    and before every query since other processes share it.
+
+    :cvar float BACKOFF: Multiply the delay by this on every failure.
+    :cvar float SHRINK: Multiply the delay by this after STREAK successful queries in a row.
+    :cvar int STREAK: Number of successful queries in a row before shrinking the delay.
+    :cvar float TOLERANCE: Successful queries only count if the gap was at most delay times this.
+
+    :ivar str host_name: Hostname or IP address of the autoloader.
+    :ivar float maximum: Never back off further than this many seconds.
+    :ivar float minimum: Never shrink the delay below this many seconds.
+    :ivar int streak: Current number of successful queries in a row.
+    """
+
+    BACKOFF = 2.0
+    SHRINK = 0.8
+    STREAK = 3
+    TOLERANCE = 1.5
+
+    def __init__(self, host_name, delay, minimum=1, maximum=60, state_file=None):
+        """Constructor.
+
+        :param str host_name: Hostname or IP address of the autoloader.
+        :param float delay: Initial delay if nothing was learned in a previous run.
+        :param float minimum: Never shrink the delay below this many seconds.
+        :param float maximum: Never back off further than this many seconds.
+        :param str state_file: Override default state file path (~/.pv124t_state_HOST.json).
+        """
+        state_file = state_file or state_path('state', host_name)
+        super(AdaptiveRateLimiter, self).__init__(delay, delay, state_file)
+        self.host_name = host_name
+        self.maximum = maximum
+        self.minimum = minimum
+        self.streak = 0
+        self.load()
+
+    def load(self):
+        """Load the previously learned delay from the state file. Ignores missing/corrupt files."""
+        logger = logging.getLogger('AdaptiveRateLimiter.load')
+        try:
+            with open(self.state_file) as handle:
+                delay = float(json.load(handle)['delay'])
+        except (IOError, KeyError, TypeError, ValueError) as exc:
+            logger.debug('Not loading %s: %s', self.state_file, str(exc))
+            return
+        self.delay = self.delay_error = min(self.maximum, max(self.minimum, delay))
+        logger.debug('Loaded delay %f from %s', self.delay, self.state_file)
+
+    def load_state(self, state):
+        """Also pick up the delay other processes learned.
+
+        :param dict state: From read_state().
+        """
+        super(AdaptiveRateLimiter, self).load_state(state)
+        try:
+            delay = float(state['delay'])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.delay = self.delay_error = min(self.maximum, max(self.minimum, delay))
+
+    def success(self):
+        """Shrink the delay after enough successful queries in a row."""
+        logger = logging.getLogger('AdaptiveRateLimiter.success')
+        if self.gap > self.delay * self.TOLERANCE:
+            logger.debug('Not counting, %f second gap is much longer than the delay.', self.gap)
+            return
+        self.streak += 1
+        if self.streak < self.STREAK:
+            return
+        self.streak = 0
+        self.delay = self.delay_error = max(self.minimum, self.delay * self.SHRINK)
+        logger.debug('Shrunk delay to %f', self.delay)
+        self.save()
+
+    def failure(self):
+        """Back off multiplicatively."""
+        logger = logging.getLogger('AdaptiveRateLimiter.failure')
+        self.streak = 0
+        self.delay = self.delay_error = min(self.maximum, self.delay * self.BACKOFF)
+        logger.debug('Backed off delay to %f', self.delay)
+        self.save()
+
+    def save(self):
+        """Atomically write the learned delay to the state file."""
+        logger = logging.getLogger('AdaptiveRateLimiter.save')
+        if self.write_state(delay=self.delay):
+            logger.debug('Saved delay %f to %s', self.delay, self.state_file)
+
+
+class RetryPolicy(object):
+    """Decides how long to wait before retrying a failed move and when to give up on a tape.
+
+    Delays grow exponentially from the rate limiter's delay_error and are randomly shortened by up
+    to `jitter` so retries don't line up with the autoloader's rate limit window. The defaults
+    never give up, like before.
+
+    :ivar int attempts: Give up on a tape after this many failed attempts. Unlimited if None.
+    :ivar float deadline: Give up on tapes this many seconds after the batch started.
+    :ivar float factor: Multiply the delay by this after each failed attempt.
+    :ivar float jitter: Randomly shorten each delay by up to this fraction.
+    :ivar float maximum: Never wait longer than this many seconds between attempts.
+    :ivar float started: Unix time the batch started.
+    :ivar float tape_deadline: Give up on a tape this many seconds after its first attempt.
+    """
+
+    def __init__(self, attempts=None, tape_deadline=None, deadline=None, factor=2.0, jitter=0.25,
+                 maximum=300):
+        """Constructor.
+
+        :param int attempts: Give up on a tape after this many failed attempts.
+        :param float tape_deadline: Give up on a tape this many seconds after its first attempt.
+        :param float deadline: Give up on tapes this many seconds after the batch started (now).
+        :param float factor: Multiply the delay by this after each failed attempt.
+        :param float jitter: Randomly shorten each delay by up to this fraction.
+        :param float maximum: Never wait longer than this many seconds between attempts.
+        """
+        self.attempts = attempts
+        self.deadline = deadline
+        self.factor = factor
+        self.jitter = jitter
+        self.maximum = maximum
+        self.started = time.time()
+        self.tape_deadline = tape_deadline
+
+    @property
+    def expired(self):
+        """If the batch deadline passed. No new tapes should be started.
+
+        :rtype: bool
+        """
+        return self.deadline is not None and time.time() - self.started >= self.deadline
+
+    def delay(self, base, attempt):
+        """Number of seconds to wait before the next attempt.
+
+        :param float base: Delay after the first failure (e.g. RateLimiter.delay_error).
+        :param int attempt: Number of failed attempts so far (1 or more).
+
+        :return: Seconds.
+        :rtype: float
+        """
+        delay = min(self.maximum, base * self.factor ** (attempt - 1))
+        return delay * (1 - random.uniform(0, self.jitter))
+
+    def give_up(self, attempt, since, delay):
+        """Decide if a tape should be given up on instead of waiting and retrying.
+
+        :param int attempt: Number of failed attempts so far.
+        :param float since: Unix time of the first attempt.
+        :param float delay: Seconds until the next attempt (from delay()).
+
+        :return: Why to give up, None to retry.
+        :rtype: str
+        """
+        retry_at = time.time() + delay
+        if self.attempts is not None and attempt >= self.attempts:
+            return 'failed {} time{}'.format(attempt, '' if attempt == 1 else 's')
+        if self.tape_deadline is not None and retry_at - since > self.tape_deadline:
+            return 'tape deadline of {} seconds reached'.format(self.tape_deadline)
+        if self.deadline is not None and retry_at - self.started > self.deadline:
+            return 'batch deadline of {} seconds reached'.format(self.deadline)
+        return None
+
+
+class Session(object):
+    """Sends all requests over one persistent HTTP/1.1 connection to the autoloader.
+
+    The autoloader's embedded web server is slow to accept connections. Reconnects transparently
+    (resending the request once) if the autoloader closed the connection. Raises the same
+    exceptions as urllib2.urlopen() so callers handle errors the same way.
+
+    :cvar int DRAIN_LIMIT: Reconnect instead of reading more than this many unread body bytes.
+
+    :ivar connection: httplib.HTTPConnection instance or None if not connected.
+    :ivar float connect_seconds: Total time spent establishing connections.
+    :ivar int connects: Number of connections established.
+    :ivar str host_name: Hostname or IP address of the autoloader.
+    :ivar int reconnects: Number of times the autoloader closed an established connection.
+    :ivar int requests: Number of requests sent.
+    :ivar response: Last httplib.HTTPResponse. Drained before the next request.
+    """
+
+    DRAIN_LIMIT = 64 * 1024
+
+    def __init__(self, host_name):
+        """Constructor.
+
+        :param str host_name: Hostname or IP address of the autoloader.
+        """
+        self.connection = None
+        self.connect_seconds = 0.0
+        self.connects = 0
+        self.host_name = host_name
+        self.reconnects = 0
+        self.requests = 0
+        self.response = None
+
+    @property
+    def saved_seconds(self):
+        """Estimated number of seconds saved by reusing connections instead of reconnecting.
+
+        :rtype: float
+        """
+        if not self.connects:
+            return 0.0
+        return self.connect_seconds / self.connects * (self.requests - self.connects)
+
+    def close(self):
+        """Close the connection."""
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = self.response = None
+
+    def connect(self):
+        """Establish a new connection.
+
+        :raise urllib2.URLError: On connection errors.
+        """
+        logger = logging.getLogger('Session.connect')
+        self.close()
+        start_time = time.time()
+        connection = httplib.HTTPConnection(self.host_name)
+        try:
+            connection.connect()
+        except (httplib.HTTPException, socket.error) as exc:
+            raise urllib2.URLError(exc)
+        self.connect_seconds += time.time() - start_time
+        self.connects += 1
+        self.connection = connection
+        logger.debug('Connected to %s in %f second(s).', self.host_name, time.time() - start_time)
+
+    def drain(self):
+        """Read the rest of the last response so the connection can be reused.
+
+        Closes the connection instead if too much (or an unknown amount) of the body is left.
+        """
+        logger = logging.getLogger('Session.drain')
+        response = self.response
+        if response is None or response.isclosed():
+            return
+        if response.length is None or response.length > self.DRAIN_LIMIT:
+            logger.debug('Not draining %s byte(s), closing connection.', response.length)
+            self.close()
+            return
+        response.read()
+
+    def open(self, request):
+        """Send a request and get the response. Drop-in replacement for urllib2.urlopen.
+
+        :raise urllib2.HTTPError: On non-200 HTTP status codes.
+        :raise urllib2.URLError: On connection errors.
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+
+        :return: Response with a read() method.
+        """
+        return EventLoop().run_until_complete(self.open_async(request))
+
+    def open_async(self, request):
+        """Coroutine version of open(). Other tasks keep running while waiting on the response.
+
+        move.cgi only responds once the move is done so that's where nearly all the time goes.
+
+        :raise urllib2.HTTPError: On non-200 HTTP status codes.
+        :raise urllib2.URLError: On connection errors.
+        :raise Return: Response with a read() method.
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+        """
+        logger = logging.getLogger('Session.open')
+        self.drain()
+        reused = self.connection is not None
+        if not reused:
+            self.connect()
+        headers = dict(request.header_items())
+        try:
+            response = yield self._send(request, headers)
+        except (httplib.HTTPException, socket.error) as exc:
+            if not reused:
+                raise urllib2.URLError(exc)
+            logger.debug('Connection closed by autoloader (%s), reconnecting.', str(exc))
+            self.reconnects += 1
+            self.connect()
+            try:
+                response = yield self._send(request, headers)
+            except (httplib.HTTPException, socket.error) as exc:
+                self.close()
+                raise urllib2.URLError(exc)
+        self.requests += 1
+        if response.will_close:
+            self.connection = None
+        self.response = response
+        if response.status != 200:
+            raise urllib2.HTTPError(request.get_full_url(), response.status, response.reason,
+                                    response.msg, None)
+        raise Return(response)
+
+    def _send(self, request, headers):
+        """Send a request over the current connection. Coroutine, waits for the response.
+
+        :raise Return: httplib.HTTPResponse instance.
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+        :param dict headers: Request headers.
+        """
+        self.connection.request(request.get_method(), request.get_selector(), request.get_data(),
+                                headers)
+        yield Readable(self.connection.sock)
+        raise Return(self.connection.getresponse())
+
+
+class Cassette(object):
+    """Records HTTP traffic with the autoloader to a file, or replays it instead of the autoloader.
+
+    Drop-in replacement for Session. Each request/response pair is saved as one JSON line with how
+    long the autoloader took to respond. Credentials (headers) aren't saved. Replays must send the
+    same requests in the same order, which they do if the program behaves the same.
+
+    :ivar list interactions: Recorded or loaded request/response pairs (dicts).
+    :ivar str path: Cassette file path.
+    :ivar int position: Next interaction to replay.
+    :ivar bool replay: Serve responses from the file instead of sending requests.
+    :ivar float speed: Replay this many times faster than recorded. 0 doesn't wait at all.
+    :ivar Session transport: Send recorded requests through this. Uses urllib2.urlopen() if None.
+    """
+
+    def __init__(self, path, replay=False, speed=1.0, transport=None):
+        """Constructor.
+
+        :raise IOError: If the file can't be read or written.
+        :raise ValueError: If the file to replay isn't a cassette.
+
+        :param str path: Cassette file path. Overwritten when recording.
+        :param bool replay: Serve responses from the file instead of sending requests.
+        :param float speed: Replay this many times faster than recorded. 0 doesn't wait at all.
+        :param Session transport: Send recorded requests through this.
+        """
+        self.interactions = list()
+        self.path = path
+        self.position = 0
+        self.replay = replay
+        self.speed = speed
+        self.transport = transport
+        self._handle = None
+        self._start = time.time()
+        if replay:
+            with open(path) as handle:
+                self.interactions = [json.loads(line) for line in handle if line.strip()]
+        else:
+            self._handle = open(path, 'w')
+
+    def close(self):
+        """Close the file and the transport."""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if self.transport is not None:
+            self.transport.close()
+
+    def open(self, request):
+        """Send (or replay) a request and get the response. Drop-in replacement for urlopen.
+
+        :raise urllib2.HTTPError: On non-200 HTTP status codes.
+        :raise urllib2.URLError: On connection errors or if the replay went off script.
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+
+        :return: Response with a read() method.
+        """
+        return EventLoop().run_until_complete(self.open_async(request))
+
+    def open_async(self, request):
+        """Coroutine version of open().
+
+        :raise urllib2.HTTPError: On non-200 HTTP status codes.
+        :raise urllib2.URLError: On connection errors or if the replay went off script.
+        :raise Return: Response with a read() method.
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+        """
+        expected = dict(method=request.get_method(), path=request.get_selector(),
+                        data=request.get_data())
+        if self.replay:
+            interaction = yield self._replay(expected)
+        else:
+            interaction = yield self._record(request, expected)
+        url, status = request.get_full_url(), interaction['status']
+        if status == 'error':
+            raise urllib2.URLError(interaction['body'])
+        if status != 200:
+            raise urllib2.HTTPError(url, status, '', None, None)
+        raise Return(StringIO.StringIO(interaction['body'].encode('latin-1')))
+
+    def _record(self, request, interaction):
+        """Send a request and save the response. Coroutine.
+
+        :raise Return: The saved interaction.
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+        :param dict interaction: Request fields to save the response with.
+        """
+        start = time.time()
+        try:
+            if self.transport is not None:
+                response = yield self.transport.open_async(request)
+            else:
+                response = urllib2.urlopen(request)
+            status, body = 200, response.read()
+        except urllib2.HTTPError as exc:
+            status, body = exc.code, ''
+        except urllib2.URLError as exc:
+            status, body = 'error', str(exc.reason)
+        interaction.update(status=status, body=body.decode('latin-1'),
+                           seconds=round(time.time() - start, 3),
+                           offset=round(start - self._start, 3))
+        self.interactions.append(interaction)
+        self._handle.write(json.dumps(interaction, sort_keys=True) + '\n')
+        self._handle.flush()  # Keep what was recorded if the program is killed.
+        raise Return(interaction)
+
+    def _replay(self, expected):
+        """Wait as long as the autoloader took to respond (scaled by speed). Coroutine.
+
+        :raise urllib2.URLError: If the request isn't the next one recorded.
+        :raise Return: The recorded interaction.
+
+        :param dict expected: Request fields of the request being sent.
+        """
+        if self.position >= len(self.interactions):
+            raise urllib2.URLError('cassette {} has no more responses'.format(self.path))
+        interaction = self.interactions[self.position]
+        recorded = dict((k, interaction.get(k)) for k in expected)
+        if recorded != expected:
+            message = 'cassette {} expected {method} {path} next'.format(self.path, **recorded)
+            raise urllib2.URLError(message)
+        self.position += 1
+        if self.speed:
+            yield Sleep(interaction['seconds'] / self.speed)
+        raise Return(interaction)
+
+
+class DurationHistory(object):
+    """Measured latencies of a single autoloader, saved across runs to predict batch durations.
+
+    Keeps a running mean per kind of measurement that turns into an exponentially weighted mean
+    after WINDOW samples, so it follows the unit as it wears. Kinds:
+    * query: commands.html round trip.
+    * drive, picker, slot: Eject move from that kind of position.
+    * slot_switch: Eject move from a slot in a different magazine than the previous slot move.
+    * load: Move from the mailslot into a slot.
+
+    :cvar int WINDOW: Number of samples before older ones start fading out.
+
+    :ivar str history_file: JSON file the means are saved to.
+    :ivar int last_magazine: Magazine of the previous slot move or None.
+    :ivar dict means: Mean seconds and number of samples ([mean, count]) by kind.
+    """
+
+    WINDOW = 10
+
+    def __init__(self, host_name, history_file=None):
+        """Constructor.
+
+        :param str host_name: Hostname or IP address of the autoloader.
+        :param str history_file: Override default file path (~/.pv124t_history_HOST.json).
+        """
+        self.history_file = history_file or state_path('history', host_name)
+        self.last_magazine = None
+        self.means = dict()
+        self.load()
+
+    @property
+    def moves(self):
+        """Number of moves measured.
+
+        :rtype: int
+        """
+        return sum(c for k, (_, c) in self.means.items() if k != 'query')
+
+    def load(self):
+        """Load measurements from previous runs. Ignores missing/corrupt files."""
+        logger = logging.getLogger('DurationHistory.load')
+        try:
+            with open(self.history_file) as handle:
+                means = json.load(handle)
+            self.means = dict((str(k), [float(m), int(c)]) for k, (m, c) in means.items())
+        except (AttributeError, IOError, TypeError, ValueError) as exc:
+            logger.debug('Not loading %s: %s', self.history_file, str(exc))
+            return
+        logger.debug('Loaded %d measured move(s) from %s', self.moves, self.history_file)
+
+    def save(self):
+        """Atomically write measurements to the history file."""
+        logger = logging.getLogger('DurationHistory.save')
+        try:
+            atomic_write(self.history_file, json.dumps(self.means, sort_keys=True))
+        except (IOError, OSError) as exc:
+            logger.warning('Failed to write %s: %s', self.history_file, str(exc))
+
+    def mean(self, kind, default):
+        """Mean seconds of a kind of measurement.
+
+        :param str kind: Kind of measurement (e.g. 'query').
+        :param float default: Returned if nothing was measured yet.
+
+        :return: Seconds.
+        :rtype: float
+        """
+        return self.means[kind][0] if kind in self.means else default
+
+    def observe(self, kind, seconds):
+        """Add a measurement and save.
+
+        :param str kind: Kind of measurement (e.g. 'query').
+        :param float seconds: Measured duration.
+        """
+        mean, count = self.means.get(kind, (0.0, 0))
+        count += 1
+        mean += (seconds - mean) / min(count, self.WINDOW)
+        self.means[kind] = [mean, count]
+        self.save()
+
+    def observe_move(self, source, seconds):
+        """Add an eject move measurement.
+
+        :param str source: Position the tape was ejected from (e.g. '3' or 'drive').
+        :param float seconds: Measured duration.
+        """
+        kind, self.last_magazine = move_kind(source, self.last_magazine)
+        self.observe(kind, seconds)
+
+    def move_seconds(self, kind):
+        """Predicted duration of an eject move.
+
+        :param str kind: Kind of move from move_kind().
+
+        :return: Seconds. Falls back to MOVE_SECONDS (and slot for slot_switch) if not measured.
+        :rtype: float
+        """
+        default = MOVE_SECONDS.get(kind, MOVE_SECONDS['slot'])
+        if kind == 'slot_switch':
+            default = self.mean('slot', default)
+        return self.mean(kind, default)
+
+
+class InventoryCache(object):
+    """Parsed inventory of a single autoloader saved on disk so the next run can skip fetching it.
+
+    Only trusted for a short time since tapes may be moved through the front panel. Planning and
+    reporting use it as is but commands.html is fetched to confirm or correct it before the first
+    move, so no tape is ever moved from a position the autoloader didn't report.
+
+    :ivar str cache_file: JSON file the inventory is saved to.
+    :ivar bool loaded: If the current inventory came from this cache and has not been confirmed.
+    :ivar float ttl: Number of seconds the cache is valid for.
+    """
+
+    def __init__(self, host_name, ttl, cache_file=None):
+        """Constructor.
+
+        :param str host_name: Hostname or IP address of the autoloader.
+        :param float ttl: Number of seconds the cache is valid for.
+        :param str cache_file: Override default cache file path (~/.pv124t_cache_HOST.json).
+        """
+        self.cache_file = cache_file or state_path('cache', host_name)
+        self.loaded = False
+        self.ttl = ttl
+
+    def load(self):
+        """Read the cached inventory if it's not expired.
+
+        :return: Inventory dict or None if missing, corrupt, or expired.
+        :rtype: dict
+        """
+        logger = logging.getLogger('InventoryCache.load')
+        try:
+            with open(self.cache_file) as handle:
+                parsed = json.load(handle)
+            age = time.time() - float(parsed['time'])
+            inventory = dict(parsed['inventory'])
+        except (IOError, KeyError, TypeError, ValueError) as exc:
+            logger.debug('Not loading %s: %s', self.cache_file, str(exc))
+            return None
+        if not 0 <= age < self.ttl:
+            logger.debug('Cache %s expired %f second(s) ago.', self.cache_file, age - self.ttl)
+            return None
+        logger.debug('Loaded inventory from %s (%f second(s) old).', self.cache_file, age)
+        self.loaded = True
+        return inventory
+
+    def save(self, inventory):
+        """Atomically write the inventory to the cache file.
+
+        :param dict inventory: Tape positions from Autoloader.inventory.
+        """
+        logger = logging.getLogger('InventoryCache.save')
+        data = json.dumps({'time': time.time(), 'inventory': inventory})
+        try:
+            atomic_write(self.cache_file, data)
+        except (IOError, OSError) as exc:
+            logger.warning('Failed to write %s: %s', self.cache_file, str(exc))
+
+
+class Metrics(object):
+    """Counters and histograms of where the time of a run went.
+
+    Phases timed (pv124t_phase_seconds): "sleep" (rate limiter delays before queries),
+    "network" (commands.html and config_ops.html round trips), "move" (move.cgi round trips,
+    which include the physical move), "retry" (sleeps between eject retries), and "mailslot"
+    (sleeping while the operator empties the mailslot). Requests are also counted and timed per
+    page and HTTP status.
+
+    :cvar tuple BUCKETS: Histogram bucket upper bounds in seconds.
+
+    :ivar dict counters: Counter values keyed by (name, sorted label items).
+    :ivar dict histograms: [bucket counts, sum, count] keyed by (name, sorted label items).
+    :ivar threading.Lock lock: Fleet workers share one instance.
+    """
+
+    BUCKETS = (0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self):
+        """Constructor."""
+        self.counters = dict()
+        self.histograms = dict()
+        self.lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        """Increment a counter.
+
+        :param str name: Metric name (e.g. 'pv124t_requests_total').
+        :param int value: Increment by this much.
+        :param dict labels: Metric labels.
+        """
+        key = name, tuple(sorted(labels.items()))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Add a duration to a histogram.
+
+        :param str name: Metric name (e.g. 'pv124t_phase_seconds').
+        :param float seconds: Observed duration.
+        :param dict labels: Metric labels.
+        """
+        key = name, tuple(sorted(labels.items()))
+        with self.lock:
+            histogram = self.histograms.setdefault(key, [[0] * len(self.BUCKETS), 0.0, 0])
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Context manager observing how long its body took.
+
+        :param str name: Metric name.
+        :param dict labels: Metric labels.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **labels)
+
+    def summary(self):
+        """JSON serializable copy of all metrics. Histogram buckets are cumulative.
+
+        :return: Counters and histograms by metric name.
+        :rtype: dict
+        """
+        counters, histograms = dict(), dict()
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, list()).append(dict(labels=dict(labels), value=value))
+            for (name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+                histograms.setdefault(name, list()).append(dict(
+                    labels=dict(labels), sum=total, count=count,
+                    buckets=[[bound, value] for bound, value in zip(self.BUCKETS, buckets)],
+                ))
+        return dict(counters=counters, histograms=histograms)
+
+    def prometheus(self):
+        """Render all metrics in the Prometheus text format for node_exporter's textfile collector.
+
+        :return: Text exposition.
+        :rtype: str
+        """
+        def render(labels, **extra):
+            """Render a label set."""
+            items = sorted(labels.items()) + sorted(extra.items())
+            pairs = ('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+                     for k, v in items)
+            return '{{{}}}'.format(','.join(pairs)) if items else ''
+        lines = list()
+        summary = self.summary()
+        for name, series in sorted(summary['counters'].items()):
+            lines.append('# TYPE {} counter'.format(name))
+            for sample in series:
+                lines.append('{}{} {}'.format(name, render(sample['labels']), sample['value']))
+        for name, series in sorted(summary['histograms'].items()):
+            lines.append('# TYPE {} histogram'.format(name))
+            for sample in series:
+                labels = sample['labels']
+                for bound, value in sample['buckets']:
+                    lines.append('{}_bucket{} {}'.format(name, render(labels, le=bound), value))
+                lines.append('{}_bucket{} {}'.format(name, render(labels, le='+Inf'),
+                                                     sample['count']))
+                lines.append('{}_sum{} {!r}'.format(name, render(labels), sample['sum']))
+                lines.append('{}_count{} {}'.format(name, render(labels), sample['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_file=None, textfile=None):
+        """Write the JSON summary and/or the node_exporter textfile. Logs instead of raising.
+
+        :param str json_file: Write JSON summary here if set.
+        :param str textfile: Write Prometheus text format here if set (should end with .prom).
+        """
+        logger = logging.getLogger('Metrics.write')
+        for path, render in ((json_file, lambda: json.dumps(self.summary(), indent=2)),
+                             (textfile, self.prometheus)):
+            if not path:
+                continue
+            try:
+                atomic_write(path, render())
+            except (IOError, OSError) as exc:
+                logger.warning('Failed to write %s: %s', path, str(exc))
+                continue
+            logger.debug('Wrote metrics to %s', path)
+
+
+class Journal(object):
+    """Append-only record of the current batch so an interrupted run can resume where it stopped.
+
+    One JSON object per line, flushed to disk line by line so a killed process loses at most the
+    line it was writing. Events:
+    * planned: Batch started. Mode ('batch' or 'rotate'), tapes to eject and load, and inventory.
+    * issued: Move about to be sent to the autoloader.
+    * confirmed: Move done, with the inventory seen afterwards.
+    * done: Batch finished. Nothing to resume.
+
+    :ivar str journal_file: JSON lines file of the current batch.
+    """
+
+    def __init__(self, host_name, journal_file=None):
+        """Constructor.
+
+        :param str host_name: Hostname or IP address of the autoloader.
+        :param str journal_file: Override default file path (~/.pv124t_journal_HOST.json).
+        """
+        self.journal_file = journal_file or state_path('journal', host_name)
+
+    @staticmethod
+    def line(event, **fields):
+        """Serialize one journal entry.
+
+        :param str event: Event name (e.g. 'issued').
+        :param dict fields: Event data.
+
+        :return: JSON line.
+        :rtype: str
+        """
+        fields.update(event=event, time=time.time())
+        return json.dumps(fields, sort_keys=True) + '\n'
+
+    def append(self, event, **fields):
+        """Append an entry and flush it to disk.
+
+        :param str event: Event name (e.g. 'issued').
+        :param dict fields: Event data.
+        """
+        logger = logging.getLogger('Journal.append')
+        try:
+            with open(self.journal_file, 'a+') as handle:
+                handle.seek(0, os.SEEK_END)
+                if handle.tell():  # Start on a new line if the last write was cut off.
+                    handle.seek(-1, os.SEEK_END)
+                    if handle.read(1) != '\n':
+                        handle.write('\n')
+                handle.write(self.line(event, **fields))
+                handle.flush()
+                os.fsync(handle.fileno())
+        except (IOError, OSError) as exc:
+            logger.warning('Failed to write %s: %s', self.journal_file, str(exc))
+
+    def plan(self, mode, ejects, loads, inventory):
+        """Start a new batch, replacing the previous one.
+
+        :param str mode: 'batch' or 'rotate'.
+        :param list ejects: Tapes to eject, in order.
+        :param list loads: Tapes to load.
+        :param dict inventory: Current tape positions.
+        """
+        logger = logging.getLogger('Journal.plan')
+        data = self.line('planned', mode=mode, ejects=ejects, loads=loads,
+                         inventory=dict(inventory))
+        try:
+            atomic_write(self.journal_file, data)
+        except (IOError, OSError) as exc:
+            logger.warning('Failed to write %s: %s', self.journal_file, str(exc))
+
+    def issued(self, tape, source, destination):
+        """Record a move about to be sent.
+
+        :param str tape: Tape being moved.
+        :param str source: Position it's moved from.
+        :param str destination: Position it's moved to.
+        """
+        self.append('issued', tape=tape, source=source, destination=destination)
+
+    def confirmed(self, tape, source, destination, inventory):
+        """Record a finished move.
+
+        :param str tape: Tape that moved.
+        :param str source: Position it moved from.
+        :param str destination: Position it moved to.
+        :param dict inventory: Tape positions after the move.
+        """
+        self.append('confirmed', tape=tape, source=source, destination=destination,
+                    inventory=dict(inventory))
+
+    def done(self):
+        """Record that the batch finished."""
+        self.append('done')
+
+    def resume(self):
+        """Replay the journal of an unfinished batch.
+
+        :return: Mode, tapes left to eject and load, last inventory seen, and the move that was
+            issued but never confirmed (Move or None). None if there's nothing to resume.
+        :rtype: dict
+        """
+        logger = logging.getLogger('Journal.resume')
+        entries = list()
+        try:
+            with open(self.journal_file) as handle:
+                for line in handle:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        logger.debug('Ignoring corrupt line in %s: %r', self.journal_file, line)
+        except IOError as exc:
+            logger.debug('Not loading %s: %s', self.journal_file, str(exc))
+            return None
+        planned = [i for i, e in enumerate(entries) if e.get('event') == 'planned']
+        if not planned or any(e.get('event') == 'done' for e in entries[planned[-1]:]):
+            return None
+
+        start = entries[planned[-1]]
+        ejects, loads, inventory = start['ejects'], start['loads'], start['inventory']
+        pending = None
+        for entry in entries[planned[-1] + 1:]:
+            move = Move(entry.get('tape'), entry.get('source'), entry.get('destination'))
+            if entry.get('event') == 'issued':
+                pending = move
+            elif entry.get('event') == 'confirmed':
+                pending = None
+                inventory = entry['inventory']
+                if move.destination == 'mailslot' and move.tape in ejects:
+                    ejects.remove(move.tape)
+                elif move.source == 'mailslot' and move.tape in loads:
+                    loads.remove(move.tape)
+        return dict(mode=start['mode'], ejects=ejects, loads=loads, inventory=inventory,
+                    pending=pending)
+
+
+class Autoloader(object):
+    """Interfaces with the autoloader over its HTTP web interface.
+
+    :cvar int CHUNK_SIZE: Read HTTP responses this many bytes at a time.
+    :cvar PARSER: Default commands.html parser backend class (TapePosRegex or TapePos).
+    :cvar int DELAY: Number of seconds to wait between queries. The web interface is very fragile.
+    :cvar int DELAY_ERROR: Number of seconds to wait if we get an error from the autoloader.
+    :cvar dict POSITIONS: move.cgi position numbers of non-slot positions.
+
+    :ivar str auth: HTTP basic authentication credentials (base64 encoded).
+    :ivar InventoryCache cache: Save every parsed inventory to this cache. Disabled if None.
+    :ivar int excerpt: Debug log this many bytes of each response besides its size and digest.
+    :ivar dict headers: Prebuilt HTTP headers sent with every request.
+    :ivar DurationHistory history: Record query and move latencies here. Disabled if None.
+    :ivar str host_name: Hostname or IP address of the autoloader.
+    :ivar Inventory inventory: Tape positions. 16 slots, drive, picker, and mail slot.
+    :ivar Metrics metrics: Records where the time goes (sleeps, requests, moves, retries).
+    :ivar parser_class: commands.html parser backend class (TapePosRegex or TapePos).
+    :ivar RateLimiter rate_limiter: Decides how long to wait between queries.
+    :ivar RetryPolicy retry_policy: Decides how long to wait before retrying a move.
+    :ivar Session session: Persistent HTTP connection. Uses urllib2.urlopen() if None.
+    :ivar str url: URL prefix of the autoloader (e.g. 'http://192.168.0.50/').
+    """
+
+    CHUNK_SIZE = 8192
+    PARSER = TapePosRegex
+    DELAY = 10
+    DELAY_ERROR = 15
+    POSITIONS = dict(drive=17, mailslot=18, picker=19)
+
+    def __init__(self, host_name, user_name, pass_word, rate_limiter=None, session=None,
+                 cache=None, metrics=None, retry_policy=None, history=None, excerpt=0,
+                 parser_class=None):
+        """Constructor.
+
+        :param str host_name: Hostname or IP address of the autoloader.
+        :param str user_name: HTTP username (e.g. 'admin').
+        :param str pass_word: HTTP password.
+        :param RateLimiter rate_limiter: Defaults to fixed DELAY and DELAY_ERROR delays.
+        :param Session session: Persistent HTTP connection. Uses urllib2.urlopen() if None.
+        :param InventoryCache cache: Save every parsed inventory to this cache.
+        :param Metrics metrics: Record timings here. Defaults to a new instance.
+        :param RetryPolicy retry_policy: Defaults to retrying forever with backoff.
+        :param DurationHistory history: Record query and move latencies here.
+        :param int excerpt: Debug log this many bytes of each response besides its size and digest.
+        :param parser_class: commands.html parser backend class. Defaults to PARSER.
+        """
+        self.auth = base64.standard_b64encode(':'.join((user_name, pass_word)))
+        self.cache = cache
+        self.excerpt = excerpt
+        self.history = history
+        self.host_name = host_name
+        self.inventory = Inventory()
+        self.metrics = metrics or Metrics()
+        self.parser_class = parser_class or self.PARSER
+        self.rate_limiter = rate_limiter or RateLimiter(self.DELAY, self.DELAY_ERROR)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.session = session
+        self.url = 'http://{}/'.format(host_name)
+        self._request_ids = itertools.count(1)
+        self.headers = {
+            'Authorization': 'Basic {}'.format(self.auth),
+            'Origin': self.url.rstrip('/'),
+            'Referer': self.url + 'commands.html',
+        }
+
+    def _request(self, path, data=None):
+        """Build a request with the prebuilt headers.
+
+        :param str path: Path relative to the autoloader's URL (e.g. 'commands.html').
+        :param str data: POST data. Sends a GET request if None.
+
+        :return: urllib2.Request instance.
+        """
+        request = urllib2.Request(self.url + path, data, self.headers)
+        if data is not None:
+            request.add_header('Content-type', 'application/x-www-form-urlencoded')
+        return request
+
+    def _query(self, request, no_delay=False, parser=None):
+        """Query the autoloader's web interface. Enforces delay timer.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :raise AutoloaderError: On HTTP 401 errors when querying the web interface.
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+        :param bool no_delay: Exclude this query from the rate limiter.
+        :param TapePos parser: Feed the response to this parser as it's received instead of
+            returning it. Stops reading once the parser is done.
+
+        :return: HTML response payload (empty string if parser is set).
+        :rtype: str
+        """
+        return EventLoop().run_until_complete(self.query_async(request, no_delay, parser))
+
+    def query_async(self, request, no_delay=False, parser=None):
+        """Coroutine version of _query(). Other tasks keep running during delays and moves.
+
+        Only requests sent through a Session wait on the socket. urllib2.urlopen() blocks.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :raise AutoloaderError: On HTTP 401 errors when querying the web interface.
+        :raise Return: HTML response payload (empty string if parser is set).
+
+        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
+        :param bool no_delay: Exclude this query from the rate limiter.
+        :param TapePos parser: Feed the response to this parser as it's received instead of
+            returning it. Stops reading once the parser is done.
+        """
+        logger = logging.getLogger('Autoloader._query')
+        page = request.get_full_url().rsplit('/', 1)[-1]
+        debug = logger.isEnabledFor(logging.DEBUG)
+        extra = dict(host=self.host_name, request_id=next(self._request_ids))
+        try:  # Whatever happens, let other processes have their turn.
+            if not no_delay:
+                slept = yield self.rate_limiter.wait_async()
+                self.metrics.observe('pv124t_phase_seconds', slept, host=self.host_name,
+                                     phase='sleep')
+            logger.debug('Request %d: %s %s', extra['request_id'], request.get_method(), page,
+                         extra=extra)
+            start = time.time()
+
+            # Send request and get response.
+            try:
+                if self.session:
+                    response = yield self.session.open_async(request)
+                else:
+                    response = urllib2.urlopen(request)
+            except urllib2.HTTPError as exc:
+                self.record(page, exc.code, start)
+                url = request.get_full_url()
+                if exc.code == 404:
+                    logger.error('404 Not Found on: %s', url)
+                elif exc.code == 401:
+                    logger.debug('401 Unauthorized on: %s', url, extra=extra)
+                    if not no_delay:
+                        self.rate_limiter.replied()
+                        self.rate_limiter.failure()
+                    raise AutoloaderError
+                else:
+                    logger.error('%s returned HTTP %s instead of 200.', url, exc.code)
+                raise HandledError
+            except urllib2.URLError as exc:
+                self.record(page, 'error', start)
+                url = request.get_full_url()
+                logger.error('URL "%s" is invalid: %s', url, str(exc))
+                raise HandledError
+
+            chunks, parsed = list(), list()
+            while parser is None or not parser.done:
+                chunk = response.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                if parser is None:
+                    chunks.append(chunk)
+                else:
+                    parser.feed(chunk)
+                    if debug:  # Only kept to be summarized below.
+                        parsed.append(chunk)
+            if debug:
+                payload = Payload(''.join(chunks or parsed), self.excerpt)
+                logger.debug('Request %d: received %s', extra['request_id'], payload, extra=extra)
+            self.record(page, 200, start)
+            if self.history is not None and page == 'commands.html':
+                self.history.observe('query', time.time() - start)
+            if not no_delay:
+                self.rate_limiter.replied()
+                self.rate_limiter.success()
+            raise Return(''.join(chunks))
+        finally:
+            if not no_delay:
+                self.rate_limiter.release()
+
+    def record(self, page, status, start):
+        """Record a finished request in metrics.
+
+        :param str page: Requested page (e.g. 'move.cgi').
+        :param status: HTTP status code or 'error'.
+        :param float start: Unix time the request was sent.
+        """
+        seconds = time.time() - start
+        phase = 'move' if page == 'move.cgi' else 'network'
+        self.metrics.observe('pv124t_phase_seconds', seconds, host=self.host_name, phase=phase)
+        self.metrics.observe('pv124t_request_seconds', seconds, host=self.host_name, page=page)
+        self.metrics.count('pv124t_requests_total', host=self.host_name, page=page,
+                           status=str(status))
+
+    def check_creds(self):
+        """Check credentials by going to config_opts.html. Doesn't change anything.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        """
+        logger = logging.getLogger('Autoloader.auth')
+        request = self._request('config_ops.html')
+        try:
+            self._query(request, no_delay=True)
+        except AutoloaderError:
+            message = '%s 401 Unauthorized. Possibly rate limiting or invalid credentials.'
+            logger.error(message, request.get_full_url())
+            raise HandledError
+
+    def connect(self):
+        """Check credentials and get the inventory in a single request.
+
+        Uses the cached inventory if it's fresh, only checking credentials. Otherwise fetching
+        commands.html authenticates too, skipping the separate config_ops.html request.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        """
+        logger = logging.getLogger('Autoloader.auth')
+        cached = self.cache.load() if self.cache else None
+        if cached is not None:
+            self.check_creds()
+            self.inventory.update(cached)
+            return
+        request = self._request('commands.html')
+        try:
+            self.update_inventory(request=request)
+        except AutoloaderError:
+            message = '%s 401 Unauthorized. Possibly rate limiting or invalid credentials.'
+            logger.error(message, request.get_full_url())
+            raise HandledError
+
+    def eject(self, tape, give_up=False):
+        """Perform tape move to the mailslot thereby "ejecting" it.
+
+        Blocks during entire move operation. Once done self.inventory is updated.
+
+        :param str tape: The tape to eject.
+        :param bool give_up: Return instead of retrying if another tape is in the mailslot.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :raise LockoutError: If the autoloader refuses every request. Stop the whole batch.
+        :raise RetryError: If retry_policy gave up on the tape.
+
+        :return: False if it gave up, True otherwise.
+        :rtype: bool
+        """
+        return EventLoop().run_until_complete(self.eject_async(tape, give_up))
+
+    def eject_async(self, tape, give_up=False):
+        """Coroutine version of eject(). Cancelling its Task stops retrying.
+
+        Failures are classified (401, drive locked, or tape didn't move) and retried according to
+        retry_policy. Repeated 401s are probed to tell a lockout from rate limiting.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :raise LockoutError: If the autoloader refuses every request. Stop the whole batch.
+        :raise RetryError: If retry_policy gave up on the tape.
+        :raise Return: False if it gave up, True otherwise.
+
+        :param str tape: The tape to eject.
+        :param bool give_up: Return instead of retrying if another tape is in the mailslot.
+        """
+        logger = logging.getLogger('Autoloader.eject')
+
+        # Eject tape.
+        attempt, since = 0, time.time()
+        while True:
+            if tape not in self.inventory or self.inventory.mailslot == tape:
+                break  # Moved by an earlier attempt that errored, or already taken out.
+            source = self.inventory[tape]  # Re-read every attempt, the tape may have moved.
+            slot = int(self.POSITIONS.get(source, source))
+            data = 'from={}&to={}&submit=submit'.format(slot, self.POSITIONS['mailslot'])
+            sent = time.time()
+            try:
+                if self.cache and self.cache.loaded:
+                    yield self.update_inventory_async()  # Never move from an unconfirmed position.
+                    continue
+                logger.debug('Eject POST data: %s', data)
+                moves = yield self.update_inventory_async(request=self._request('move.cgi', data))
+            except AutoloaderError:
+                failure = 'unauthorized'
+            else:
+                if Move(tape, source, 'mailslot') in moves:
+                    logger.debug('Confirmed %s moved from %s to the mailslot.', tape, source)
+                    if self.history is not None:
+                        self.history.observe_move(source, time.time() - sent)
+                    break
+                if tape not in self.inventory or self.inventory.mailslot == tape:
+                    break  # Moved by an earlier attempt that errored, or already taken out.
+                if give_up and self.inventory.mailslot is not None:
+                    logger.debug('%s is in the mailslot, giving up.', self.inventory.mailslot)
+                    raise Return(False)
+                failure = 'drive_locked' if self.inventory[tape] == 'drive' else 'not_moved'
+
+            # Classify and decide whether to retry.
+            attempt += 1
+            self.metrics.count('pv124t_retries_total', host=self.host_name, reason=failure)
+            if failure == 'unauthorized' and attempt > 1:
+                accepted = yield self.probe_async()
+                if not accepted:
+                    raise LockoutError(tape, failure, 'locked out or invalid credentials')
+            delay = self.retry_policy.delay(self.rate_limiter.delay_error, attempt)
+            reason = self.retry_policy.give_up(attempt, since, delay)
+            if reason:
+                raise RetryError(tape, failure, reason)
+            if failure == 'unauthorized':
+                logger.warning('Error while ejecting. Retrying in %.1f seconds...', delay)
+            elif failure == 'drive_locked':
+                logger.warning('Failed, drive locked? Retrying in %.1f seconds...', delay)
+            else:
+                logger.warning('Tape did not move. Retrying in %.1f seconds...', delay)
+            with self.metrics.timer('pv124t_phase_seconds', host=self.host_name, phase='retry'):
+                yield Sleep(delay)
+        raise Return(True)
+
+    def probe_async(self):
+        """Coroutine. Tell rate limiting apart from a lockout after repeated 401s on moves.
+
+        config_ops.html isn't rate limited (check_creds() doesn't wait for it either) so a 401
+        there too means the autoloader refuses everything and retrying the tape is pointless. It's
+        only probed after backing off so the 401 that triggered the probe doesn't cause another.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :raise Return: False if config_ops.html was refused too, True otherwise.
+        """
+        logger = logging.getLogger('Autoloader.probe')
+        with self.metrics.timer('pv124t_phase_seconds', host=self.host_name, phase='retry'):
+            yield Sleep(self.rate_limiter.delay_error)
+        request = self._request('config_ops.html')
+        try:
+            yield self.query_async(request, no_delay=True)
+        except AutoloaderError:
+            message = '%s 401 Unauthorized too. Locked out or invalid credentials.'
+            logger.warning(message, request.get_full_url())
+            raise Return(False)
+        logger.debug('Autoloader still accepts requests, probably rate limiting.')
+        raise Return(True)
+
+    def load(self, tape, slot):
+        """Perform tape move from the mailslot into an empty slot thereby "importing" it.
+
+        Blocks during entire move operation. Once done self.inventory is updated.
+
+        :param str tape: The tape in the mailslot.
+        :param str slot: The empty slot to load it into (e.g. '3').
+
+        :return: If the tape is now in the slot. False if it left the mailslot or the slot filled.
+        :rtype: bool
+        """
+        logger = logging.getLogger('Autoloader.load')
+        data = 'from={}&to={}&submit=submit'.format(self.POSITIONS['mailslot'], slot)
+        logger.debug('Load POST data: %s', data)
+        request = self._request('move.cgi', data)
+
+        # Load tape.
+        while True:
+            confirm = bool(self.cache and self.cache.loaded)  # Never move based on the cache.
+            sent = time.time()
+            try:
+                moves = self.update_inventory(request=None if confirm else request)
+            except AutoloaderError:
+                delay_error = self.rate_limiter.delay_error
+                logger.warning('Error while loading. Retrying in %s seconds...', delay_error)
+                with self.metrics.timer('pv124t_phase_seconds', host=self.host_name,
+                                        phase='retry'):
+                    time.sleep(delay_error)
+                continue
+            if not confirm and Move(tape, 'mailslot', slot) in moves:
+                logger.debug('Confirmed %s moved from the mailslot to %s.', tape, slot)
+                if self.history is not None:
+                    self.history.observe('load', time.time() - sent)
+                return True
+            if self.inventory.get(tape) == slot:
+                return True  # Moved by an earlier attempt that errored.
+            if self.inventory.mailslot != tape:
+                logger.warning('%s was taken out of the mailslot, skipping.', tape)
+                return False
+            if self.inventory.tape_at(slot) is not None:
+                logger.warning('Slot %s is no longer empty, picking another one.', slot)
+                return False
+            if confirm:
+                continue
+            delay_error = self.rate_limiter.delay_error
+            logger.warning('Tape did not move. Retrying in %s seconds...', delay_error)
+            with self.metrics.timer('pv124t_phase_seconds', host=self.host_name, phase='retry'):
+                time.sleep(delay_error)
+
+    def stage(self, tape):
+        """Move a tape into the picker so ejecting it later is only a short hop to the mailslot.
+
+        Only moves while the mailslot is occupied (the robot would sit idle anyway) and the picker
+        is empty. Best effort: eject() works from anywhere so errors are logged and ignored.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+
+        :param str tape: The tape to eject next.
+
+        :return: If the tape is in the picker.
+        :rtype: bool
+        """
+        logger = logging.getLogger('Autoloader.stage')
+        source = self.inventory.get(tape)
+        if source in (None, 'mailslot', 'picker'):
+            return source == 'picker'
+        if self.cache and self.cache.loaded:
+            return False  # Unconfirmed position, eject() fetches commands.html first.
+        if self.inventory.mailslot is None or self.inventory.tape_at('picker') is not None:
+            return False
+        slot = int(self.POSITIONS.get(source, source))
+        data = 'from={}&to={}&submit=submit'.format(slot, self.POSITIONS['picker'])
+        logger.info('Staging %s from %s into the picker...', tape, source)
+        try:
+            moves = self.update_inventory(request=self._request('move.cgi', data))
+        except AutoloaderError:
+            logger.debug('Autoloader refused, ejecting %s from %s instead.', tape, source)
+            return False
+        if Move(tape, source, 'picker') not in moves:
+            logger.debug('%s did not move, ejecting it from %s instead.', tape, source)
+        return self.inventory.get(tape) == 'picker'
+
+    def update_inventory(self, html=None, request=None):
+        """Get current tape positions in the autoloader and updates self.inventory.
+
+        The response is parsed while it's received in a single pass.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :raise AutoloaderError: On HTTP 401 errors when querying the web interface.
+
+        :param str html: Parse this html if set. Otherwise requests HTML from autoloader.
+        :param urllib2.Request request: Parse the response to this request instead of fetching
+            commands.html (e.g. move.cgi responds with the full inventory).
+
+        :return: Moves since the previous inventory (Inventory.diff()).
+        :rtype: list
+        """
+        return EventLoop().run_until_complete(self.update_inventory_async(html, request))
+
+    def update_inventory_async(self, html=None, request=None):
+        """Coroutine version of update_inventory().
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :raise AutoloaderError: On HTTP 401 errors when querying the web interface.
+        :raise Return: Moves since the previous inventory (Inventory.diff()).
+
+        :param str html: Parse this html if set. Otherwise requests HTML from autoloader.
+        :param urllib2.Request request: Parse the response to this request instead of fetching
+            commands.html (e.g. move.cgi responds with the full inventory).
+        """
+        logger = logging.getLogger('Autoloader.update_inventory')
+        inventory = dict()
+        parser = self.parser_class(inventory)
+        if html:
+            parser.feed(html)
+        else:
+            yield self.query_async(request or self._request('commands.html'), parser=parser)
+        if not parser.matched:
+            logger.error('Invalid HTML, found no regex matches.')
+            raise HandledError
+        moves = self.inventory.replace(inventory)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Loaded tapes: %s', '|'.join(sorted(self.inventory)))
+        for move in moves:
+            logger.debug('%s moved from %s to %s.', *move)
+
+        if self.cache:
+            if self.cache.loaded:
+                self.cache.loaded = False
+                stale = sorted(set(m.tape for m in moves))
+                if stale:
+                    logger.warning('Cached inventory was stale, corrected: %s', '|'.join(stale))
+                else:
+                    logger.debug('Cached inventory confirmed.')
+            self.cache.save(dict(self.inventory))
+        raise Return(moves)
+
+
+class MailslotWaiter(object):
+    """Waits for the operator to empty the mailslot.
+
+    Polls commands.html on a schedule that starts at the rate limiter's delay and grows each time
+    the mailslot is still occupied. Any trigger (a line on the TTY, SIGUSR1, or a write to the
+    FIFO) cuts the current wait short and resets the schedule, so the mailslot is re-checked as
+    soon as the autoloader allows it.
+
+    :cvar float FACTOR: Multiply the poll interval by this after each poll.
+    :cvar float MAXIMUM: Never wait longer than this many seconds between polls.
+
+    :ivar int fifo_fd: File descriptor of the FIFO or None.
+    :ivar float minimum: Initial poll interval. Defaults to the autoloader's rate limiter delay.
+    :ivar int pipe_read: Self-pipe read end. SIGUSR1 handler writes to pipe_write.
+    :ivar int pipe_write: Self-pipe write end.
+    :ivar previous_handler: SIGUSR1 handler to restore on close(). None if not installed.
+    :ivar bool tty: Read lines from stdin as triggers.
+    """
+
+    FACTOR = 1.5
+    MAXIMUM = 30
+
+    def __init__(self, minimum=None, tty=False, fifo=None, signals=True):
+        """Constructor.
+
+        :param float minimum: Initial poll interval. Defaults to the rate limiter's delay.
+        :param bool tty: Read lines from stdin as triggers (e.g. operator hits Enter).
+        :param str fifo: Path to a FIFO to create (if missing) and read triggers from.
+        :param bool signals: Install a SIGUSR1 handler as a trigger until close().
+        """
+        self.minimum = minimum
+        self.tty = tty
+        self.pipe_read, self.pipe_write = os.pipe()
+        self.fifo_fd = None
+        if fifo:
+            if not os.path.exists(fifo):
+                os.mkfifo(fifo, 0o600)
+            # O_RDWR keeps the FIFO from reporting EOF (always readable) when no writers are left.
+            self.fifo_fd = os.open(fifo, os.O_RDWR | os.O_NONBLOCK)
+        self.previous_handler = None
+        if signals:
+            try:
+                self.previous_handler = signal.signal(signal.SIGUSR1, self.trigger)
+            except ValueError:  # Not the main thread.
+                pass
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, *_):
+        """Context manager exit."""
+        self.close()
+
+    def close(self):
+        """Restore the signal handler and close file descriptors."""
+        if self.previous_handler is not None:
+            signal.signal(signal.SIGUSR1, self.previous_handler)
+            self.previous_handler = None
+        for file_descriptor in (self.pipe_read, self.pipe_write, self.fifo_fd):
+            if file_descriptor is not None:
+                os.close(file_descriptor)
+        self.pipe_read = self.pipe_write = self.fifo_fd = None
+
+    def trigger(self, *_):
+        """Cut the current wait short. Safe to call from a signal handler or another thread."""
+        os.write(self.pipe_write, 'x')
+
+    def sleep(self, timeout):
+        """Sleep until timeout or until triggered, whichever comes first.
+
+        :param float timeout: Number of seconds to sleep.
+
+        :return: If triggered.
+        :rtype: bool
+        """
+        file_descriptors = [self.pipe_read]
+        if self.tty:
+            file_descriptors.append(sys.stdin.fileno())
+        if self.fifo_fd is not None:
+            file_descriptors.append(self.fifo_fd)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                timeout = max(0, deadline - time.time())
+                readable = select.select(file_descriptors, [], [], timeout)[0]
+                break
+            except select.error as exc:
+                if exc.args[0] != errno.EINTR:  # Signal handler interrupted select(), try again.
+                    raise
+        for file_descriptor in readable:
+            os.read(file_descriptor, 1024)
+        return bool(readable)
+
+    def wait(self, autoloader, empty=True, ignore=None):
+        """Block until the mailslot is empty (or occupied).
+
+        :param Autoloader autoloader: Autoloader instance with an up to date inventory.
+        :param bool empty: Wait for the operator to remove a tape. If False wait for one inserted.
+        :param str ignore: When waiting for a tape to be inserted, this one doesn't count (e.g. the
+            tape just ejected, which the operator is swapping for another).
+        """
+        logger = logging.getLogger('MailslotWaiter.wait')
+
+        def done():
+            """If the mailslot is in the state we're waiting for."""
+            mailslot = autoloader.inventory.mailslot
+            return mailslot is None if empty else mailslot not in (None, ignore)
+        if done():
+            return
+        if empty:
+            logger.info('Tape in mailslot, remove to continue...')
+        else:
+            logger.info('Insert a tape into the mailslot to continue...')
+        interval = autoloader.rate_limiter.delay if self.minimum is None else self.minimum
+        minimum = interval
+        metrics, host_name = autoloader.metrics, autoloader.host_name
+        while True:
+            with metrics.timer('pv124t_phase_seconds', host=host_name, phase='mailslot'):
+                triggered = self.sleep(interval)
+            if triggered:
+                logger.debug('Triggered, checking mailslot now.')
+                interval = minimum
+            else:
+                interval = min(self.MAXIMUM, interval * self.FACTOR)
+            try:
+                autoloader.update_inventory()
+            except AutoloaderError:
+                message = 'Error while checking mailslot. Retrying in %f second(s)...'
+                logger.warning(message, interval)
+                continue
+            if done():
+                return
+            logger.debug('Mailslot unchanged, next check in %f second(s).', interval)
+
+
+class HostLogger(logging.LoggerAdapter):
+    """Prefixes log messages with the autoloader's host name."""
+
+    def process(self, msg, kwargs):
+        """Add the prefix.
+
+        :param str msg: Log message.
+        :param dict kwargs: Keyword arguments of the logging call.
+
+        :return: Prefixed message and kwargs.
+        :rtype: tuple
+        """
+        return '[{}] {}'.format(self.extra['host'], msg), kwargs
+
+
+class Fleet(object):
+    """Drives several autoloaders at once, one worker thread per unit.
+
+    Each unit has its own Autoloader (and therefore its own session and rate limiter) so ejecting
+    across N units takes about as long as the slowest unit.
+
+    :ivar list autoloaders: Autoloader instances.
+    """
+
+    def __init__(self, autoloaders):
+        """Constructor.
+
+        :param list autoloaders: Autoloader instances.
+        """
+        self.autoloaders = autoloaders
+
+    @staticmethod
+    def parallel(function, autoloaders):
+        """Call function(autoloader) for every autoloader at the same time in worker threads.
+
+        :param function: Callable taking one Autoloader argument.
+        :param list autoloaders: Autoloader instances.
+
+        :return: Autoloaders whose call raised HandledError (or any unexpected exception).
+        :rtype: list
+        """
+        failed = list()
+
+        def worker(autoloader):
+            """Thread target.
+
+            :param Autoloader autoloader: Autoloader instance.
+            """
+            try:
+                function(autoloader)
+            except HandledError:
+                failed.append(autoloader)
+            except Exception:  # pylint: disable=broad-except
+                logger = logging.getLogger('Fleet.parallel')
+                logger.error('Unexpected error on %s.', autoloader.host_name, exc_info=True)
+                failed.append(autoloader)
+
+        threads = [threading.Thread(target=worker, args=(a,)) for a in autoloaders]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)  # Timeout so Control+C works.
+        return failed
+
+    def connect(self):
+        """Check credentials and fetch inventories of all units concurrently.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        """
+        if self.parallel(Autoloader.connect, self.autoloaders):
+            raise HandledError
+
+    def resolve(self, tapes):
+        """Find which unit each tape is in.
+
+        :param iter tapes: Tapes to look for. Patterns (e.g. '0001*') are matched in every unit.
+
+        :return: Tapes per autoloader (in self.autoloaders order) and tapes not found in any unit.
+        :rtype: tuple
+        """
+        logger = logging.getLogger('Fleet.resolve')
+        assignments = [list() for _ in self.autoloaders]
+        missing = list()
+        patterns = [t for t in tapes if is_pattern(t)]
+        if patterns:
+            matches = [a.inventory.match(patterns) for a in self.autoloaders]
+            tapes = set(t for t in tapes if not is_pattern(t))
+            for pattern in patterns:
+                found = [t for m in matches for t in m[pattern]]
+                if not found:
+                    logger.info('No tapes match %s in any autoloader, skipping.', pattern)
+                tapes.update(found)
+            tapes = sorted(tapes)
+        for tape in tapes:
+            found = [i for i, a in enumerate(self.autoloaders) if tape in a.inventory]
+            if not found:
+                missing.append(tape)
+                continue
+            if len(found) > 1:
+                hosts = ', '.join(self.autoloaders[i].host_name for i in found)
+                logger.warning('%s found in more than one autoloader (%s), using first.', tape,
+                               hosts)
+            assignments[found[0]].append(tape)
+        return assignments, missing
+
+    def run(self, tapes, plan_only=False, prestage=False):
+        """Eject tapes from every unit in parallel.
+
+        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+
+        :param iter tapes: Tapes to eject.
+        :param bool plan_only: Log eject order and estimated duration instead of ejecting.
+        :param bool prestage: Move the next tape into the picker while the mailslot is occupied.
+        """
+        logger = logging.getLogger('Fleet.run')
+        self.connect()
+        assignments, missing = self.resolve(tapes)
+        for tape in missing:
+            logger.info('%s not in any autoloader, skipping.', tape)
+        work = dict((a, t) for a, t in zip(self.autoloaders, assignments) if t)
+        if not work:
+            logger.info('No tapes to eject. Nothing to do.')
+            return
+
+        def eject(autoloader):
+            """Eject tapes from one unit.
+
+            :param Autoloader autoloader: Autoloader instance.
+            """
+            adapter = HostLogger(logging.getLogger('Fleet.eject'), {'host': autoloader.host_name})
+            with MailslotWaiter() as waiter:
+                run_batch(autoloader, work[autoloader], waiter, adapter, plan_only, prestage)
+        failed = self.parallel(eject, [a for a in self.autoloaders if a in work])
+        if failed:
+            logger.error('Failed on: %s', ', '.join(a.host_name for a in failed))
+            raise HandledError
+
 
+class Client(object):
+    """Eject tapes from Python code instead of running this script once per batch.
 
-class InfoFilter(logging.Filter):
-    """Filter out non-info and non-debug logging statements.
+    One instance keeps its session, rate limiter state, and inventory between batches so only the
+    first one authenticates and fetches the inventory. Each tape gets a TapeResult with a status:
+    * ejected: Moved to the mailslot and taken out by the operator (or the batch ended).
+    * missing: Not in the autoloader. Also patterns that matched nothing.
+    * skipped: Already in the mailslot, or not attempted since the batch stopped early.
+    * failed: The retry policy gave up on it or the autoloader returned an error.
 
-    From: https://stackoverflow.com/questions/16061641/python-logging-split/16066513#16066513
-    """
+    Usage:
+        with Client(build_autoloader(config)) as client:
+            results = client.eject(['00001FA', '0002*'])
+            for event in client.eject_events(tapes):
+                print(event['message'])
 
-    def filter(self, record):
-        """Filter method.
+    :ivar Autoloader autoloader: Autoloader instance.
+    :ivar bool connected: If credentials were checked and the inventory fetched.
+    :ivar bool signals: If the MailslotWaiter created on the first wait handles SIGUSR1.
+    :ivar MailslotWaiter waiter: Waits for the operator to empty the mailslot. None until needed.
+    """
 
-        :param record: Log record object.
+    def __init__(self, autoloader, waiter=None, signals=False):
+        """Constructor.
 
-        :return: Keep or ignore this record.
-        :rtype: bool
+        :param Autoloader autoloader: Autoloader instance (e.g. from build_autoloader()).
+        :param MailslotWaiter waiter: Waits for the operator to empty the mailslot.
+        :param bool signals: Let SIGUSR1 cut mailslot waits short. Off by default since the
+            handler is process wide and may belong to the calling application.
         """
-        return record.levelno <= logging.INFO
+        self.autoloader = autoloader
+        self.connected = False
+        self.signals = signals
+        self.waiter = waiter
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, *_):
+        """Context manager exit."""
+        self.close()
+
+    def close(self):
+        """Close the session and the waiter."""
+        if self.autoloader.session:
+            self.autoloader.session.close()
+        if self.waiter is not None:
+            self.waiter.close()
+
+    def eject(self, tapes, prestage=False, refresh=False):
+        """Eject tapes and wait for all of them.
+
+        :param iter tapes: Tape barcodes and patterns (e.g. '0002*').
+        :param bool prestage: Move the next tape into the picker while the mailslot is occupied.
+        :param bool refresh: Fetch the inventory again first (e.g. tapes were moved by hand).
+
+        :return: TapeResult for every tape and pattern that matched nothing, in the order handled.
+        :rtype: list
+        """
+        events = list(self.eject_events(tapes, prestage, refresh))
+        return events[-1]['results']
 
+    def eject_events(self, tapes, prestage=False, refresh=False):
+        """Eject tapes, yielding progress events as it goes.
 
-class TapePos(HTMLParser.HTMLParser):
-    """Parses commands.html and gets current tape positions.
+        Events are dicts like the ones EjectDaemon streams to its clients: event ('planned',
+        'waiting', 'ejecting', a TapeResult status, or 'done'), message, level, and tape. Events
+        with a status carry the TapeResult in 'result'. The last event ('done') has all of them in
+        'results'.
 
-    :cvar RE_ONCLICK: <img /> onclick attribute parser (e.g. onClick="from_to(mailslot)").
+        :param iter tapes: Tape barcodes and patterns (e.g. '0002*').
+        :param bool prestage: Move the next tape into the picker while the mailslot is occupied.
+        :param bool refresh: Fetch the inventory again first (e.g. tapes were moved by hand).
+        """
+        logger = logging.getLogger('Client.eject_events')
+        autoloader, results = self.autoloader, list()
+
+        def event(kind, message, *args, **fields):
+            """Build an event and log it."""
+            fields.update(event=kind, message=message % args)
+            fields.setdefault('level', 'info')
+            if 'result' in fields:
+                results.append(fields['result'])
+            logger.debug('%s', fields['message'])
+            return fields
+
+        def result(tape, status, reason=None, source=None, seconds=0.0):
+            """Build a TapeResult event."""
+            message = '{}: {}.'.format(tape, reason) if reason else '{} {}.'.format(tape, status)
+            level = 'info' if status in ('ejected', 'missing') else 'error'
+            return event(status, '%s', message, level=level, tape=tape,
+                         result=TapeResult(tape, status, source, seconds, reason))
 
-    :ivar bool in_center_tag: If parser is within <center /> on the page. There's only one.
-    :ivar dict inventory: Populates this with the current inventory parsed from HTML.
-    """
+        try:
+            if not self.connected:
+                autoloader.connect()
+                self.connected = True
+            elif refresh:
+                autoloader.update_inventory()
+        except (AutoloaderError, HandledError):
+            for tape in sorted(set(tapes)):
+                yield result(tape, 'failed', 'autoloader error, see log')
+            yield event('done', 'Ejected 0 tapes.', level='error', results=results)
+            return
 
-    RE_ONCLICK = re.compile(r'from_to\((?:slot(\d+)|(drive|picker|mailslot))\)')
+        # Resolve patterns and drop tapes that can't be ejected.
+        inventory, candidates = autoloader.inventory, set()
+        requested = sorted(set(tapes))
+        patterns = [t for t in requested if is_pattern(t)]
+        matches = inventory.match(patterns) if patterns else dict()
+        for tape in requested:
+            if tape in matches:
+                if not matches[tape]:
+                    yield result(tape, 'missing', 'no tapes match')
+                candidates.update(matches[tape])
+            elif tape not in inventory:
+                yield result(tape, 'missing', 'not in autoloader')
+            elif inventory[tape] == 'mailslot':
+                yield result(tape, 'skipped', 'already in mailslot')
+            else:
+                candidates.add(tape)
+        plan = plan_ejects(inventory, candidates)
+        if plan:
+            yield event('planned', 'Ejecting %d tape(s): %s', len(plan), '|'.join(plan),
+                        tapes=plan)
+
+        stopped = None
+        for i, tape in enumerate(plan):
+            if stopped is None and autoloader.retry_policy.expired:
+                stopped = 'batch deadline reached'
+            if stopped is not None:
+                yield result(tape, 'skipped', stopped)
+                continue
+            source = inventory[tape]
+            try:
+                if prestage:
+                    autoloader.stage(tape)
+                if inventory.mailslot is not None:
+                    yield event('waiting', 'Tape in mailslot, remove to continue...', tape=tape)
+                if self.waiter is None:
+                    self.waiter = MailslotWaiter(signals=self.signals)
+                self.waiter.wait(autoloader)
+                left = len(plan) - i - 1
+                yield event('ejecting', 'Ejecting %s (%d other%s left)...', tape, left,
+                            '' if left == 1 else 's', tape=tape)
+                start = time.time()
+                autoloader.eject(tape)
+            except LockoutError as exc:
+                stopped = 'not attempted, {}'.format(exc.reason)
+                yield result(tape, 'failed', 'gave up, {}'.format(exc.reason), source,
+                             time.time() - start)
+            except RetryError as exc:
+                yield result(tape, 'failed', 'gave up, {}'.format(exc.reason), source,
+                             time.time() - start)
+            except (AutoloaderError, HandledError):
+                stopped = 'not attempted after an autoloader error'
+                yield result(tape, 'failed', 'autoloader error, see log', source)
+            else:
+                yield result(tape, 'ejected', source=source, seconds=time.time() - start)
 
-    def __init__(self, inventory):
-        """Constructor."""
-        HTMLParser.HTMLParser.__init__(self)
-        self.in_center_tag = False
-        self.inventory = inventory
+        ejected = sum(1 for r in results if r.status == 'ejected')
+        level = 'info' if ejected == len(results) else 'error'
+        yield event('done', 'Ejected %d of %d tape(s).', ejected, len(results), level=level,
+                    results=results)
 
-    def handle_starttag(self, tag, attrs):
-        """Called on all starting tags.
 
-        :param str tag: Current HTML tag (e.g. 'center' or 'img').
-        :param list attrs: List of attributes (key value pairs) on this HTML tag.
-        """
-        if tag == 'center':
-            self.in_center_tag = True
-        elif tag == 'img' and self.in_center_tag:
-            attributes = dict(attrs)
-            if 'onclick' in attributes and 'title' in attributes:
-                self.update_slot(attributes)
+class EjectJob(object):
+    """Tapes one client asked the daemon to eject.
 
-    def handle_endtag(self, tag):
-        """Called on all ending/closing tags.
+    :cvar itertools.count IDS: Job ID generator.
 
-        :param str tag: Current HTML tag (e.g. 'center' or 'img').
-        """
-        if tag == 'center':
-            self.in_center_tag = False
+    :ivar Queue.Queue events: Progress events (dicts) streamed back to the client.
+    :ivar int ejected: Number of tapes ejected so far.
+    :ivar int job_id: Job ID.
+    :ivar set pending: Tapes left to eject.
+    :ivar list tapes: All tapes requested.
+    """
 
-    def update_slot(self, attrs):
-        """Update self.inventory with current state of a single slot.
+    IDS = itertools.count(1)
 
-        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+    def __init__(self, tapes):
+        """Constructor.
 
-        :param dict attrs: Attributes of <img /> tag representing a slot.
+        :param iter tapes: Tapes to eject.
         """
-        logger = logging.getLogger('TapePos.update_slot')
-        logger.debug('img tag attributes: %s', str(attrs))
-        onclick, tape = attrs['onclick'], attrs['title']
-        if tape == 'Empty':
-            return
-        try:
-            slot = [i for i in self.RE_ONCLICK.match(onclick).groups() if i][0]
-        except AttributeError:
-            logger.error('Attribute "onclick" in img tag is invalid: %s', onclick)
-            raise HandledError
-        self.inventory[tape] = slot
+        self.events = Queue.Queue()
+        self.ejected = 0
+        self.job_id = next(self.IDS)
+        self.pending = set(tapes)
+        self.tapes = sorted(self.pending)
+
+    def emit(self, event, message, *args, **kwargs):
+        """Send a progress event to the client.
+
+        :param str event: Event type (e.g. 'ejecting' or 'done').
+        :param str message: Human readable log message, formatted with args.
+        :param args: Message arguments.
+        :param kwargs: Additional event fields (e.g. tape='00001FA', level='error').
+        """
+        kwargs.update(event=event, job=self.job_id, message=message % args)
+        kwargs.setdefault('level', 'info')
+        self.events.put(kwargs)
 
 
-class Autoloader(object):
-    """Interfaces with the autoloader over its HTTP web interface.
+class EjectDaemon(object):
+    """Long running eject service. One Autoloader instance shared by all clients.
 
-    :cvar int DELAY: Number of seconds to wait between queries. The web interface is very fragile.
-    :cvar int DELAY_ERROR: Number of seconds to wait if we get an error from the autoloader.
+    Clients connect to a Unix socket and send one JSON line: {"tapes": ["00001FA", ...]}. Every
+    queued job is merged into one move plan. Jobs take turns so a big job can't starve a small one.
+    Progress events are streamed back to each client as JSON lines until a "done" event.
 
-    :ivar str auth: HTTP basic authentication credentials (base64 encoded).
-    :ivar dict inventory: Tape positions. 16 slots + drive (17), picker (18), and mail slot (19).
-    :ivar float last_access: Unix time of last HTTP query.
-    :ivar str url: URL prefix of the autoloader (e.g. 'http://192.168.0.50/').
+    :ivar Autoloader autoloader: Autoloader instance.
+    :ivar threading.Condition condition: Guards jobs and stale. Notified on new jobs.
+    :ivar list jobs: Queued EjectJob instances in turn order.
+    :ivar server: SocketServer.UnixStreamServer instance.
+    :ivar str socket_path: Unix socket file path.
+    :ivar bool stale: If the inventory needs to be refreshed to validate new jobs.
+    :ivar MailslotWaiter waiter: Waits for the mailslot to be emptied.
     """
 
-    DELAY = 10
-    DELAY_ERROR = 15
-
-    def __init__(self, host_name, user_name, pass_word):
+    def __init__(self, autoloader, socket_path, waiter=None):
         """Constructor.
 
-        :param str host_name: Hostname or IP address of the autoloader.
-        :param str user_name: HTTP username (e.g. 'admin').
-        :param str pass_word: HTTP password.
+        :param Autoloader autoloader: Autoloader instance.
+        :param str socket_path: Unix socket file path.
+        :param MailslotWaiter waiter: Waits for the mailslot to be emptied.
         """
-        self.auth = base64.standard_b64encode(':'.join((user_name, pass_word)))
-        self.inventory = dict()
-        self.last_access = time.time() - self.DELAY
-        self.url = 'http://{}/'.format(host_name)
+        self.remove_stale(socket_path)
+        self.autoloader = autoloader
+        self.condition = threading.Condition()
+        self.jobs = list()
+        self.socket_path = socket_path
+        self.stale = False
+        self.waiter = waiter or MailslotWaiter()
+        umask = os.umask(0o177)  # Only this user may queue ejects.
+        try:
+            self.server = ThreadingUnixStreamServer(socket_path, EjectDaemonHandler)
+        finally:
+            os.umask(umask)
+        self.server.daemon = self
 
-    def _query(self, request, no_delay=False):
-        """Query the autoloader's web interface. Enforces delay timer.
+    @staticmethod
+    def remove_stale(socket_path):
+        """Remove the socket file left behind by a daemon that was killed.
 
         :raise HandledError: On handled errors. Logs before raising. Program should exit.
-        :raise AutoloaderError: On HTTP 401 errors when querying the web interface.
-
-        :param urllib2.Request request: urllib2.Request instance with data/headers already added.
-        :param bool no_delay: Exclude this query from sleeping and updating last_access.
 
-        :return: HTML response payload.
-        :rtype: str
+        :param str socket_path: Unix socket file path.
         """
-        logger = logging.getLogger('Autoloader._query')
-        if not no_delay:
-            sleep_for = max(0, self.DELAY - (time.time() - self.last_access))
-            if sleep_for:
-                logger.debug('Sleeping for %d second(s).', sleep_for)
-                time.sleep(sleep_for)
-                logger.debug('Done sleeping.')
-            self.last_access = time.time()
-            logger.debug('Set last_access to %f', self.last_access)
-
-        # Send request and get response.
-        try:
-            response = urllib2.urlopen(request)
-        except urllib2.HTTPError as exc:
-            url = request.get_full_url()
-            if exc.code == 404:
-                logger.error('404 Not Found on: %s', url)
-            elif exc.code == 401:
-                logger.debug('401 Unauthorized on: %s', url)
-                raise AutoloaderError
-            else:
-                logger.error('%s returned HTTP %s instead of 200.', url, exc.code)
+        logger = logging.getLogger('EjectDaemon.remove_stale')
+        try:
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                logger.error('%s exists and is not a socket, not replacing it.', socket_path)
+                raise HandledError
+        except OSError as exc:
+            if exc.errno == errno.ENOENT:
+                return
+            logger.error('Failed to check %s: %s', socket_path, str(exc))
             raise HandledError
-        except urllib2.URLError as exc:
-            url = request.get_full_url()
-            logger.error('URL "%s" is invalid: %s', url, str(exc))
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(socket_path)
+        except socket.error as exc:
+            if exc.errno != errno.ECONNREFUSED:
+                logger.error('Failed to check %s: %s', socket_path, str(exc))
+                raise HandledError
+        else:
+            logger.error('Another daemon is listening on %s.', socket_path)
             raise HandledError
+        finally:
+            client.close()
+        logger.debug('Removing stale socket %s.', socket_path)
+        os.remove(socket_path)
+
+    def close(self):
+        """Stop accepting clients and remove the socket file."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.waiter.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def submit(self, tapes):
+        """Queue a job. Thread safe.
+
+        :param iter tapes: Tapes to eject.
+
+        :return: The queued job.
+        :rtype: EjectJob
+        """
+        job = EjectJob(tapes)
+        job.emit('queued', 'Queued job %d with %d tape(s).', job.job_id, len(job.tapes))
+        with self.condition:
+            self.jobs.append(job)
+            self.stale = True
+            self.condition.notify()
+        return job
+
+    def cancel(self, job):
+        """Stop ejecting tapes of a job (e.g. the client disconnected). Thread safe.
+
+        :param EjectJob job: The job to cancel.
+        """
+        with self.condition:
+            job.pending.clear()
 
-        html = response.read(102400)
-        logger.debug('Got HTML from autoloader: %s', html)
-        return html
+    def next_tape(self):
+        """Pick the next tape to eject. Jobs take turns, each in plan_ejects() order.
 
-    def check_creds(self):
-        """Check credentials by going to config_opts.html. Doesn't change anything.
+        Finished jobs are removed and sent their "done" event.
 
-        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+        :return: Tape (None if there's nothing to do yet) and every job that asked for it (first
+            one is the job whose turn it is).
+        :rtype: tuple
         """
-        logger = logging.getLogger('Autoloader.auth')
-        request = urllib2.Request(self.url + 'config_ops.html')
-        request.headers['Authorization'] = 'Basic {}'.format(self.auth)
+        with self.condition:
+            for job in [j for j in self.jobs if not j.pending]:
+                self.jobs.remove(job)
+                job.emit('done', 'Ejected %d of %d tape(s).', job.ejected, len(job.tapes),
+                         ejected=job.ejected)
+            if not self.jobs:
+                return None, []
+            self.jobs.append(self.jobs.pop(0))  # Next job's turn next time.
+            tapes = plan_ejects(self.autoloader.inventory, self.jobs[-1].pending)
+            if not tapes:  # Submitted since validate() or no longer ejectable. Drop them first.
+                self.stale = True
+                return None, []
+            tape = tapes[0]
+            jobs = [self.jobs[-1]] + [j for j in self.jobs[:-1] if tape in j.pending]
+        return tape, jobs
+
+    def validate(self):
+        """Refresh the inventory, resolve patterns, and drop tapes that can't be ejected."""
+        with self.condition:
+            self.stale = False
+        self.autoloader.update_inventory()
+        with self.condition:
+            for job in self.jobs:
+                patterns = [t for t in job.pending if is_pattern(t)]
+                if patterns:
+                    matches = self.autoloader.inventory.match(patterns)
+                    for pattern in patterns:
+                        if not matches[pattern]:
+                            job.emit('skipped', 'No tapes match %s, skipping.', pattern,
+                                     tape=pattern)
+                        job.pending.discard(pattern)
+                        job.pending.update(matches[pattern])
+                    job.tapes = sorted(set(job.tapes).difference(patterns).union(job.pending))
+                for tape in sorted(job.pending):
+                    slot = self.autoloader.inventory.get(tape)
+                    if slot is None:
+                        job.emit('skipped', '%s not in autoloader, skipping.', tape, tape=tape)
+                    elif slot == 'mailslot':
+                        job.emit('skipped', '%s already in mailslot, skipping.', tape, tape=tape,
+                                 level='error')
+                    else:
+                        continue
+                    job.pending.discard(tape)
+
+    def run(self):
+        """Serve clients in a background thread and eject tapes in this one. Runs forever."""
+        logger = logging.getLogger('EjectDaemon.run')
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        logger.info('Listening on %s', self.socket_path)
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait(1)  # Timeout so Control+C works.
+            self.step()
+
+    def step(self):
+        """Eject one tape from the queued jobs."""
+        logger = logging.getLogger('EjectDaemon.step')
         try:
-            self._query(request, no_delay=True)
+            if self.stale:
+                self.validate()
+            tape, jobs = self.next_tape()
+            if tape is None:
+                return
+            if self.autoloader.inventory.mailslot is not None:
+                for job in jobs:
+                    job.emit('waiting', 'Tape in mailslot, remove to continue...', tape=tape)
+            self.waiter.wait(self.autoloader)
+            for job in jobs:
+                left = len(job.pending) - 1
+                job.emit('ejecting', 'Ejecting %s (%d other%s left)...', tape, left,
+                         '' if left == 1 else 's', tape=tape)
+            self.autoloader.eject(tape)
         except AutoloaderError:
-            message = '%s 401 Unauthorized. Possibly rate limiting or invalid credentials.'
-            logger.error(message, request.get_full_url())
-            raise HandledError
+            delay_error = self.autoloader.rate_limiter.delay_error
+            logger.warning('Error while refreshing inventory. Retrying in %s seconds...',
+                           delay_error)
+            with self.condition:
+                self.stale = True
+            time.sleep(delay_error)
+            return
+        except (HandledError, LockoutError):
+            logger.error('Failed to eject, see above.')
+            with self.condition:
+                for job in self.jobs:
+                    job.emit('error', 'Autoloader error, see daemon log.', level='error')
+                    job.pending.clear()
+            return
+        except RetryError as exc:
+            logger.warning('Giving up on %s (%s): %s.', tape, exc.failure, exc.reason)
+            with self.condition:
+                for job in jobs:
+                    job.pending.discard(tape)
+                    job.emit('skipped', 'Gave up on %s: %s.', tape, exc.reason, tape=tape,
+                             level='error')
+            return
+        with self.condition:
+            for job in jobs:
+                if tape in job.pending:  # Not cancelled.
+                    job.pending.discard(tape)
+                    job.ejected += 1
+                job.emit('ejected', 'Ejected %s.', tape, tape=tape)
 
-    def eject(self, tape):
-        """Perform tape move to the mailslot thereby "ejecting" it.
 
-        Blocks during entire move operation. Once done self.inventory is updated.
+class ThreadingUnixStreamServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Handles each client in its own thread.
 
-        :param str tape: The tape to eject.
-        """
-        logger = logging.getLogger('Autoloader.eject')
-        slot = self.inventory[tape]
-        slot = int(dict(drive=17, mailslot=18, picker=19).get(slot, slot))
-        data = 'from={}&to=18&submit=submit'.format(slot)
-        logger.debug('Eject POST data: %s', data)
-        request = urllib2.Request(self.url + 'move.cgi', data)
-        request.headers['Authorization'] = 'Basic {}'.format(self.auth)
-        request.headers['Content-type'] = 'application/x-www-form-urlencoded'
-        request.headers['Origin'] = self.url.rstrip('/')
-        request.headers['Referer'] = self.url + 'commands.html'
+    :ivar EjectDaemon daemon: Set by EjectDaemon.
+    """
 
-        # Eject tape.
+    daemon = None
+    daemon_threads = True
+
+
+class EjectDaemonHandler(SocketServer.StreamRequestHandler):
+    """Handles one client connection to EjectDaemon."""
+
+    def handle(self):
+        """Read the job, submit it, and stream progress events back."""
+        logger = logging.getLogger('EjectDaemonHandler.handle')
+        daemon = self.server.daemon
+        try:
+            tapes = json.loads(self.rfile.readline())['tapes']
+            if not isinstance(tapes, list) or not tapes:
+                raise ValueError('no tapes')
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning('Invalid request from client: %s', str(exc))
+            message = {'event': 'done', 'level': 'error', 'message': 'Invalid request.'}
+            self.wfile.write(json.dumps(message) + '\n')
+            return
+        job = daemon.submit([str(t) for t in tapes])
         while True:
+            event = job.events.get()
             try:
-                html = self._query(request)
-            except AutoloaderError:
-                logger.warning('Error while ejecting. Retrying in %s seconds...', self.DELAY_ERROR)
-                time.sleep(self.DELAY_ERROR)
-                continue
-            self.update_inventory(html)
-            if tape not in self.inventory or self.inventory[tape] == 'mailslot':
-                break
-            if self.inventory[tape] == 'drive':
-                logger.warning('Failed, drive locked? Retrying in %s seconds...', self.DELAY_ERROR)
-            else:
-                logger.warning('Tape did not move. Retrying in %s seconds...', self.DELAY_ERROR)
-            time.sleep(self.DELAY_ERROR)
+                self.wfile.write(json.dumps(event) + '\n')
+                self.wfile.flush()
+            except socket.error:
+                logger.warning('Client of job %d disconnected, cancelling.', job.job_id)
+                daemon.cancel(job)
+                return
+            if event['event'] == 'done':
+                return
 
-    def update_inventory(self, html=None):
-        """Get current tape positions in the autoloader and updates self.inventory.
 
-        :raise HandledError: On handled errors. Logs before raising. Program should exit.
+def submit_to_daemon(socket_path, tapes):
+    """Send tapes to an EjectDaemon and log its progress events until done.
 
-        :param str html: Parse this html if set. Otherwise requests HTML from autoloader.
-        """
-        logger = logging.getLogger('Autoloader.update_inventory')
-        if not html:
-            request = urllib2.Request(self.url + 'commands.html')
-            html = self._query(request)
-        if not TapePos.RE_ONCLICK.search(html):
-            logger.error('Invalid HTML, found no regex matches.')
+    :raise HandledError: On handled errors. Logs before raising. Program should exit.
+
+    :param str socket_path: Unix socket file path.
+    :param list tapes: Tapes to eject.
+    """
+    logger = logging.getLogger('submit_to_daemon')
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except socket.error as exc:
+        logger.error('Failed to connect to daemon on %s: %s', socket_path, str(exc))
+        raise HandledError
+    failed = False
+    handle = client.makefile('rb')
+    try:
+        client.sendall(json.dumps({'tapes': tapes}) + '\n')
+        for line in iter(handle.readline, ''):
+            event = json.loads(line)
+            level = logging.ERROR if event.get('level') == 'error' else logging.INFO
+            logger.log(level, '%s', event['message'])
+            if event.get('event') == 'error':
+                failed = True
+            if event.get('event') == 'done':
+                failed |= level > logging.INFO
+                break
+        else:
+            logger.error('Daemon disconnected.')
             raise HandledError
-        parser = TapePos(self.inventory)
-        self.inventory.clear()
-        parser.feed(html)
-        logger.debug('Loaded tapes: %s', '|'.join(sorted(self.inventory)))
+    finally:
+        handle.close()
+        client.close()
+    if failed:
+        raise HandledError
+
+
+def plan_ejects(inventory, tapes):
+    """Order tapes to be ejected so the whole batch finishes as soon as possible.
+
+    Tapes already in the picker go first (shortest hop to the mailslot). Tapes in slots follow,
+    ordered by magazine and then by distance from the front of the magazine. Tapes in the drive go
+    last since they need to be unloaded first and are the most likely to be locked.
+
+    :param dict inventory: Tape positions from Autoloader.inventory.
+    :param iter tapes: Tapes to eject. Ignores tapes not in inventory or already in the mailslot.
+
+    :return: Ordered list of tapes to eject.
+    :rtype: list
+    """
+    def key(tape):
+        """Sort key: (position group, magazine, distance, barcode)."""
+        slot = inventory[tape]
+        if slot == 'picker':
+            return 0, 0, 0, tape
+        if slot == 'drive':
+            return 2, 0, 0, tape
+        magazine, distance = divmod(int(slot) - 1, MAGAZINE_SIZE)
+        return 1, magazine, distance, tape
+    return sorted((t for t in set(tapes) if inventory.get(t, 'mailslot') != 'mailslot'), key=key)
+
+
+def plan_loads(inventory, slots=MAGAZINE_SIZE * 2):
+    """Order empty slots to load tapes into, best first.
+
+    Uses the same order as plan_ejects() (by magazine, then by distance from the front of the
+    magazine) so loaded tapes end up where ejecting them later is cheapest.
+
+    :param dict inventory: Tape positions from Autoloader.inventory.
+    :param int slots: Number of storage slots in the autoloader.
+
+    :return: Empty slot numbers (e.g. ['3', '9']).
+    :rtype: list
+    """
+    occupied = set(inventory.values())
+    return [str(i) for i in range(1, slots + 1) if str(i) not in occupied]
+
+
+def move_kind(source, last_magazine):
+    """Classify an eject move for DurationHistory.
+
+    :param str source: Position the tape is ejected from (e.g. '3' or 'drive').
+    :param int last_magazine: Magazine of the previous slot move or None.
+
+    :return: Kind ('drive', 'picker', 'slot', or 'slot_switch') and the new last_magazine.
+    :rtype: tuple
+    """
+    if source in Inventory.NAMED:
+        return source, last_magazine
+    magazine = (int(source) - 1) // MAGAZINE_SIZE
+    switched = last_magazine is not None and magazine != last_magazine
+    return 'slot_switch' if switched else 'slot', magazine
+
+
+def estimate_duration(inventory, plan, delay, history=None):
+    """Estimate how long ejecting all tapes in a plan will take.
+
+    Doesn't include how long the operator takes to empty the mailslot between tapes.
+
+    :param dict inventory: Tape positions from Autoloader.inventory.
+    :param list plan: Ordered list of tapes from plan_ejects().
+    :param float delay: Number of seconds between queries (e.g. RateLimiter.delay).
+    :param DurationHistory history: Use latencies measured on previous runs. MOVE_SECONDS if None.
+
+    :return: Estimated number of seconds.
+    :rtype: float
+    """
+    total, magazine = 0.0, None
+    for tape in plan:
+        slot = inventory[tape]
+        if history is None:
+            total += delay + MOVE_SECONDS.get(slot, MOVE_SECONDS['slot'])
+            continue
+        kind, magazine = move_kind(slot, magazine)
+        total += delay + history.move_seconds(kind)
+    if len(plan) > 1:
+        # At least one commands.html poll for an empty mailslot.
+        query = history.mean('query', 0.0) if history else 0.0
+        total += (delay + query) * (len(plan) - 1)
+    return total
+
+
+def state_path(kind, host_name):
+    """Get the path to a per-host state file in the user's home directory.
+
+    :param str kind: Type of state (e.g. 'state').
+    :param str host_name: Hostname or IP address of the autoloader.
+
+    :return: File path (e.g. ~/.pv124t_state_192.168.0.50.json).
+    :rtype: str
+    """
+    file_name = '.pv124t_{}_{}.json'.format(kind, re.sub(r'[^\w.-]', '_', host_name))
+    return os.path.join(os.path.expanduser('~'), file_name)
+
+
+def atomic_write(path, data):
+    """Write data to a temporary file in the same directory then rename it over path.
+
+    Readers never see a partially written file.
+
+    :param str path: Destination file path.
+    :param str data: File contents.
+    """
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temp_path, 'w') as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.rename(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def is_pattern(selector):
+    """If a tape selector is a shell-style pattern to match against the inventory.
+
+    :param str selector: Tape barcode or pattern.
+
+    :return: If it has any of GLOB_CHARS.
+    :rtype: bool
+    """
+    return any(c in selector for c in GLOB_CHARS)
+
+
+def expand_range(selector):
+    """Expand a range of barcodes (e.g. '00001FA..00016FA') into every barcode in between.
+
+    Both ends must be the same length and only differ in one run of digits. Leading zeros are kept.
+
+    :raise ValueError: If the range is invalid.
+
+    :param str selector: Range of barcodes or one barcode.
+
+    :return: Barcodes in order.
+    :rtype: list
+    """
+    if '..' not in selector:
+        return [selector]
+    first, last = selector.split('..', 1)
+    if not first or len(first) != len(last):
+        raise ValueError(selector)
+    differ = [i for i, (a, b) in enumerate(zip(first, last)) if a != b]
+    if not differ:
+        return [first]
+    start, end = differ[0], differ[-1] + 1
+    while start and first[start - 1].isdigit():
+        start -= 1
+    while end < len(first) and first[end].isdigit():
+        end += 1
+    low, high = first[start:end], last[start:end]
+    if not (low.isdigit() and high.isdigit()) or int(low) > int(high):
+        raise ValueError(selector)
+    return ['{}{:0{}d}{}'.format(first[:start], i, len(low), first[end:])
+            for i in range(int(low), int(high) + 1)]
+
+
+def read_selectors(arguments, stdin=None):
+    """Split tape selectors from the command line, reading lists from files or stdin lazily.
+
+    '-' reads stdin and '@FILE' reads FILE, one or more selectors per line. Everything is space
+    or | delimited.
+
+    :raise IOError: If a file can't be read.
+
+    :param iter arguments: Command line arguments.
+    :param file stdin: Read '-' from here instead of sys.stdin.
+
+    :return: Generator yielding selectors (barcodes, ranges, or patterns).
+    """
+    def split(lines):
+        """Yield selectors from lines."""
+        for line in lines:
+            for selector in line.replace('|', ' ').split():
+                yield selector
+
+    for argument in arguments:
+        if argument == '-':
+            for selector in split(stdin or sys.stdin):
+                yield selector
+        elif argument.startswith('@'):
+            with open(argument[1:]) as handle:
+                for selector in split(handle):
+                    yield selector
+        else:
+            for selector in split([argument]):
+                yield selector
 
 
 def get_arguments(argv=None):
@@ -274,14 +3192,74 @@ def get_arguments(argv=None):
     """
     program = os.path.basename(__file__).replace('.pyc', '.py')
     parser = argparse.ArgumentParser(prog=program, description=__doc__)
+    parser.add_argument('-C', '--cache-ttl', default=60, metavar='SECONDS', type=float,
+                        help='reuse inventory from a previous run this recent, 0 to disable '
+                             '(default: %(default)s)')
+    parser.add_argument('-c', '--conservative', action='store_true',
+                        help='use fixed delays between queries instead of learning them')
+    parser.add_argument('-D', '--deadline', metavar='SECONDS', type=float,
+                        help='stop retrying and skip the remaining tapes after this long')
+    parser.add_argument('-d', '--daemon', metavar='SOCKET',
+                        help='run as a daemon accepting eject jobs on this Unix socket')
+    parser.add_argument('-f', '--fifo', metavar='PATH',
+                        help='check the mailslot now when anything is written to this FIFO')
+    parser.add_argument('-l', '--load', metavar='COUNT', type=int,
+                        help='load this many tapes inserted into the mailslot into empty slots')
+    parser.add_argument('--log-excerpt', default=0, metavar='BYTES', type=int,
+                        help='with -v also log this many bytes of each response besides its '
+                             'size and digest')
+    parser.add_argument('--log-json', action='store_true',
+                        help='log JSON lines with request IDs instead of plain text')
+    parser.add_argument('-m', '--metrics', metavar='FILE',
+                        help='write a JSON summary of where the time went to this file')
+    parser.add_argument('-n', '--no-keep-alive', action='store_true',
+                        help='open a new HTTP connection for every request')
+    parser.add_argument('-P', '--parser', choices=PARSERS, default='regex',
+                        help='commands.html parser backend (default: %(default)s)')
+    parser.add_argument('-p', '--plan', '--dry-run', action='store_true',
+                        help='print move order and estimated duration then exit')
+    parser.add_argument('--record', metavar='FILE',
+                        help='save all HTTP requests and responses to this cassette file')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay responses from this cassette file instead of the autoloader')
+    parser.add_argument('--replay-speed', default=1.0, metavar='X', type=float,
+                        help='replay this many times faster than recorded, 0 for no waiting '
+                             '(default: %(default)s)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the last interrupted batch or rotation from its journal')
+    parser.add_argument('-R', '--retries', metavar='COUNT', type=int,
+                        help='skip a tape after this many failed moves (default: never)')
+    parser.add_argument('-r', '--rotate', action='append', metavar='TAPES',
+                        help='tapes to load in place of the ejected ones, space or | delimited')
+    parser.add_argument('-S', '--prestage', action='store_true',
+                        help='move the next tape into the picker while waiting on the mailslot')
+    parser.add_argument('-s', '--socket', metavar='SOCKET',
+                        help='send tapes to the daemon listening on this Unix socket')
+    parser.add_argument('-T', '--tape-deadline', metavar='SECONDS', type=float,
+                        help='skip a tape if it still hasn\'t moved after this long')
+    parser.add_argument('-t', '--textfile', metavar='FILE',
+                        help='write metrics in Prometheus format for node_exporter (*.prom)')
     parser.add_argument('-v', '--verbose', action='store_true', help='print debug messages')
-    parser.add_argument('tapes', nargs='+', metavar='TAPE', type=str,
-                        help='list of tapes, space or | delimited.')
-    return parser.parse_args(args=argv if argv is not None else sys.argv[1:])
+    parser.add_argument('tapes', nargs='*', metavar='TAPE', type=str,
+                        help='list of tapes, space or | delimited. Also ranges '
+                             '(00001FA..00016FA), patterns (0001*), - for stdin, or @FILE.')
+    arguments = parser.parse_args(args=argv if argv is not None else sys.argv[1:])
+    if not any((arguments.tapes, arguments.daemon, arguments.load, arguments.rotate,
+                arguments.resume)):
+        parser.error('too few arguments')
+    if arguments.resume and any((arguments.tapes, arguments.daemon, arguments.load,
+                                 arguments.rotate, arguments.replay)):
+        parser.error('--resume cannot be combined with tapes, --daemon, --load, --rotate, or '
+                     '--replay')
+    if arguments.load and (arguments.tapes or arguments.rotate):
+        parser.error('--load cannot be combined with tapes to eject or --rotate')
+    if arguments.record and arguments.replay:
+        parser.error('--record cannot be combined with --replay')
+    return arguments
 
 
 def setup_logging(arguments, logger=None):
-    """Setup console logging. Info and below go to stdout, others go to stderr.
+    """Setup console logging. Info and below go to stdout, others go to stderr. JSON if log_json.
 
     :param arguments: Argparse Namespace object from get_arguments().
     :param str logger: Which logger to set handlers to. Used for testing.
@@ -291,14 +3269,15 @@ def setup_logging(arguments, logger=None):
     verbose = arguments.verbose
     format_ = '%(asctime)s %(levelname)-8s %(name)-20s %(message)s' if verbose else '%(message)s'
     level = logging.DEBUG if verbose else logging.INFO
+    log_json = getattr(arguments, 'log_json', False)
 
     handler_stdout = logging.StreamHandler(sys.stdout)
-    handler_stdout.setFormatter(logging.Formatter(format_))
+    handler_stdout.setFormatter(JsonFormatter() if log_json else logging.Formatter(format_))
     handler_stdout.setLevel(logging.DEBUG)
     handler_stdout.addFilter(InfoFilter())
 
     handler_stderr = logging.StreamHandler(sys.stderr)
-    handler_stderr.setFormatter(logging.Formatter(format_))
+    handler_stderr.setFormatter(JsonFormatter() if log_json else logging.Formatter(format_))
     handler_stderr.setLevel(logging.WARNING)
 
     root_logger = logging.getLogger(logger)
@@ -321,24 +3300,47 @@ def combine_config(arguments):
     """
     logger = logging.getLogger('combine_config')
 
-    # Get list of tapes from arguments.
-    logger.debug('Reading arguments.tapes: %s', str(arguments.tapes))
-    tapes = sorted(set('|'.join(arguments.tapes).replace(' ', '|').strip().strip('|').split('|')))
-    if not tapes or not all(tapes):
+    # Get list of tapes from arguments. Patterns are resolved later against the inventory.
+    logger.debug('Reading arguments.tapes: %s', arguments.tapes)
+    tapes = set()
+    try:
+        for selector in read_selectors(arguments.tapes):
+            tapes.update(expand_range(selector))
+    except IOError as exc:
+        logger.error('Failed to read tapes from %s: %s', exc.filename, exc.strerror)
+        raise HandledError
+    except ValueError as exc:
+        logger.error('Invalid range of tapes: %s', exc.args[0])
+        raise HandledError
+    tapes = sorted(tapes)
+    if not tapes and not (arguments.daemon or arguments.load or arguments.rotate or
+                          arguments.resume):
         logger.error('No tapes specified.')
         raise HandledError
-    logger.debug('Got: %s', str(tapes))
+    logger.debug('Got: %s', tapes)
+    rotate = None
+    if arguments.rotate:
+        try:
+            selectors = read_selectors(arguments.rotate)
+            rotate = sorted(set(t for s in selectors for t in expand_range(s)))
+        except (IOError, ValueError) as exc:
+            logger.error('Invalid tapes to load: %s', exc)
+            raise HandledError
+        if not rotate:
+            logger.error('No tapes to load specified.')
+            raise HandledError
+        logger.debug('Loading: %s', rotate)
 
     # Read config file.
     json_file = os.path.join(os.path.expanduser('~'), '.pv124t.json')
     logger.debug('Reading: %s', json_file)
     try:
         with open(json_file) as handle:
-            json_file_data = handle.read(1024)
+            json_file_data = handle.read(16384)
     except IOError as exc:
         logger.error('Failed to read %s: %s', json_file, str(exc))
         raise HandledError
-    logger.debug('Got: %s', json_file_data)
+    logger.debug('Got: %s', Payload(json_file_data))  # Not the contents, they have passwords.
 
     # Parse config file json.
     try:
@@ -346,13 +3348,12 @@ def combine_config(arguments):
     except ValueError as exc:
         logger.error('Failed to parse json in %s: %s', json_file, exc.message)
         raise HandledError
-    logger.debug('Got: %s', str(json_parsed))
 
-    # Read values from json.
+    # Read values from json. Fleets list several autoloaders under "units".
     try:
-        host_name = json_parsed['host']
-        user_name = json_parsed['user']
-        pass_word = json_parsed['pass']
+        fleet = 'units' in json_parsed
+        units = json_parsed['units'] if fleet else [json_parsed]
+        units = [(u['host'], u['user'], u['pass']) for u in units]
     except TypeError:
         logger.error('JSON data not a dictionary.')
         raise HandledError
@@ -361,53 +3362,428 @@ def combine_config(arguments):
         raise HandledError
 
     # Catch empty values.
-    if not all((host_name, user_name, pass_word)):
+    if not units or not all(all(u) for u in units):
         logger.error('One or more JSON value is empty.')
         raise HandledError
+    host_name, user_name, pass_word = units[0]
+    if arguments.daemon and len(units) > 1:
+        logger.error('Daemon mode supports only one autoloader.')
+        raise HandledError
+    if (arguments.load or arguments.rotate) and len(units) > 1:
+        logger.error('Load and rotation modes support only one autoloader.')
+        raise HandledError
+    if arguments.resume and len(units) > 1:
+        logger.error('Resuming supports only one autoloader.')
+        raise HandledError
+    if (arguments.record or arguments.replay) and len(units) > 1:
+        logger.error('Recording and replaying support only one autoloader.')
+        raise HandledError
 
-    return {'tapes': tapes, 'host': host_name, 'user': user_name, 'pass': pass_word}
+    return {
+        'adaptive': not arguments.conservative,
+        'cache_ttl': arguments.cache_ttl,
+        'daemon': arguments.daemon,
+        'deadline': arguments.deadline,
+        'fifo': arguments.fifo,
+        'history': not arguments.replay,
+        'journal': not arguments.replay,
+        'keep_alive': not arguments.no_keep_alive,
+        'load': arguments.load,
+        'log_excerpt': arguments.log_excerpt,
+        'metrics': arguments.metrics,
+        'parser': arguments.parser,
+        'socket': arguments.socket,
+        'textfile': arguments.textfile,
+        'plan': arguments.plan,
+        'prestage': arguments.prestage,
+        'record': arguments.record,
+        'replay': arguments.replay,
+        'replay_speed': arguments.replay_speed,
+        'resume': arguments.resume,
+        'retries': arguments.retries,
+        'rotate': rotate,
+        'tape_deadline': arguments.tape_deadline,
+        'tapes': tapes,
+        'units': [dict(host=h, user=u, **{'pass': p}) for h, u, p in units] if fleet else None,
+        'host': host_name,
+        'user': user_name,
+        'pass': pass_word,
+    }
+
+
+def select_tapes(inventory, requested, logger):
+    """Resolve patterns in requested tapes against the inventory in one pass.
+
+    :param dict inventory: Tape positions from Autoloader.inventory.
+    :param iter requested: Tape barcodes and patterns (e.g. '0001*').
+    :param logger: Logger (or logging.LoggerAdapter) to log patterns that matched nothing to.
+
+    :return: Sorted tape barcodes.
+    :rtype: list
+    """
+    tapes, patterns = set(), list()
+    for selector in requested:
+        (patterns.append if is_pattern(selector) else tapes.add)(selector)
+    if patterns:
+        matches = inventory.match(patterns)
+        for pattern in patterns:
+            if not matches[pattern]:
+                logger.info('No tapes match %s, skipping.', pattern)
+            tapes.update(matches[pattern])
+    return sorted(tapes)
+
+
+def select_ejects(inventory, requested, logger):
+    """Drop (and log) tapes that can't be ejected then order the rest with plan_ejects().
+
+    :param dict inventory: Tape positions from Autoloader.inventory.
+    :param list requested: Tapes to eject. Patterns are resolved with select_tapes().
+    :param logger: Logger (or logging.LoggerAdapter) to log skipped tapes to.
+
+    :return: Ordered list of tapes to eject.
+    :rtype: list
+    """
+    requested = select_tapes(inventory, requested, logger)
+    for tape in requested:
+        if tape not in inventory:
+            logger.info('%s not in autoloader, skipping.', tape)
+        elif inventory[tape] == 'mailslot':
+            logger.error('%s already in mailslot, skipping.', tape)
+    return plan_ejects(inventory, requested)
 
 
-def main(config):
-    """Main function of program.
+def log_estimate(autoloader, tapes, logger, loads=0):
+    """Log the estimated duration of a plan, and of barcode order when learned move times exist.
 
-    :param dict config: Parsed command line and config file data.
+    :param Autoloader autoloader: Autoloader instance with an up to date inventory.
+    :param list tapes: Ordered list of tapes to eject from plan_ejects().
+    :param logger: Logger (or logging.LoggerAdapter) to log the estimate to.
+    :param int loads: Number of tapes loaded from the mailslot as well.
     """
-    logger = logging.getLogger('main')
-    logger.info('Connecting to autoloader and reading tape inventory...')
-    autoloader = Autoloader(config['host'], config['user'], config['pass'])
-    autoloader.check_creds()
-    autoloader.update_inventory()
-
-    # Purge missing tapes.
-    tapes = list()
-    for tape in reversed(config['tapes']):
-        if tape not in autoloader.inventory:
-            logger.info('%s not in autoloader, skipping.', tape)
-            continue
-        if autoloader.inventory[tape] == 'mailslot':
-            logger.error('%s already in mailslot, skipping.', tape)
-            continue
-        tapes.append(tape)
+    history, delay = autoloader.history, autoloader.rate_limiter.delay
+    extra = 0.0
+    if loads:
+        load = history.mean('load', MOVE_SECONDS['slot']) if history else MOVE_SECONDS['slot']
+        extra = (delay + load) * loads
+    seconds = estimate_duration(autoloader.inventory, tapes, delay, history) + extra
+    logger.info('Estimated duration: %d minute(s) plus mailslot waits.',
+                int(math.ceil(seconds / 60)))
+    if history is None:
+        return
+    if history.moves:
+        logger.info('Based on %d move(s) measured on previous runs.', history.moves)
+    else:
+        logger.info('No moves measured on previous runs yet, using default move times.')
+    barcode = estimate_duration(autoloader.inventory, sorted(tapes), delay, history) + extra
+    logger.info('Ejecting in barcode order instead would take %d minute(s) (%+d seconds).',
+                int(math.ceil(barcode / 60)), int(round(barcode - seconds)))
+
+
+def run_batch(autoloader, requested, waiter, logger, plan_only=False, prestage=False,
+              journal=None):
+    """Eject tapes from one autoloader with an up to date inventory, in plan_ejects() order.
+
+    :param Autoloader autoloader: Autoloader instance.
+    :param list requested: Tapes to eject. Skips (and logs) tapes not in inventory or mailslot.
+    :param MailslotWaiter waiter: Waits for the mailslot to be emptied between tapes.
+    :param logger: Logger (or logging.LoggerAdapter) to log progress to.
+    :param bool plan_only: Log eject order and estimated duration instead of ejecting.
+    :param bool prestage: Move the next tape into the picker while the mailslot is occupied.
+    :param Journal journal: Record the plan and every move here so the batch can be resumed.
+    """
+    tapes = select_ejects(autoloader.inventory, requested, logger)
     if not tapes:
-        logging.info('No tapes to eject. Nothing to do.')
+        logger.info('No tapes to eject. Nothing to do.')
+        if journal and not plan_only:
+            journal.done()  # Otherwise --resume keeps finding the same empty batch.
         return
 
+    # Print plan.
+    if plan_only:
+        for i, tape in enumerate(tapes, 1):
+            logger.info('%d. %s from %s', i, tape, autoloader.inventory[tape])
+        log_estimate(autoloader, tapes, logger)
+        return
+    if journal:
+        journal.plan('batch', tapes, [], autoloader.inventory)
+    tapes.reverse()
+
+    ejected, skipped = 0, list()
     while tapes:
-        # Make sure mailslot is clear.
-        if 'mailslot' in autoloader.inventory.values():
-            logger.info('Tape in mailslot, remove to continue...')
-            autoloader.update_inventory()
-            continue
+        if autoloader.retry_policy.expired:
+            logger.warning('Batch deadline reached, not starting the remaining tapes.')
+            skipped.extend(reversed(tapes))
+            break
+
+        # Make sure mailslot is clear. Use the wait to bring the next tape closer.
+        if prestage:
+            autoloader.stage(tapes[-1])
+        waiter.wait(autoloader)
 
         # Eject.
         tape = tapes.pop()
         left = len(tapes)
         logger.info('Ejecting %s (%d other%s left)...', tape, left, '' if left == 1 else 's')
-        autoloader.eject(tape)
+        source = autoloader.inventory[tape]
+        if journal:
+            journal.issued(tape, source, 'mailslot')
+        try:
+            autoloader.eject(tape)
+        except LockoutError as exc:
+            logger.error('Giving up on %s and the remaining tapes: %s.', tape, exc.reason)
+            skipped.append(tape)
+            skipped.extend(reversed(tapes))
+            break
+        except RetryError as exc:
+            logger.warning('Giving up on %s (%s): %s. Continuing with the rest.', tape,
+                           exc.failure, exc.reason)
+            skipped.append(tape)
+            continue
+        if journal:
+            journal.confirmed(tape, source, 'mailslot', autoloader.inventory)
+        ejected += 1
+
+    logger.info('Ejected %d tape%s.', ejected, '' if ejected == 1 else 's')
+    if journal and not skipped:  # Skipped tapes are retried with --resume.
+        journal.done()
+    if skipped:
+        logger.error('Skipped %d tape%s: %s', len(skipped), '' if len(skipped) == 1 else 's',
+                     '|'.join(skipped))
+        raise HandledError
+
+
+def run_load(autoloader, count, waiter, logger):
+    """Load tapes inserted into the mailslot one at a time into empty slots.
+
+    :param Autoloader autoloader: Autoloader instance with an up to date inventory.
+    :param int count: Stop after loading this many tapes.
+    :param MailslotWaiter waiter: Waits for the operator to insert each tape.
+    :param logger: Logger (or logging.LoggerAdapter) to log progress to.
+    """
+    loaded = 0
+    while loaded < count:
+        slots = plan_loads(autoloader.inventory)
+        if not slots:
+            logger.warning('No empty slots left.')
+            break
+        waiter.wait(autoloader, empty=False)
+        tape, left = autoloader.inventory.mailslot, count - loaded - 1
+        logger.info('Loading %s into slot %s (%d other%s left)...', tape, slots[0], left,
+                    '' if left == 1 else 's')
+        if autoloader.load(tape, slots[0]):
+            loaded += 1
+    logger.info('Loaded %d tape%s.', loaded, '' if loaded == 1 else 's')
+
+
+def run_rotate(autoloader, out_tapes, in_tapes, waiter, logger, plan_only=False, journal=None):
+    """Eject and load tapes in one pass, swapping tapes at every mailslot visit.
+
+    After each eject the operator takes the ejected tape out of the mailslot and puts the next
+    tape to load in. That tape is loaded into the slot the ejected tape came from. Leftover ejects
+    or loads run the same way without a partner.
+
+    :param Autoloader autoloader: Autoloader instance with an up to date inventory.
+    :param list out_tapes: Tapes to eject.
+    :param list in_tapes: Tapes to load.
+    :param MailslotWaiter waiter: Waits for the operator to swap tapes.
+    :param logger: Logger (or logging.LoggerAdapter) to log progress to.
+    :param bool plan_only: Log eject order and estimated duration instead of moving tapes.
+    :param Journal journal: Record the plan and every move here so the rotation can be resumed.
+    """
+    inventory = autoloader.inventory
+    tapes = select_ejects(inventory, out_tapes, logger)
+    incoming = list()
+    for tape in in_tapes:
+        if inventory.get(tape, 'mailslot') != 'mailslot':
+            logger.info('%s already in autoloader, skipping.', tape)
+        else:
+            incoming.append(tape)
+    if plan_only:
+        for i, tape in enumerate(tapes, 1):
+            partner = ' then load {}'.format(incoming[i - 1]) if i <= len(incoming) else ''
+            logger.info('%d. %s from %s%s', i, tape, inventory[tape], partner)
+        for i, tape in enumerate(incoming[len(tapes):], len(tapes) + 1):
+            logger.info('%d. Load %s', i, tape)
+        log_estimate(autoloader, tapes, logger, len(incoming))
+        return
+    if journal:
+        journal.plan('rotate', tapes, incoming, inventory)
+    freed, ejected, loaded, last, skipped = list(), 0, 0, None, list()
+
+    while tapes or incoming:
+        if autoloader.retry_policy.expired:
+            logger.warning('Batch deadline reached, not starting the remaining tapes.')
+            skipped.extend(tapes + incoming)
+            break
+        arrived = inventory.mailslot
+        if arrived is not None and arrived != last and arrived not in incoming:
+            logger.warning('%s is not a tape to load, remove it from the mailslot.', arrived)
+            last = arrived  # Waited out like an ejected tape.
+        elif arrived is not None and arrived != last:
+            # Load the tape the operator inserted, preferably into the last freed slot.
+            slot = freed.pop(0) if freed else next(iter(plan_loads(inventory)), None)
+            if slot is None:
+                logger.warning('No empty slots left.')
+                break
+            incoming.remove(arrived)
+            logger.info('Loading %s into slot %s (%d other%s left)...', arrived, slot,
+                        len(incoming), '' if len(incoming) == 1 else 's')
+            if journal:
+                journal.issued(arrived, 'mailslot', slot)
+            if autoloader.load(arrived, slot):
+                if journal:
+                    journal.confirmed(arrived, 'mailslot', slot, inventory)
+                loaded += 1
+            last = None
+        elif tapes and arrived is None:
+            tape = tapes.pop(0)
+            source, left = inventory[tape], len(tapes)
+            logger.info('Ejecting %s (%d other%s left)...', tape, left, '' if left == 1 else 's')
+            if journal:
+                journal.issued(tape, source, 'mailslot')
+            try:
+                if not autoloader.eject(tape, give_up=bool(incoming)):
+                    tapes.insert(0, tape)  # Operator inserted a tape first, load it then retry.
+                    continue
+            except LockoutError as exc:
+                logger.error('Giving up on %s and the remaining tapes: %s.', tape, exc.reason)
+                skipped.extend([tape] + tapes + incoming)
+                break
+            except RetryError as exc:
+                logger.warning('Giving up on %s (%s): %s. Continuing with the rest.', tape,
+                               exc.failure, exc.reason)
+                skipped.append(tape)
+                continue
+            if journal:
+                journal.confirmed(tape, source, 'mailslot', inventory)
+            ejected += 1
+            if source not in Inventory.NAMED:
+                freed.append(source)
+            last = tape
+            if incoming:
+                logger.info('Swap %s in the mailslot for %s.', tape, incoming[0])
+        elif incoming:
+            waiter.wait(autoloader, empty=False, ignore=last)
+        else:
+            waiter.wait(autoloader)
+
+    logger.info('Ejected %d tape%s and loaded %d tape%s.', ejected, '' if ejected == 1 else 's',
+                loaded, '' if loaded == 1 else 's')
+    if journal and not skipped:  # Skipped tapes are retried with --resume.
+        journal.done()
+    if skipped:
+        logger.error('Skipped %d tape%s: %s', len(skipped), '' if len(skipped) == 1 else 's',
+                     '|'.join(skipped))
+        raise HandledError
+
+
+def build_autoloader(config, metrics=None):
+    """Create an Autoloader instance configured from the command line and config file.
+
+    :raise HandledError: On handled errors. Logs before raising. Program should exit.
+
+    :param dict config: Parsed command line and config file data.
+    :param Metrics metrics: Record timings here. Defaults to a new instance.
+
+    :return: Autoloader instance.
+    :rtype: Autoloader
+    """
+    logger = logging.getLogger('build_autoloader')
+    speed = config.get('replay_speed', 1.0)
+    if config.get('replay'):  # Delays scaled like the responses. Nothing learned or cached.
+        delays = (Autoloader.DELAY / speed, Autoloader.DELAY_ERROR / speed) if speed else (0, 0)
+        rate_limiter = RateLimiter(*delays)
+    elif config.get('adaptive'):
+        rate_limiter = AdaptiveRateLimiter(config['host'], Autoloader.DELAY)
+    else:  # Still shares delays with other processes.
+        rate_limiter = RateLimiter(Autoloader.DELAY, Autoloader.DELAY_ERROR,
+                                   state_path('state', config['host']))
+    session = Session(config['host']) if config.get('keep_alive') else None
+    cache_ttl = config.get('cache_ttl')
+    cache = InventoryCache(config['host'], cache_ttl) if cache_ttl else None
+    cassette = config.get('record') or config.get('replay')
+    if cassette:
+        try:
+            session = Cassette(cassette, bool(config.get('replay')), speed, session)
+        except (IOError, ValueError) as exc:
+            logger.error('Failed to open cassette %s: %s', cassette, str(exc))
+            raise HandledError
+        cache = None  # Replays must send the same requests as recordings.
+    retry_policy = RetryPolicy(config.get('retries'), config.get('tape_deadline'),
+                               config.get('deadline'))
+    history = DurationHistory(config['host']) if config.get('history') else None
+    parser_class = PARSERS[config['parser']] if config.get('parser') else None
+    return Autoloader(config['host'], config['user'], config['pass'], rate_limiter, session, cache,
+                      metrics, retry_policy, history, config.get('log_excerpt') or 0, parser_class)
+
+
+def run(config, metrics):
+    """Connect to the autoloader(s) then eject tapes or serve as a daemon.
+
+    :param dict config: Parsed command line and config file data.
+    :param Metrics metrics: Record timings here.
+    """
+    logger = logging.getLogger('main')
+    logger.info('Connecting to autoloader and reading tape inventory...')
+    if config.get('units'):
+        fleet = Fleet([build_autoloader(dict(config, **u), metrics) for u in config['units']])
+        fleet.run(config['tapes'], config.get('plan'), config.get('prestage'))
+        return
+    autoloader = build_autoloader(config, metrics)
+    session = autoloader.session
+    journal = Journal(config['host']) if config.get('journal') else None
+    resumed = journal.resume() if journal and config.get('resume') else None
+    if config.get('resume'):
+        if resumed is None:
+            logger.error('Nothing to resume, the last batch finished.')
+            raise HandledError
+        logger.info('Resuming the last batch with %d tape(s) to eject and %d to load.',
+                    len(resumed['ejects']), len(resumed['loads']))
+        if resumed['pending']:
+            logger.info('It stopped while moving %s from %s to %s.', *resumed['pending'])
+        config = dict(config, tapes=resumed['ejects'], rotate=resumed['loads'])
+    autoloader.connect()  # Tapes may have been moved since, never resume from the journal's.
+    if config.get('daemon'):
+        waiter = MailslotWaiter(fifo=config.get('fifo'))
+        daemon = EjectDaemon(autoloader, config['daemon'], waiter)
+        try:
+            daemon.run()
+        finally:
+            daemon.close()
+        return
+    with MailslotWaiter(tty=sys.stdin.isatty(), fifo=config.get('fifo')) as waiter:
+        if config.get('load'):
+            run_load(autoloader, config['load'], waiter, logger)
+        elif config.get('rotate'):
+            run_rotate(autoloader, config['tapes'], config['rotate'], waiter, logger,
+                       config.get('plan'), journal)
+        else:
+            run_batch(autoloader, config['tapes'], waiter, logger, config.get('plan'),
+                      config.get('prestage'), journal)
+    if session:
+        if isinstance(session, Session):
+            message = ('Sent %d request(s) with %d reconnect(s), saved about %f second(s) '
+                       'connecting.')
+            logger.debug(message, session.requests, session.reconnects, session.saved_seconds)
+        session.close()
 
-    total = len(config['tapes'])
-    logger.info('Ejected %d tape%s.', total, '' if total == 1 else 's')
+
+def main(config):
+    """Main function of program.
+
+    :param dict config: Parsed command line and config file data.
+    """
+    if config.get('socket'):
+        submit_to_daemon(config['socket'], config['tapes'])
+        return
+    metrics = Metrics()
+    start = time.time()
+    try:
+        run(config, metrics)
+    finally:
+        metrics.observe('pv124t_run_seconds', time.time() - start)
+        if config.get('metrics') or config.get('textfile'):
+            metrics.write(config.get('metrics'), config.get('textfile'))
 
 
 if __name__ == '__main__':
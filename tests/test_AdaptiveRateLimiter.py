@@ -0,0 +1,88 @@
+import json
+
+from tape_bulk_eject import AdaptiveRateLimiter
+
+
+def test_shrink_and_backoff(tmpdir):
+    state_file = str(tmpdir.join('state.json'))
+    limiter = AdaptiveRateLimiter('124t.local', 10, minimum=4, maximum=30, state_file=state_file)
+    assert limiter.delay == 10
+
+    for _ in range(AdaptiveRateLimiter.STREAK - 1):
+        limiter.success()
+    assert limiter.delay == 10
+    limiter.success()
+    assert limiter.delay == 8
+    assert json.loads(tmpdir.join('state.json').read()) == {'delay': 8}
+
+    for _ in range(AdaptiveRateLimiter.STREAK * 10):
+        limiter.success()
+    assert limiter.delay == 4  # Minimum.
+
+    limiter.success()
+    limiter.failure()
+    assert limiter.delay == limiter.delay_error == 8
+    assert limiter.streak == 0
+    limiter.failure()
+    limiter.failure()
+    assert limiter.delay == 30  # Maximum.
+
+
+def test_load(tmpdir):
+    state_file = tmpdir.join('state.json')
+    state_file.write('garbage')
+    limiter = AdaptiveRateLimiter('124t.local', 10, state_file=str(state_file))
+    assert limiter.delay == 10
+
+    state_file.write('{"delay": 2.5}')
+    limiter = AdaptiveRateLimiter('124t.local', 10, state_file=str(state_file))
+    assert limiter.delay == limiter.delay_error == 2.5
+
+
+def test_default_state_file(monkeypatch, tmpdir):
+    monkeypatch.setattr('os.path.expanduser', lambda _: str(tmpdir))
+    limiter = AdaptiveRateLimiter('192.168.0.50', 10)
+    assert limiter.state_file == str(tmpdir.join('.pv124t_state_192.168.0.50.json'))
+    limiter.failure()
+    assert json.loads(tmpdir.join('.pv124t_state_192.168.0.50.json').read()) == {'delay': 20}
+
+
+def test_shared(tmpdir):
+    state_file = str(tmpdir.join('state.json'))
+    limiter_a = AdaptiveRateLimiter('124t.local', 10, state_file=state_file)
+    limiter_b = AdaptiveRateLimiter('124t.local', 10, state_file=state_file)
+    assert limiter_a.acquire()
+    limiter_a.replied()
+    limiter_a.failure()
+    limiter_a.release()
+    assert json.loads(tmpdir.join('state.json').read()) == {
+        'delay': 20, 'last_access': limiter_a.last_access}
+
+    assert limiter_b.acquire()
+    assert limiter_b.delay == limiter_b.delay_error == 20
+    assert limiter_b.last_access == limiter_a.last_access
+    limiter_b.release()
+
+
+def test_long_gap(tmpdir):
+    limiter = AdaptiveRateLimiter('124t.local', 10, state_file=str(tmpdir.join('state.json')))
+    limiter.gap = 10.5
+    for _ in range(AdaptiveRateLimiter.STREAK):
+        limiter.success()
+    assert limiter.delay == 8
+
+    limiter.gap = 300  # Waited for the operator, says nothing about the delay.
+    for _ in range(AdaptiveRateLimiter.STREAK * 10):
+        limiter.success()
+    assert limiter.delay == 8
+    assert limiter.streak == 0
+
+
+def test_gap(monkeypatch, tmpdir):
+    now = [1000.0]
+    monkeypatch.setattr('time.time', lambda: now[0])
+    limiter = AdaptiveRateLimiter('124t.local', 10, state_file=str(tmpdir.join('state.json')))
+    limiter.last_access = 700.0
+    limiter.wait()
+    limiter.release()
+    assert limiter.gap == 300
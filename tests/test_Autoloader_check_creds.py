@@ -21,3 +21,28 @@ def test(monkeypatch, caplog):
         return StringIO.StringIO('test67')
     monkeypatch.setattr('urllib2.urlopen', urlopen)
     autoloader.check_creds()
+
+
+def test_connect(monkeypatch, caplog):
+    requests = list()
+
+    def urlopen(request):
+        requests.append(request.get_full_url())
+        raise urllib2.HTTPError(request.get_full_url(), 401, '', None, None)
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+
+    autoloader = Autoloader('124t.local', 'user', 'pw')
+    with pytest.raises(HandledError):
+        autoloader.connect()
+    log = caplog.records()[-1].message
+    assert log == ('http://124t.local/commands.html 401 Unauthorized. '
+                   'Possibly rate limiting or invalid credentials.')
+
+    def urlopen(request):
+        requests.append(request.get_full_url())
+        return StringIO.StringIO('<center><img title="tape1" onclick="from_to(slot1)" /></center>')
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    autoloader.connect()
+    assert autoloader.inventory == {'tape1': '1'}
+    assert requests == ['http://124t.local/commands.html'] * 2  # One request each.
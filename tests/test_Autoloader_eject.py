@@ -3,7 +3,7 @@ import urllib2
 
 import pytest
 
-from tape_bulk_eject import Autoloader
+from tape_bulk_eject import Autoloader, RetryError, RetryPolicy
 
 
 @pytest.mark.parametrize('error', ['Error while ejecting.', 'drive locked?', 'Tape did not move.'])
@@ -31,3 +31,79 @@ def test(monkeypatch, caplog, error):
 
     records = caplog.records()
     assert [r for r in records if error in r.message]
+
+
+def test_give_up(monkeypatch):
+    def urlopen(_):
+        return StringIO.StringIO('<center><img src="" title="00008FA" onclick="from_to(slot1)" />'
+                                 '<img src="" title="00009FA" onclick="from_to(mailslot)" />'
+                                 '</center>')
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+
+    autoloader = Autoloader('124t.local', '', '')
+    autoloader.inventory['00008FA'] = '1'
+    assert autoloader.eject('00008FA', give_up=True) is False
+    assert autoloader.inventory == {'00008FA': '1', '00009FA': 'mailslot'}
+
+
+@pytest.mark.parametrize('probe', [200, 401])
+def test_retry_policy(monkeypatch, caplog, probe):
+    def urlopen(request):
+        if request.get_full_url().endswith('config_ops.html'):
+            if probe == 401:
+                raise urllib2.HTTPError(request.get_full_url(), 401, '', None, None)
+            return StringIO.StringIO('ok')
+        if len(requests) % 2:
+            requests.append(request)
+            raise urllib2.HTTPError(request.get_full_url(), 401, '', None, None)
+        requests.append(request)
+        return StringIO.StringIO(
+            '<center><img src="" title="00008FA" onclick="from_to(drive)" /></center>')
+    requests = list()
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    monkeypatch.setattr(Autoloader, 'DELAY_ERROR', 0.01)
+
+    autoloader = Autoloader('124t.local', '', '', retry_policy=RetryPolicy(attempts=4))
+    autoloader.inventory['00008FA'] = 'drive'
+    if probe == 401:
+        with pytest.raises(RetryError) as exc:
+            autoloader.eject('00008FA')
+        assert len(requests) == 2  # Drive locked, then 401 probed on the second failure.
+        assert (exc.value.failure, exc.value.reason) == (
+            'unauthorized', 'locked out or invalid credentials')
+        expected = 'http://124t.local/config_ops.html 401 Unauthorized too. Locked out or invalid ' \
+                   'credentials.'
+        assert caplog.records()[-1].message == expected
+        return
+
+    with pytest.raises(RetryError) as exc:
+        autoloader.eject('00008FA')
+    assert (exc.value.failure, exc.value.reason) == ('unauthorized', 'failed 4 times')
+    assert len(requests) == 4
+    messages = [r.message for r in caplog.records()]
+    assert messages.count('Autoloader still accepts requests, probably rate limiting.') == 2
+    counters = autoloader.metrics.summary()['counters']['pv124t_retries_total']
+    assert sorted((c['labels']['reason'], c['value']) for c in counters) == [
+        ('drive_locked', 2), ('unauthorized', 2)]
+
+
+def test_source_moved(monkeypatch):
+    def urlopen(request):
+        requests.append(request.get_data())
+        if len(requests) == 1:  # Moved through the front panel, request didn't do anything.
+            return StringIO.StringIO('<center><img src="" title="00008FA" onclick="from_to(slot5)" />'
+                                     '<img src="" title="OTHER" onclick="from_to(slot3)" /></center>')
+        return StringIO.StringIO('<center><img src="" title="00008FA" onclick="from_to(mailslot)" />'
+                                 '<img src="" title="OTHER" onclick="from_to(slot3)" /></center>')
+    requests = list()
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    monkeypatch.setattr(Autoloader, 'DELAY_ERROR', 0.01)
+
+    autoloader = Autoloader('124t.local', '', '')
+    autoloader.inventory['00008FA'] = '3'
+    autoloader.eject('00008FA')
+    assert requests == ['from=3&to=18&submit=submit', 'from=5&to=18&submit=submit']
+    assert autoloader.inventory == {'00008FA': 'mailslot', 'OTHER': '3'}
@@ -1,10 +1,12 @@
+import logging
+import socket
 import StringIO
 import time
 import urllib2
 
 import pytest
 
-from tape_bulk_eject import Autoloader, AutoloaderError, HandledError
+from tape_bulk_eject import Autoloader, AutoloaderError, HandledError, RateLimiter, Return
 
 
 @pytest.mark.parametrize('host', ['.', 'i_do_not_exist'])
@@ -43,12 +45,75 @@ def test_rate_limiting(monkeypatch):
         return StringIO.StringIO('test67')
     monkeypatch.setattr('urllib2.urlopen', urlopen)
 
+    monkeypatch.setattr(Autoloader, 'DELAY', 1)
     autoloader = Autoloader('124t.local', 'user', 'pw')
     request = urllib2.Request(autoloader.url)
     start_time = time.time()
-    monkeypatch.setattr(Autoloader, 'DELAY', 1)
 
     assert getattr(autoloader, '_query')(request) == 'test67'
     assert time.time() - start_time < 0.1
     assert getattr(autoloader, '_query')(request) == 'test67'
     assert time.time() - start_time > 0.9
+
+
+@pytest.mark.parametrize('error', ['parser', 'socket'])
+def test_lock_released(monkeypatch, tmpdir, error):
+    class Response(object):
+        @staticmethod
+        def read(_):
+            if error == 'socket':
+                raise socket.error('Connection reset by peer')
+            return '<center><img src="" title="tape1" onclick="from_to(nowhere)" /></center>'
+    monkeypatch.setattr('urllib2.urlopen', lambda _: Response())
+
+    rate_limiter = RateLimiter(0, 0, str(tmpdir.join('state.json')))
+    autoloader = Autoloader('124t.local', 'user', 'pw', rate_limiter)
+    with pytest.raises(socket.error if error == 'socket' else HandledError):
+        autoloader.update_inventory()
+    assert RateLimiter(0, 0, rate_limiter.state_file).acquire()  # Other processes aren't stuck.
+
+
+def test_session():
+    class FakeSession(object):
+        requests = list()
+
+        def open_async(self, request):
+            self.requests.append(request)
+            yield None
+            raise Return(StringIO.StringIO('test67'))
+
+    autoloader = Autoloader('124t.local', 'user', 'pw', session=FakeSession())
+    request = getattr(autoloader, '_request')('move.cgi', 'from=1&to=18&submit=submit')
+    assert getattr(autoloader, '_query')(request, no_delay=True) == 'test67'
+    assert FakeSession.requests == [request]
+    assert dict(request.header_items()) == {
+        'Authorization': 'Basic dXNlcjpwdw==',
+        'Content-type': 'application/x-www-form-urlencoded',
+        'Origin': 'http://124t.local',
+        'Referer': 'http://124t.local/commands.html',
+    }
+
+
+def test_debug_logging(monkeypatch, caplog):
+    def urlopen(_):
+        return StringIO.StringIO('<html>' + 'x' * 100 + '</html>')
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+
+    autoloader = Autoloader('124t.local', 'user', 'pw')
+    request = urllib2.Request(autoloader.url)
+    getattr(autoloader, '_query')(request, no_delay=True)
+    autoloader.excerpt = 8
+    getattr(autoloader, '_query')(request, no_delay=True)
+    records = [r for r in caplog.records() if r.name == 'Autoloader._query']
+    assert [r.message for r in records] == [
+        'Request 1: GET ',
+        'Request 1: received 113 byte(s) (sha1 9ea9a2015daa)',
+        'Request 2: GET ',
+        "Request 2: received 113 byte(s) (sha1 9ea9a2015daa): '<html>xx'...",
+    ]
+    assert [(r.host, r.request_id) for r in records] == [('124t.local', i) for i in (1, 1, 2, 2)]
+
+    # Nothing is hashed or kept when debug logging is disabled.
+    monkeypatch.setattr('tape_bulk_eject.Payload', None)
+    caplog.setLevel(logging.INFO, 'Autoloader._query')
+    assert getattr(autoloader, '_query')(request, no_delay=True).startswith('<html>')
@@ -0,0 +1,37 @@
+import StringIO
+import urllib2
+
+from tape_bulk_eject import Autoloader
+
+
+def test(monkeypatch, caplog):
+    requests = list()
+
+    def urlopen(request):
+        requests.append(request.get_data())
+        if len(requests) == 1:
+            raise urllib2.HTTPError(request.get_full_url(), 401, '', None, None)
+        return StringIO.StringIO("""<center>
+            <img src="" title="tape1" onclick="from_to(picker)" />
+            <img src="" title="tape2" onclick="from_to(mailslot)" />
+        </center>""")
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+
+    autoloader = Autoloader('124t.local', '', '')
+    autoloader.inventory.update({'tape1': '9', 'tape3': '3'})
+    assert autoloader.stage('tape1') is False  # Mailslot empty, eject right away instead.
+    assert autoloader.stage('tape4') is False  # Not in autoloader.
+    assert not requests
+
+    autoloader.inventory['tape2'] = 'mailslot'
+    assert autoloader.stage('tape1') is False  # 401.
+    assert autoloader.stage('tape1') is True
+    assert requests == ['from=9&to=19&submit=submit'] * 2
+    assert autoloader.inventory == {'tape1': 'picker', 'tape2': 'mailslot'}
+    assert 'Staging tape1 from 9 into the picker...' in [r.message for r in caplog.records()]
+
+    assert autoloader.stage('tape1') is True  # Already there.
+    autoloader.inventory['tape3'] = '3'
+    assert autoloader.stage('tape3') is False  # Picker occupied.
+    assert len(requests) == 2
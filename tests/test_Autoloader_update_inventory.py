@@ -2,7 +2,13 @@ import StringIO
 
 import pytest
 
-from tape_bulk_eject import Autoloader, HandledError
+from tape_bulk_eject import Autoloader, HandledError, TapePos, TapePosRegex
+
+
+@pytest.fixture(params=[TapePos, TapePosRegex], autouse=True)
+def parser_class(monkeypatch, request):
+    monkeypatch.setattr(Autoloader, 'PARSER', request.param)
+    return request.param
 
 
 def test_bad_html(monkeypatch, caplog):
@@ -105,3 +111,17 @@ def test_valid(monkeypatch):
         '10016FA': '16',
     }
     assert autoloader.inventory == expected
+
+
+def test_streaming(monkeypatch):
+    padding = '<!-- {} -->\n'.format('x' * 1000) * 200  # Tapes start after 200 KB.
+    html = padding + '<center><img title="00001FA" onclick="from_to(slot16)" /></center>'
+    html += padding + '<img title="ignored" onclick="from_to(slot1)" />'
+    handle = StringIO.StringIO(html)
+    monkeypatch.setattr('urllib2.urlopen', lambda _: handle)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+
+    autoloader = Autoloader('host', '', '')
+    autoloader.update_inventory()
+    assert autoloader.inventory == {'00001FA': '16'}
+    assert handle.tell() < len(html) - len(padding) + Autoloader.CHUNK_SIZE  # Stopped at </center>.
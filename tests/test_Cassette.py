@@ -0,0 +1,65 @@
+import json
+import StringIO
+import time
+import urllib2
+
+import pytest
+
+from tape_bulk_eject import Cassette
+
+IMG = '<center><img src="" title="00008FA" onclick="from_to(slot1)" />\xe9</center>'
+
+
+def test_record(monkeypatch, tmpdir):
+    def urlopen(request):
+        if request.get_full_url().endswith('move.cgi'):
+            raise urllib2.HTTPError(request.get_full_url(), 401, '', None, None)
+        if request.get_full_url().endswith('missing.html'):
+            raise urllib2.URLError('Name or service not known')
+        time.sleep(0.05)
+        return StringIO.StringIO(IMG)
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    path = str(tmpdir.join('124t.jsonl'))
+
+    cassette = Cassette(path)
+    assert cassette.open(urllib2.Request('http://124t.local/commands.html')).read() == IMG
+    with pytest.raises(urllib2.HTTPError):
+        cassette.open(urllib2.Request('http://124t.local/move.cgi', 'from=1&to=18'))
+    with pytest.raises(urllib2.URLError):
+        cassette.open(urllib2.Request('http://124t.local/missing.html'))
+    cassette.close()
+
+    lines = [json.loads(l) for l in tmpdir.join('124t.jsonl').readlines()]
+    assert [(l['method'], l['path'], l['data'], l['status']) for l in lines] == [
+        ('GET', '/commands.html', None, 200),
+        ('POST', '/move.cgi', 'from=1&to=18', 401),
+        ('GET', '/missing.html', None, 'error'),
+    ]
+    assert lines[0]['seconds'] >= 0.05
+    assert 'Authorization' not in tmpdir.join('124t.jsonl').read()
+
+
+def test_replay(tmpdir):
+    cassette_file = tmpdir.join('124t.jsonl')
+    cassette_file.write('\n'.join(json.dumps(i) for i in [
+        dict(method='GET', path='/commands.html', data=None, status=200, body=IMG.decode('latin-1'),
+             seconds=0.2),
+        dict(method='POST', path='/move.cgi', data='from=1&to=18', status=401, body='', seconds=0),
+    ]))
+
+    cassette = Cassette(str(cassette_file), replay=True, speed=2)
+    start = time.time()
+    assert cassette.open(urllib2.Request('http://other.host/commands.html')).read() == IMG
+    assert 0.1 <= time.time() - start < 0.2
+    with pytest.raises(urllib2.HTTPError) as exc:
+        cassette.open(urllib2.Request('http://other.host/move.cgi', 'from=1&to=18'))
+    assert exc.value.code == 401
+    with pytest.raises(urllib2.URLError) as exc:
+        cassette.open(urllib2.Request('http://other.host/commands.html'))
+    assert str(exc.value.reason) == 'cassette {} has no more responses'.format(cassette_file)
+
+    cassette = Cassette(str(cassette_file), replay=True, speed=0)
+    with pytest.raises(urllib2.URLError) as exc:
+        cassette.open(urllib2.Request('http://other.host/move.cgi', 'from=1&to=18'))
+    assert str(exc.value.reason) == 'cassette {} expected GET /commands.html next'.format(
+        cassette_file)
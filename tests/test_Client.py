@@ -0,0 +1,112 @@
+import signal
+import StringIO
+import urllib2
+
+import pytest
+
+from tape_bulk_eject import Autoloader, Client, MailslotWaiter, RetryPolicy, TapeResult
+
+IMG = '<img src="" title="{}" onclick="from_to({})" />'
+
+
+@pytest.fixture
+def device(monkeypatch):
+    """Fake autoloader. The operator empties the mailslot before every poll after the first one."""
+    state = dict(positions={'tape1': 'slot1', 'tape2': 'slot9', 'tape3': 'drive',
+                            'tape4': 'mailslot'}, requests=list(), fetched=False, locked=False,
+                 refused=False)
+
+    def urlopen(request):
+        page = request.get_full_url().rsplit('/', 1)[-1]
+        state['requests'].append(page)
+        if state['refused']:
+            raise urllib2.HTTPError(request.get_full_url(), 401, '', None, None)
+        positions = state['positions']
+        if page == 'config_ops.html':
+            return StringIO.StringIO('yes')
+        if page == 'move.cgi':
+            source = request.get_data().split('&')[0].split('=')[1]
+            source = {'17': 'drive'}.get(source, 'slot' + source)
+            tape = [t for t, p in positions.items() if p == source][0]
+            if source != 'drive' or not state['locked']:
+                positions[tape] = 'mailslot'
+        elif state['fetched']:
+            for tape in [t for t, p in positions.items() if p == 'mailslot']:
+                positions.pop(tape)
+        else:
+            state['fetched'] = True
+        imgs = ''.join(IMG.format(t, p) for t, p in sorted(positions.items()))
+        return StringIO.StringIO('<center>{}</center>'.format(imgs))
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    monkeypatch.setattr(Autoloader, 'DELAY_ERROR', 0.01)
+    monkeypatch.setattr(MailslotWaiter, 'MAXIMUM', 0.01)
+    return state
+
+
+def test_eject(device):
+    with Client(Autoloader('124t', '', '')) as client:
+        assert client.waiter is None  # Created on the first wait, without a SIGUSR1 handler.
+        results = client.eject(['tape1', 'tape4', 'tape9', 'nope*'])
+        assert client.waiter.previous_handler is None
+        assert signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL
+        assert [r[:3] for r in results] == [
+            ('nope*', 'missing', None),
+            ('tape4', 'skipped', None),
+            ('tape9', 'missing', None),
+            ('tape1', 'ejected', '1'),
+        ]
+        assert results[0].reason == 'no tapes match'
+        assert results[1].reason == 'already in mailslot'
+        assert results[3].seconds > 0
+        assert device['requests'] == ['commands.html', 'commands.html', 'move.cgi']
+
+        # Same session, no authentication or inventory fetch.
+        del device['requests'][:]
+        events = list(client.eject_events(['tape2', 'tape3']))
+        assert [e['event'] for e in events] == [
+            'planned', 'waiting', 'ejecting', 'ejected', 'waiting', 'ejecting', 'ejected', 'done']
+        assert events[0]['tapes'] == ['tape2', 'tape3']
+        assert events[2]['message'] == 'Ejecting tape2 (1 other left)...'
+        assert events[-1]['message'] == 'Ejected 2 of 2 tape(s).'
+        assert [r.status for r in events[-1]['results']] == ['ejected', 'ejected']
+        assert device['requests'] == ['commands.html', 'move.cgi', 'commands.html', 'move.cgi']
+
+
+def test_failed(device):
+    device['locked'] = True
+    autoloader = Autoloader('124t', '', '', retry_policy=RetryPolicy(attempts=2))
+    with Client(autoloader) as client:
+        results = client.eject(['tape3', 'tape2'])
+    assert results[0] == TapeResult('tape2', 'ejected', '9', results[0].seconds, None)
+    assert results[1][:3] == ('tape3', 'failed', 'drive')
+    assert results[1].reason == 'gave up, failed 2 times'
+
+
+def test_lockout(device):
+    del device['positions']['tape4']
+    with Client(Autoloader('124t', '', '')) as client:
+        client.eject(['tape9'])  # Connects.
+        device['refused'] = True
+        del device['requests'][:]
+        results = client.eject(['tape1', 'tape2', 'tape3'])
+    assert [r[:3] for r in results] == [
+        ('tape1', 'failed', '1'),
+        ('tape2', 'skipped', None),
+        ('tape3', 'skipped', None),
+    ]
+    assert results[0].reason == 'gave up, locked out or invalid credentials'
+    assert results[1].reason == 'not attempted, locked out or invalid credentials'
+    assert device['requests'] == ['move.cgi', 'move.cgi', 'config_ops.html']
+
+
+def test_unauthorized(monkeypatch):
+    def urlopen(request):
+        raise urllib2.HTTPError(request.get_full_url(), 401, '', None, None)
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    with Client(Autoloader('124t', '', '')) as client:
+        events = list(client.eject_events(['tape1']))
+    assert events[0]['result'] == TapeResult('tape1', 'failed', None, 0.0,
+                                             'autoloader error, see log')
+    assert events[-1]['event'] == 'done'
+    assert not client.connected
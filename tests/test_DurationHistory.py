@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from tape_bulk_eject import DurationHistory, MOVE_SECONDS
+
+
+def test_load_save(monkeypatch, tmpdir):
+    monkeypatch.setattr('os.path.expanduser', lambda _: str(tmpdir))
+    history = DurationHistory('192.168.0.50')
+    history_file = tmpdir.join('.pv124t_history_192.168.0.50.json')
+    assert history.history_file == str(history_file)
+    assert history.means == dict()
+    assert history.moves == 0
+
+    history.observe('query', 2)
+    history.observe_move('drive', 80)
+    history.observe_move('3', 20)
+    assert json.loads(history_file.read()) == dict(query=[2, 1], drive=[80, 1], slot=[20, 1])
+    assert not tmpdir.listdir(lambda p: p.basename.endswith('.tmp'))
+
+    history = DurationHistory('192.168.0.50')
+    assert history.moves == 2
+    assert history.mean('query', 0) == 2
+
+    history_file.write('garbage')
+    assert DurationHistory('192.168.0.50').means == dict()
+
+
+def test_mean(tmpdir):
+    history = DurationHistory('', str(tmpdir.join('history.json')))
+    history.observe('slot', 10)
+    history.observe('slot', 20)
+    assert history.means['slot'] == [15, 2]
+
+    # Older samples fade out after WINDOW samples.
+    for _ in range(DurationHistory.WINDOW * 5):
+        history.observe('slot', 40)
+    assert history.mean('slot', 0) == pytest.approx(40, abs=0.5)
+
+
+def test_move_seconds(tmpdir):
+    history = DurationHistory('', str(tmpdir.join('history.json')))
+    assert history.move_seconds('drive') == MOVE_SECONDS['drive']
+    assert history.move_seconds('slot_switch') == MOVE_SECONDS['slot']
+
+    history.observe_move('1', 20)
+    history.observe_move('2', 20)
+    assert history.move_seconds('slot_switch') == 20  # Falls back to slot.
+    history.observe_move('9', 50)
+    assert history.means == dict(slot=[20, 2], slot_switch=[50, 1])
+    assert history.move_seconds('slot_switch') == 50
+    assert history.moves == 3
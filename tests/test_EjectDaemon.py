@@ -0,0 +1,165 @@
+import logging
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from tape_bulk_eject import (AutoloaderError, EjectDaemon, HandledError, Inventory, Metrics,
+                             RateLimiter, submit_to_daemon)
+
+
+class FakeAutoloader(object):
+    def __init__(self, inventory):
+        self.ejected = list()
+        self.host_name = 'fake'
+        self.inventory = Inventory(inventory)
+        self.metrics = Metrics()
+        self.rate_limiter = RateLimiter(0.01, 0.01)
+        self.unauthorized = 0
+
+    def eject(self, tape):
+        if self.inventory[tape] == 'drive':
+            raise HandledError
+        self.ejected.append(tape)
+        self.inventory[tape] = 'mailslot'
+
+    def update_inventory(self):
+        if self.unauthorized:
+            self.unauthorized -= 1
+            raise AutoloaderError
+        for tape in [t for t, s in self.inventory.items() if s == 'mailslot']:
+            self.inventory.pop(tape)  # Operator empties the mailslot right away.
+
+
+@pytest.fixture
+def daemon(tmpdir):
+    inventory = {'a1': '1', 'a2': '2', 'a3': '3', 'b1': '9', 'shared': '16', 'stuck': 'drive'}
+    daemon = EjectDaemon(FakeAutoloader(inventory), str(tmpdir.join('sock')))
+    yield daemon
+    daemon.waiter.close()
+    daemon.server.server_close()
+
+
+def drain(job):
+    events = list()
+    while not job.events.empty():
+        events.append(job.events.get())
+    return events
+
+
+def test_fair_and_merged(daemon):
+    job_a = daemon.submit(['a3', 'a1', 'a2', 'shared', 'missing'])
+    job_b = daemon.submit(['shared', 'b1'])
+    for _ in range(7):
+        daemon.step()
+    assert daemon.autoloader.ejected == ['a1', 'b1', 'a2', 'shared', 'a3']
+    assert not daemon.jobs
+
+    events_a = [e for e in drain(job_a) if e['event'] != 'waiting']
+    assert [e['event'] for e in events_a] == ['queued', 'skipped'] + ['ejecting', 'ejected'] * 4 + [
+        'done']
+    assert events_a[1]['message'] == 'missing not in autoloader, skipping.'
+    assert events_a[-1]['ejected'] == 4
+    events_b = drain(job_b)
+    assert [e.get('tape') for e in events_b if e['event'] == 'ejected'] == ['b1', 'shared']
+    assert events_b[-1]['message'] == 'Ejected 2 of 2 tape(s).'
+
+
+def test_patterns(daemon):
+    job = daemon.submit(['a*', 'b1', 'z*'])
+    for _ in range(5):
+        daemon.step()
+    assert daemon.autoloader.ejected == ['a1', 'a2', 'a3', 'b1']
+    events = [e for e in drain(job) if e['event'] not in ('waiting', 'ejecting', 'ejected')]
+    assert [e['message'] for e in events] == [
+        'Queued job {} with 3 tape(s).'.format(job.job_id), 'No tapes match z*, skipping.',
+        'Ejected 4 of 4 tape(s).']
+
+
+def test_error(daemon):
+    job_a = daemon.submit(['stuck', 'a1'])
+    job_b = daemon.submit(['a2', 'a3'])
+    for _ in range(4):
+        daemon.step()
+    events = [e['event'] for e in drain(job_a) if e['event'] != 'waiting']
+    assert events == ['queued', 'ejecting', 'ejected', 'ejecting', 'error', 'done']
+    events = [e['event'] for e in drain(job_b) if e['event'] != 'waiting']
+    assert events == ['queued', 'ejecting', 'ejected', 'error', 'done']
+    assert daemon.autoloader.ejected == ['a1', 'a2']  # a3 never ejected.
+
+
+def test_unauthorized(daemon):
+    daemon.autoloader.unauthorized = 2
+    job = daemon.submit(['a1'])
+    for _ in range(3):
+        daemon.step()  # Keeps running, retries validate().
+    assert daemon.autoloader.ejected == ['a1']
+    assert [e['event'] for e in drain(job) if e['event'] != 'waiting'] == [
+        'queued', 'ejecting', 'ejected']
+
+
+def test_submitted_after_validate(daemon):
+    job_a = daemon.submit(['a1'])
+    daemon.validate()
+    job_b = daemon.submit(['a2*'])  # Patterns aren't resolved until the next validate().
+    daemon.stale = False
+    daemon.jobs.reverse()  # job_b's turn.
+    assert daemon.next_tape() == (None, [])
+    assert daemon.stale
+    for _ in range(3):
+        daemon.step()
+    assert sorted(daemon.autoloader.ejected) == ['a1', 'a2']
+    assert [e['event'] for e in drain(job_b)][-1] == 'done'
+    assert [e['event'] for e in drain(job_a)][-1] == 'done'
+
+
+def test_socket(daemon, caplog):
+    caplog.setLevel(logging.INFO)
+    thread = threading.Thread(target=daemon.run)
+    thread.daemon = True
+    thread.start()
+
+    submit_to_daemon(daemon.socket_path, ['a1', 'a2'])
+    messages = [r.message for r in caplog.records() if r.name == 'submit_to_daemon']
+    assert messages[0].startswith('Queued job ')
+    assert [m for m in messages[1:] if not m.startswith('Tape in mailslot')] == [
+        'Ejecting a1 (1 other left)...',
+        'Ejected a1.',
+        'Ejecting a2 (0 others left)...',
+        'Ejected a2.',
+        'Ejected 2 of 2 tape(s).',
+    ]
+
+    with pytest.raises(HandledError):
+        submit_to_daemon(daemon.socket_path, ['stuck'])
+    daemon.server.shutdown()
+
+
+def test_no_daemon(tmpdir, caplog):
+    with pytest.raises(HandledError):
+        submit_to_daemon(str(tmpdir.join('nothing')), ['a1'])
+    assert caplog.records()[-1].message.startswith('Failed to connect to daemon on ')
+
+
+def test_socket_file(daemon, tmpdir, caplog):
+    assert stat.S_IMODE(os.stat(daemon.socket_path).st_mode) == 0o600
+
+    with pytest.raises(HandledError):
+        EjectDaemon(daemon.autoloader, daemon.socket_path)  # Still listening.
+    assert caplog.records()[-1].message == 'Another daemon is listening on {}.'.format(
+        daemon.socket_path)
+
+    regular = tmpdir.join('regular')
+    regular.write('data')
+    with pytest.raises(HandledError):
+        EjectDaemon(daemon.autoloader, str(regular))
+    assert regular.read() == 'data'
+
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(tmpdir.join('stale')))
+    stale.close()  # Killed daemon, nothing listening.
+    replacement = EjectDaemon(daemon.autoloader, str(tmpdir.join('stale')))
+    replacement.waiter.close()
+    replacement.server.server_close()
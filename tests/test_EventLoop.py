@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from tape_bulk_eject import Cancelled, EventLoop, HandledError, Return, Sleep
+
+
+def child(seconds, log):
+    log.append(('start', seconds))
+    yield Sleep(seconds)
+    log.append(('end', seconds))
+    raise Return(seconds * 2)
+
+
+def parent(log):
+    total = 0
+    for seconds in (0.05, 0.1):
+        total += yield child(seconds, log)
+    raise Return(total)
+
+
+def test_concurrent():
+    log, loop = list(), EventLoop()
+    start = time.time()
+    task_a = loop.spawn(parent(log))
+    task_b = loop.spawn(child(0.12, log))
+    loop.run()
+    assert time.time() - start < 0.25  # Not 0.27 (sequential).
+    assert task_a.result == pytest.approx(0.3)
+    assert task_b.result == 0.24
+    assert log == [('start', 0.05), ('start', 0.12), ('end', 0.05), ('start', 0.1), ('end', 0.12),
+                   ('end', 0.1)]
+    assert not loop.tasks
+
+
+def test_exceptions():
+    def failing():
+        yield None
+        raise HandledError
+
+    def catching():
+        try:
+            yield failing()
+        except HandledError:
+            raise Return('caught')
+
+    assert EventLoop().run_until_complete(catching()) == 'caught'
+    with pytest.raises(HandledError):
+        EventLoop().run_until_complete(failing())
+
+
+def test_cancel():
+    log = list()
+
+    def waiting():
+        try:
+            yield Sleep(60)
+        except Cancelled:
+            log.append('cancelled')
+            raise
+
+    def canceller(task):
+        yield Sleep(0.01)
+        task.cancel()
+
+    loop = EventLoop()
+    task = loop.spawn(waiting())
+    loop.spawn(canceller(task))
+    start = time.time()
+    loop.run()
+    assert time.time() - start < 1
+    assert log == ['cancelled']
+    assert isinstance(task.exception, Cancelled)
@@ -0,0 +1,94 @@
+import StringIO
+import urllib2
+
+import pytest
+
+from tape_bulk_eject import Autoloader, Fleet, HandledError
+
+IMG = '<img src="" title="{}" onclick="from_to({})" />'
+INVENTORIES = {
+    'unit1': dict(tape1='1', tape3='2'),
+    'unit2': dict(tape2='1', tape3='5'),
+}
+
+
+def fake_urlopen(unauthorized=()):
+    """Serve one inventory per host. move.cgi responses show the tape in the mailslot."""
+    def urlopen(request):
+        url = request.get_full_url()
+        host = url.split('/')[2]
+        if host in unauthorized:
+            raise urllib2.HTTPError(url, 401, '', None, None)
+        if url.endswith('config_ops.html'):
+            return StringIO.StringIO('yes')
+        if url.endswith('move.cgi'):
+            slot = int(request.get_data().split('&')[0].split('=')[1])
+            tape = [t for t, s in INVENTORIES[host].items() if s == str(slot)][0]
+            return StringIO.StringIO('<center>{}</center>'.format(IMG.format(tape, 'mailslot')))
+        imgs = ''.join(IMG.format(t, 'slot' + s) for t, s in sorted(INVENTORIES[host].items()))
+        return StringIO.StringIO('<center>{}</center>'.format(imgs))
+    return urlopen
+
+
+@pytest.fixture(autouse=True)
+def fast(monkeypatch):
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    monkeypatch.setattr(Autoloader, 'DELAY_ERROR', 0.01)
+
+
+def test_resolve(monkeypatch, caplog):
+    monkeypatch.setattr('urllib2.urlopen', fake_urlopen())
+    fleet = Fleet([Autoloader('unit1', '', ''), Autoloader('unit2', '', '')])
+    fleet.connect()
+    assert fleet.autoloaders[0].inventory == INVENTORIES['unit1']
+    assert fleet.autoloaders[1].inventory == INVENTORIES['unit2']
+
+    assignments, missing = fleet.resolve(['tape1', 'tape2', 'tape3', 'tape4'])
+    assert assignments == [['tape1', 'tape3'], ['tape2']]
+    assert missing == ['tape4']
+    messages = [r.message for r in caplog.records()]
+    assert 'tape3 found in more than one autoloader (unit1, unit2), using first.' in messages
+
+
+def test_run(monkeypatch, caplog):
+    monkeypatch.setattr('urllib2.urlopen', fake_urlopen())
+    fleet = Fleet([Autoloader('unit1', '', ''), Autoloader('unit2', '', '')])
+    fleet.run(['tape1', 'tape2', 'tape4'])
+    messages = [r.message for r in caplog.records()]
+    assert 'tape4 not in any autoloader, skipping.' in messages
+    assert '[unit1] Ejecting tape1 (0 others left)...' in messages
+    assert '[unit2] Ejecting tape2 (0 others left)...' in messages
+    assert '[unit1] Ejected 1 tape.' in messages
+    assert '[unit2] Ejected 1 tape.' in messages
+
+
+def test_failure(monkeypatch, caplog):
+    monkeypatch.setattr('urllib2.urlopen', fake_urlopen(unauthorized=('unit2',)))
+    fleet = Fleet([Autoloader('unit1', '', ''), Autoloader('unit2', '', '')])
+    with pytest.raises(HandledError):
+        fleet.run(['tape1', 'tape2'])
+    messages = [r.message for r in caplog.records()]
+    assert any(m.endswith('Possibly rate limiting or invalid credentials.') for m in messages)
+    assert not any('Ejecting' in m for m in messages)
+
+
+def test_unexpected_error(caplog):
+    def function(autoloader):
+        if autoloader.host_name == 'unit2':
+            raise ValueError('bug')
+    autoloaders = [Autoloader('unit1', '', ''), Autoloader('unit2', '', '')]
+    assert Fleet.parallel(function, autoloaders) == autoloaders[1:]
+    record = caplog.records()[-1]
+    assert record.message == 'Unexpected error on unit2.'
+    assert record.exc_info[0] is ValueError
+
+
+def test_resolve_patterns(monkeypatch, caplog):
+    monkeypatch.setattr('urllib2.urlopen', fake_urlopen())
+    fleet = Fleet([Autoloader('unit1', '', ''), Autoloader('unit2', '', '')])
+    fleet.connect()
+    assignments, missing = fleet.resolve(['tape[12]', 'nope*', 'tape5'])
+    assert assignments == [['tape1'], ['tape2']]
+    assert missing == ['tape5']
+    messages = [r.message for r in caplog.records()]
+    assert 'No tapes match nope* in any autoloader, skipping.' in messages
@@ -0,0 +1,62 @@
+import json
+
+from tape_bulk_eject import Autoloader, Inventory, Move
+
+
+def test_lookups():
+    inventory = Inventory({'tape1': '1', 'tape2': 'drive', 'tape3': 'mailslot'})
+    assert inventory == {'tape1': '1', 'tape2': 'drive', 'tape3': 'mailslot'}
+    assert {'tape1': '1', 'tape2': 'drive', 'tape3': 'mailslot'} == inventory
+    assert inventory != {'tape1': '1'}
+    assert inventory.tape_at('1') == 'tape1'
+    assert inventory.tape_at('drive') == 'tape2'
+    assert inventory.tape_at('2') is None
+    assert inventory.tape_at('500') is None
+    assert inventory.mailslot == 'tape3'
+    assert json.loads(json.dumps(dict(inventory))) == inventory
+
+    inventory['tape3'] = '2'  # Moves, doesn't duplicate.
+    assert inventory.mailslot is None
+    assert inventory.tape_at('2') == 'tape3'
+
+    inventory['tape4'] = '1'  # Evicts tape1.
+    assert 'tape1' not in inventory
+    assert inventory.tape_at('1') == 'tape4'
+
+    inventory['tape5'] = '120'  # Large libraries grow the array.
+    assert inventory.tape_at('120') == 'tape5'
+    assert inventory.pop('tape5') == '120'
+    assert inventory.tape_at('120') is None
+    assert inventory.pop('tape5', None) is None
+
+    inventory.clear()
+    assert not inventory
+    assert inventory.tape_at('drive') is None
+
+
+def test_diff():
+    inventory = Inventory({'tape1': '1', 'tape2': 'drive', 'tape3': 'mailslot'})
+    newer = {'tape1': 'mailslot', 'tape2': 'drive', 'tape4': '16'}
+    moves = inventory.diff(newer)
+    assert moves == [
+        Move('tape1', '1', 'mailslot'),
+        Move('tape3', 'mailslot', None),
+        Move('tape4', None, '16'),
+    ]
+
+    assert inventory.replace(newer) == moves
+    assert inventory == newer
+    assert inventory.mailslot == 'tape1'
+    assert inventory.tape_at('1') is None
+    assert inventory.replace(newer) == []
+
+
+def test_update_inventory():
+    autoloader = Autoloader('124t.local', 'user', 'pw')
+    moves = autoloader.update_inventory(
+        '<center><img title="tape1" onclick="from_to(slot1)" /></center>')
+    assert moves == [Move('tape1', None, '1')]
+    moves = autoloader.update_inventory(
+        '<center><img title="tape1" onclick="from_to(mailslot)" /></center>')
+    assert moves == [Move('tape1', '1', 'mailslot')]
+    assert autoloader.inventory.mailslot == 'tape1'
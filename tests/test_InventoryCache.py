@@ -0,0 +1,50 @@
+import json
+import StringIO
+import time
+
+from tape_bulk_eject import Autoloader, InventoryCache
+
+
+def test_load_save(monkeypatch, tmpdir):
+    monkeypatch.setattr('os.path.expanduser', lambda _: str(tmpdir))
+    cache = InventoryCache('192.168.0.50', 60)
+    cache_file = tmpdir.join('.pv124t_cache_192.168.0.50.json')
+    assert cache.cache_file == str(cache_file)
+    assert cache.load() is None
+
+    cache_file.write('garbage')
+    assert cache.load() is None
+    assert not cache.loaded
+
+    cache.save({'tape1': '1', 'tape2': 'drive'})
+    assert json.loads(cache_file.read())['inventory'] == {'tape1': '1', 'tape2': 'drive'}
+    assert cache.load() == {'tape1': '1', 'tape2': 'drive'}
+    assert cache.loaded
+    assert not tmpdir.listdir(lambda p: p.basename.endswith('.tmp'))
+
+    cache_file.write(json.dumps({'time': time.time() - 61, 'inventory': {'tape1': '1'}}))
+    assert InventoryCache('192.168.0.50', 60).load() is None
+    cache_file.write(json.dumps({'time': time.time() + 3600, 'inventory': {'tape1': '1'}}))
+    assert InventoryCache('192.168.0.50', 60).load() is None  # Clock went backwards.
+
+
+def test_correct(monkeypatch, tmpdir, caplog):
+    def urlopen(_):
+        html = """<center>
+            <img src="" title="tape1" onclick="from_to(mailslot)" />
+            <img src="" title="tape2" onclick="from_to(slot5)" />
+        </center>"""
+        return StringIO.StringIO(html)
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+
+    cache = InventoryCache('124t.local', 60, str(tmpdir.join('cache.json')))
+    cache.save({'tape1': '1', 'tape2': '2'})
+    autoloader = Autoloader('124t.local', '', '', cache=cache)
+    autoloader.inventory.update(cache.load())
+    autoloader.update_inventory()  # tape1 ejected, tape2 moved through front panel.
+    assert not cache.loaded
+    assert cache.load() == {'tape1': 'mailslot', 'tape2': '5'}
+
+    messages = [r.message for r in caplog.records()]
+    assert 'Cached inventory was stale, corrected: tape1|tape2' in messages
@@ -0,0 +1,41 @@
+import json
+
+from tape_bulk_eject import Journal, Move
+
+
+def test_resume(monkeypatch, tmpdir):
+    monkeypatch.setattr('os.path.expanduser', lambda _: str(tmpdir))
+    journal = Journal('192.168.0.50')
+    journal_file = tmpdir.join('.pv124t_journal_192.168.0.50.json')
+    assert journal.journal_file == str(journal_file)
+    assert journal.resume() is None
+
+    inventory = {'tape1': '1', 'tape2': '9', 'tape3': 'drive'}
+    journal.plan('batch', ['tape1', 'tape2', 'tape3'], [], inventory)
+    journal.issued('tape1', '1', 'mailslot')
+    inventory['tape1'] = 'mailslot'
+    journal.confirmed('tape1', '1', 'mailslot', inventory)
+    journal.issued('tape2', '9', 'mailslot')
+    assert [json.loads(l)['event'] for l in journal_file.readlines()] == [
+        'planned', 'issued', 'confirmed', 'issued']
+
+    resumed = journal.resume()
+    assert resumed == dict(mode='batch', ejects=['tape2', 'tape3'], loads=[],
+                           inventory={'tape1': 'mailslot', 'tape2': '9', 'tape3': 'drive'},
+                           pending=Move('tape2', '9', 'mailslot'))
+
+    # Killed while writing a line.
+    journal_file.write('{"event": "confir', mode='a')
+    assert journal.resume()['ejects'] == ['tape2', 'tape3']
+
+    journal.done()
+    assert journal.resume() is None
+
+    # New batch replaces the old one.
+    journal.plan('rotate', ['tape3'], ['tape4'], {'tape3': 'drive', 'tape4': 'mailslot'})
+    assert len(journal_file.readlines()) == 1
+    journal.issued('tape4', 'mailslot', '1')
+    journal.confirmed('tape4', 'mailslot', '1', {'tape3': 'drive', 'tape4': '1'})
+    resumed = journal.resume()
+    assert resumed['mode'] == 'rotate'
+    assert (resumed['ejects'], resumed['loads'], resumed['pending']) == (['tape3'], [], None)
@@ -0,0 +1,59 @@
+import os
+import signal
+import threading
+import time
+
+from tape_bulk_eject import Inventory, MailslotWaiter, Metrics, RateLimiter
+
+
+def test_sleep(tmpdir):
+    fifo = str(tmpdir.join('fifo'))
+    with MailslotWaiter(fifo=fifo) as waiter:
+        assert os.path.exists(fifo)
+
+        start_time = time.time()
+        assert waiter.sleep(0.1) is False
+        assert time.time() - start_time > 0.09
+
+        waiter.trigger()
+        start_time = time.time()
+        assert waiter.sleep(5) is True
+        assert time.time() - start_time < 1
+        assert waiter.sleep(0.01) is False  # Trigger was consumed.
+
+        threading.Timer(0.05, lambda: os.kill(os.getpid(), signal.SIGUSR1)).start()
+        start_time = time.time()
+        assert waiter.sleep(5) is True
+        assert time.time() - start_time < 1
+
+        with open(fifo, 'w') as handle:
+            handle.write('\n')
+        assert waiter.sleep(5) is True
+        assert waiter.sleep(0.01) is False  # No writers left, shouldn't spin.
+
+    assert signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL
+
+
+def test_wait(monkeypatch):
+    polls = list()
+
+    class FakeAutoloader(object):
+        host_name = 'fake'
+        inventory = Inventory({'tape1': 'mailslot'})
+        metrics = Metrics()
+        rate_limiter = RateLimiter(2, 2)
+
+        def update_inventory(self):
+            polls.append(sleeps[-1])
+            if len(polls) == 4:
+                self.inventory.clear()
+
+    sleeps = list()
+    waiter = MailslotWaiter()
+    monkeypatch.setattr(waiter, 'sleep', lambda t: sleeps.append(t) or len(sleeps) == 3)
+    waiter.wait(FakeAutoloader())
+    waiter.close()
+    assert sleeps == [2, 3, 4.5, 2]  # Third sleep was triggered, schedule resets.
+
+    waiter.wait(FakeAutoloader())  # Mailslot empty, no polling.
+    assert len(sleeps) == 4
@@ -0,0 +1,53 @@
+from tape_bulk_eject import Metrics
+
+
+def test_histogram():
+    metrics = Metrics()
+    for seconds in (0.01, 2, 2, 700):
+        metrics.observe('pv124t_phase_seconds', seconds, phase='move', host='124t')
+    metrics.count('pv124t_requests_total', page='move.cgi')
+    metrics.count('pv124t_requests_total', 2, page='move.cgi')
+
+    summary = metrics.summary()
+    assert summary['counters'] == {
+        'pv124t_requests_total': [{'labels': {'page': 'move.cgi'}, 'value': 3}],
+    }
+    histogram = summary['histograms']['pv124t_phase_seconds'][0]
+    assert histogram['labels'] == {'host': '124t', 'phase': 'move'}
+    assert histogram['count'] == 4
+    assert histogram['sum'] == 704.01
+    assert dict((str(b), v) for b, v in histogram['buckets']) == {
+        '0.05': 1, '0.1': 1, '0.5': 1, '1': 1, '5': 3, '10': 3, '30': 3, '60': 3, '120': 3,
+        '300': 3, '600': 3,
+    }
+
+
+def test_prometheus():
+    metrics = Metrics()
+    metrics.observe('pv124t_run_seconds', 3)
+    metrics.count('pv124t_requests_total', page='say "hi"')
+    assert metrics.prometheus().splitlines() == [
+        '# TYPE pv124t_requests_total counter',
+        'pv124t_requests_total{page="say \\"hi\\""} 1',
+        '# TYPE pv124t_run_seconds histogram',
+        'pv124t_run_seconds_bucket{le="0.05"} 0',
+        'pv124t_run_seconds_bucket{le="0.1"} 0',
+        'pv124t_run_seconds_bucket{le="0.5"} 0',
+        'pv124t_run_seconds_bucket{le="1"} 0',
+        'pv124t_run_seconds_bucket{le="5"} 1',
+        'pv124t_run_seconds_bucket{le="10"} 1',
+        'pv124t_run_seconds_bucket{le="30"} 1',
+        'pv124t_run_seconds_bucket{le="60"} 1',
+        'pv124t_run_seconds_bucket{le="120"} 1',
+        'pv124t_run_seconds_bucket{le="300"} 1',
+        'pv124t_run_seconds_bucket{le="600"} 1',
+        'pv124t_run_seconds_bucket{le="+Inf"} 1',
+        'pv124t_run_seconds_sum 3.0',
+        'pv124t_run_seconds_count 1',
+    ]
+
+
+def test_write(tmpdir, caplog):
+    metrics = Metrics()
+    metrics.write(str(tmpdir.join('missing', 'metrics.json')))
+    assert caplog.records()[-1].message.startswith('Failed to write ')
@@ -0,0 +1,94 @@
+import json
+import time
+
+from tape_bulk_eject import Cancelled, EventLoop, RateLimiter, Return, Sleep
+
+
+def test_not_shared():
+    limiter = RateLimiter(0.05, 0.05)
+    assert limiter.lock_file is None
+    assert limiter.wait() == 0
+    start = time.time()
+    assert 0.04 < limiter.wait() <= 0.05
+    assert time.time() - start >= 0.04
+    limiter.release()
+
+
+def test_lock(tmpdir):
+    state_file = str(tmpdir.join('state.json'))
+    limiter_a = RateLimiter(0.01, 0.01, state_file)
+    limiter_b = RateLimiter(0.01, 0.01, state_file)
+    assert limiter_a.lock_file == state_file + '.lock'
+
+    limiter_a.wait()
+    assert not limiter_b.acquire()  # Other process querying.
+    limiter_a.replied()
+    limiter_a.release()
+    assert json.loads(tmpdir.join('state.json').read()) == {'last_access': limiter_a.last_access}
+
+    assert limiter_b.acquire()
+    assert limiter_b.last_access == limiter_a.last_access
+    assert not limiter_a.acquire()
+    limiter_b.release()
+
+
+def test_queue(tmpdir):
+    """Two processes (separate locks on the same file) take turns and both honor the delay."""
+    state_file = str(tmpdir.join('state.json'))
+    log = list()
+
+    def client(name, limiter):
+        for _ in range(3):
+            yield limiter.wait_async()
+            log.append((name, 'start', time.time()))
+            yield Sleep(0.02)  # Query.
+            log.append((name, 'end', time.time()))
+            limiter.replied()
+            limiter.release()
+        raise Return(None)
+
+    loop = EventLoop()
+    for name in ('a', 'b'):
+        limiter = RateLimiter(0.05, 0.05, state_file)
+        limiter.POLL = 0.01
+        loop.spawn(client(name, limiter))
+    loop.run()
+
+    assert [(n, e) for n, e, _ in log] == [
+        ('a', 'start'), ('a', 'end'), ('b', 'start'), ('b', 'end'),
+        ('a', 'start'), ('a', 'end'), ('b', 'start'), ('b', 'end'),
+        ('a', 'start'), ('a', 'end'), ('b', 'start'), ('b', 'end'),
+    ]
+    for (_, _, end), (_, _, start) in zip(log[1::2], log[2::2]):
+        assert start - end >= 0.045
+
+
+def test_write_state(tmpdir):
+    state_file = tmpdir.join('state.json')
+    state_file.write('{"delay": 20, "last_access": 5}')
+    limiter = RateLimiter(10, 10, str(state_file))
+    limiter.write_state(last_access=6)
+    assert json.loads(state_file.read()) == {'delay': 20, 'last_access': 6}
+
+
+def test_cancel(tmpdir):
+    """Cancelled while sleeping with the lock (another process just queried) releases it."""
+    state_file = str(tmpdir.join('state.json'))
+    limiter_a = RateLimiter(1, 1, state_file)
+    limiter_b = RateLimiter(1, 1, state_file)
+    limiter_b.wait()
+    limiter_b.replied()
+    limiter_b.release()
+
+    def canceller(task):
+        yield Sleep(0.05)
+        assert limiter_a.lock_file and not limiter_b.acquire()  # Sleeping with the lock.
+        task.cancel()
+
+    loop = EventLoop()
+    task = loop.spawn(limiter_a.wait_async())
+    loop.spawn(canceller(task))
+    loop.run()
+    assert isinstance(task.exception, Cancelled)
+    assert limiter_b.acquire()
+    limiter_b.release()
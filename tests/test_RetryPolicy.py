@@ -0,0 +1,35 @@
+import time
+
+from tape_bulk_eject import RetryPolicy
+
+
+def test_delay():
+    policy = RetryPolicy(jitter=0, maximum=100)
+    assert [policy.delay(15, a) for a in range(1, 6)] == [15, 30, 60, 100, 100]
+
+    policy = RetryPolicy(jitter=0.25)
+    delays = [policy.delay(10, 2) for _ in range(100)]
+    assert all(15 <= d <= 20 for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_give_up():
+    now = time.time()
+    assert RetryPolicy().give_up(1000, now - 3600, 300) is None  # Never gives up by default.
+
+    policy = RetryPolicy(attempts=3)
+    assert policy.give_up(2, now, 1) is None
+    assert policy.give_up(3, now, 1) == 'failed 3 times'
+
+    policy = RetryPolicy(tape_deadline=60)
+    assert policy.give_up(1, now - 30, 10) is None
+    assert policy.give_up(1, now - 30, 40) == 'tape deadline of 60 seconds reached'
+
+    policy = RetryPolicy(deadline=60)
+    assert not policy.expired
+    assert policy.give_up(1, now, 10) is None
+    policy.started -= 55
+    assert policy.give_up(1, now, 10) == 'batch deadline of 60 seconds reached'
+    assert not policy.expired
+    policy.started -= 5
+    assert policy.expired
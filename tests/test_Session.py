@@ -0,0 +1,97 @@
+import BaseHTTPServer
+import SocketServer
+import threading
+import urllib2
+
+import pytest
+
+from tape_bulk_eject import Session
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = list()
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.connections.append(self.client_address)
+
+    def do_GET(self):
+        body = 'path={} auth={}'.format(self.path, self.headers.get('Authorization'))
+        if self.path == '/big':
+            body += ' ' * Session.DRAIN_LIMIT
+        self.send_response(404 if self.path == '/missing' else 200)
+        self.send_header('Content-Length', str(len(body)))
+        if self.path == '/close':
+            self.send_header('Connection', 'close')
+            self.close_connection = 1
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    httpd = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    del Handler.connections[:]
+    yield '127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_keep_alive(server):
+    session = Session(server)
+    url = 'http://{}/'.format(server)
+    for path in ('commands.html', 'config_ops.html', 'commands.html'):
+        request = urllib2.Request(url + path, headers={'Authorization': 'Basic abc'})
+        assert session.open(request).read() == 'path=/{} auth=Basic abc'.format(path)
+    assert len(Handler.connections) == 1
+    assert (session.requests, session.connects, session.reconnects) == (3, 1, 0)
+    assert session.saved_seconds > 0
+
+    # Autoloader closes the connection.
+    assert session.open(urllib2.Request(url + 'close')).read() == 'path=/close auth=None'
+    assert session.open(urllib2.Request(url + 'next')).read(4) == 'path'
+    assert session.open(urllib2.Request(url + 'next')).read() == 'path=/next auth=None'
+    assert len(Handler.connections) == 2
+    assert (session.requests, session.connects) == (6, 2)
+
+    # Connection dropped without telling the client.
+    session.connection.sock.close()
+    assert session.open(urllib2.Request(url + 'again')).read() == 'path=/again auth=None'
+    assert (session.requests, session.connects, session.reconnects) == (7, 3, 1)
+
+    with pytest.raises(urllib2.HTTPError) as exc:
+        session.open(urllib2.Request(url + 'missing'))
+    assert exc.value.code == 404
+    session.close()
+
+
+def test_drain_limit(server):
+    session = Session(server)
+    url = 'http://{}/'.format(server)
+    assert session.open(urllib2.Request(url + 'small')).read(4) == 'path'
+    assert session.open(urllib2.Request(url + 'big')).read(4) == 'path'
+    assert len(Handler.connections) == 1
+
+    # Too much left to drain, reconnects instead.
+    assert session.open(urllib2.Request(url + 'next')).read() == 'path=/next auth=None'
+    assert len(Handler.connections) == 2
+    assert (session.requests, session.connects, session.reconnects) == (3, 2, 0)
+    session.close()
+
+
+def test_bad_host():
+    session = Session('i_do_not_exist')
+    with pytest.raises(urllib2.URLError) as exc:
+        session.open(urllib2.Request('http://i_do_not_exist/'))
+    assert str(exc.value).endswith('not known>')
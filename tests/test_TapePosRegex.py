@@ -0,0 +1,62 @@
+import subprocess
+import sys
+
+import pytest
+
+from tape_bulk_eject import HandledError, TapePos, TapePosRegex
+
+HTML = [
+    'This is not HTML.',
+    '<img src="ign" onclick="from_to(slot1)"><center><img src="" title="A" onclick="from_to(drive)">',
+    """
+        <html><head><script type="text/javascript">
+            document.write('<center><img title="script" onclick="from_to(slot9)"></center>');
+        </script><style>img { border: 0; }</style></head><body>
+        <!-- <center><img title="comment" onclick="from_to(slot8)" /></center> -->
+        <img src="ignore.me" title="ignore" onclick="from_to(slot1)" />
+        <CENTER>
+            <IMG SRC="tape.gif" TITLE="00001FA" onClick="from_to(slot1)" />
+            <img onclick='from_to(slot2)' title='00002FA' src='tape.gif'>
+            <img title=00003FA onclick=from_to(slot3) src=tape.gif>
+            <img title = "00004&amp;FA" onclick = "from_to(slot4)">
+            <img title="00005FA>" onclick="from_to(slot5)" alt="a > b">
+            <img title="Empty" onclick="from_to(slot6)" />
+            <img title="000016FA" onclick="from_to(slot16)" /><img title="x" />
+            <img title="000017FA" onclick="from_to(mailslot)" ismap />
+            <img title="000018FA" onclick="from_to(picker)" /><br>
+            <img title="000019FA" onclick="from_to(drive)" />
+        </center>
+        <center><img title="after" onclick="from_to(slot7)" /></center>
+        </body></html>
+    """,
+]
+
+
+def parse(parser_class, html, chunk_size):
+    inventory = dict()
+    parser = parser_class(inventory)
+    for i in range(0, len(html), chunk_size):
+        parser.feed(html[i:i + chunk_size])
+        if parser.done:
+            break
+    return inventory, parser.matched
+
+
+@pytest.mark.parametrize('html', HTML)
+@pytest.mark.parametrize('chunk_size', [1, 7, 100000])
+def test_same_as_html_parser(html, chunk_size):
+    expected = parse(TapePos, html, 100000)
+    actual = parse(TapePosRegex, html, chunk_size)
+    assert actual == expected
+
+
+def test_bad_onclick(caplog):
+    html = '<center><img src="" title="" onclick="x">'
+    with pytest.raises(HandledError):
+        parse(TapePosRegex, html, 5)
+    assert caplog.records()[-1].message == 'Attribute "onclick" in img tag is invalid: x'
+
+
+def test_lazy_import():
+    code = 'import sys, tape_bulk_eject; sys.exit("HTMLParser" in sys.modules)'
+    assert subprocess.call([sys.executable, '-c', code]) == 0
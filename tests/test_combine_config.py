@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from tape_bulk_eject import combine_config, get_arguments, HandledError
@@ -66,9 +68,78 @@ def test_remainder(monkeypatch, tmpdir, caplog):
     pv124t_json.write('{"host": "192.168.0.50", "user": "admin", "pass": "password"}')
     actual = combine_config(args)
     expected = {'host': '192.168.0.50', 'user': 'admin', 'pass': 'password', 'tapes': ['A00001L3']}
+    expected.update(adaptive=True, cache_ttl=60, daemon=None, deadline=None, fifo=None,
+                    history=True, journal=True, keep_alive=True, load=None, log_excerpt=0,
+                    metrics=None, parser='regex', plan=False, prestage=False, record=None,
+                    replay=None, replay_speed=1.0, resume=False, retries=None, rotate=None,
+                    socket=None, tape_deadline=None, textfile=None, units=None)
     assert actual == expected
 
+    args = get_arguments(['-c', 'A00001L3'])
+    actual = combine_config(args)
+    assert actual['adaptive'] is False
+
     args = get_arguments(['A00002L3|A00002L3|A00001L3', 'A00005L3|A00004L3', 'A00003L3'])
     actual = combine_config(args)
     expected['tapes'] = ['A00001L3', 'A00002L3', 'A00003L3', 'A00004L3', 'A00005L3']
     assert actual == expected
+
+    tapes_txt = tmpdir.join('tapes.txt')
+    tapes_txt.write('A00002L3\nA00003L3..A00005L3\n')
+    args = get_arguments(['A00001L3|A0001*', '@' + str(tapes_txt)])
+    actual = combine_config(args)
+    assert actual['tapes'] == ['A00001L3', 'A00002L3', 'A00003L3', 'A00004L3', 'A00005L3',
+                               'A0001*']
+
+    with pytest.raises(HandledError):
+        combine_config(get_arguments(['A00005L3..A00003L3']))
+    assert caplog.records()[-1].message == 'Invalid range of tapes: A00005L3..A00003L3'
+
+    with pytest.raises(HandledError):
+        combine_config(get_arguments(['@' + str(tmpdir.join('missing.txt'))]))
+    expected = 'Failed to read tapes from {}: No such file or directory'.format(
+        tmpdir.join('missing.txt'))
+    assert caplog.records()[-1].message == expected
+
+    args = get_arguments(['-r', 'A00007L3|A00006L3', '-r', 'A00006L3', 'A00001L3'])
+    actual = combine_config(args)
+    assert actual['rotate'] == ['A00006L3', 'A00007L3']
+
+    actual = combine_config(get_arguments(['--resume']))
+    assert actual['resume'] is True
+    assert actual['tapes'] == []
+
+
+def test_units(monkeypatch, tmpdir, caplog):
+    pv124t_json = tmpdir.join('.pv124t.json')
+    monkeypatch.setattr('os.path.expanduser', lambda _: str(tmpdir))
+    args = get_arguments(['A00001L3'])
+
+    pv124t_json.write('{"units": [{"host": "unit1", "user": "admin", "pass": "pw"}, {}]}')
+    with pytest.raises(HandledError):
+        combine_config(args)
+    assert caplog.records()[-1].message == 'Missing key from JSON dict: host'
+
+    pv124t_json.write('{"units": []}')
+    with pytest.raises(HandledError):
+        combine_config(args)
+    assert caplog.records()[-1].message == 'One or more JSON value is empty.'
+
+    units = [dict(host='unit1', user='admin', **{'pass': 'pw'}),
+             dict(host='unit2', user='admin', **{'pass': 'pw2'})]
+    pv124t_json.write(json.dumps({'units': units}))
+    actual = combine_config(args)
+    assert actual['units'] == units
+    assert (actual['host'], actual['user'], actual['pass']) == ('unit1', 'admin', 'pw')
+
+    with pytest.raises(HandledError):
+        combine_config(get_arguments(['-d', '/tmp/sock']))
+    assert caplog.records()[-1].message == 'Daemon mode supports only one autoloader.'
+
+    with pytest.raises(HandledError):
+        combine_config(get_arguments(['-r', 'A00006L3', 'A00001L3']))
+    assert caplog.records()[-1].message == 'Load and rotation modes support only one autoloader.'
+
+    with pytest.raises(HandledError):
+        combine_config(get_arguments(['--resume']))
+    assert caplog.records()[-1].message == 'Resuming supports only one autoloader.'
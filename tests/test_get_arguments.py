@@ -16,3 +16,24 @@ def test(capsys):
     arguments = get_arguments(argv=['-v', 'A00001L3|A00002L3|A00003L3'])
     assert arguments.verbose is True
     assert arguments.tapes == ['A00001L3|A00002L3|A00003L3']
+
+    arguments = get_arguments(argv=['-d', '/tmp/pv124t.sock'])
+    assert arguments.daemon == '/tmp/pv124t.sock'
+    assert arguments.tapes == []
+
+    arguments = get_arguments(argv=['-l', '16'])
+    assert arguments.load == 16
+    assert arguments.tapes == []
+
+    arguments = get_arguments(argv=['-r', 'A00005L3', '-r', 'A00006L3', 'A00001L3'])
+    assert arguments.rotate == ['A00005L3', 'A00006L3']
+    assert arguments.tapes == ['A00001L3']
+
+    arguments = get_arguments(argv=['--resume'])
+    assert arguments.resume is True
+    assert arguments.tapes == []
+
+    with pytest.raises(SystemExit):
+        get_arguments(argv=['--resume', 'A00001L3'])
+    stderr = capsys.readouterr()[1]
+    assert '--resume cannot be combined with tapes' in stderr
@@ -1,8 +1,17 @@
+import json
 import StringIO
+import time
+
+import pytest
 
 from tape_bulk_eject import Autoloader, main
 
 
+@pytest.fixture(autouse=True)
+def home(monkeypatch, tmpdir):
+    monkeypatch.setattr('os.path.expanduser', lambda _: str(tmpdir))
+
+
 def test_nothing_to_do(monkeypatch, caplog):
     def urlopen(_):
         html = '<center><img src="" title="in_mailslot" onclick="from_to(mailslot)" /></center>'
@@ -50,3 +59,112 @@ def test_tape_in_mailslot(monkeypatch, caplog):
     assert not html
     assert 'Tape in mailslot, remove to continue...' in messages
     assert 'Ejected 2 tapes.' in messages
+
+
+def test_plan(monkeypatch, caplog):
+    def urlopen(request):
+        assert not request.get_full_url().endswith('move.cgi')
+        html = """<center>
+            <img src="" title="tape1" onclick="from_to(slot9)" />
+            <img src="" title="tape2" onclick="from_to(drive)" />
+            <img src="" title="tape3" onclick="from_to(slot2)" />
+        </center>"""
+        return StringIO.StringIO(html)
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+
+    main({'tapes': ['tape1', 'tape2', 'tape3'], 'host': '', 'user': '', 'pass': '', 'plan': True})
+    records = caplog.records()
+    messages = [r.message for r in records]
+    assert messages[-4:] == [
+        '1. tape3 from 2',
+        '2. tape1 from 9',
+        '3. tape2 from drive',
+        'Estimated duration: 3 minute(s) plus mailslot waits.',
+    ]
+
+
+def test_dry_run(monkeypatch, tmpdir, caplog):
+    def urlopen(request):
+        assert not request.get_full_url().endswith('move.cgi')
+        html = """<center>
+            <img src="" title="tape1" onclick="from_to(slot9)" />
+            <img src="" title="tape2" onclick="from_to(slot3)" />
+            <img src="" title="tape3" onclick="from_to(slot10)" />
+        </center>"""
+        return StringIO.StringIO(html)
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    config = {'tapes': ['tape1', 'tape2', 'tape3'], 'host': '124t', 'user': '', 'pass': '',
+              'plan': True, 'history': True}
+
+    main(config)
+    messages = [r.message for r in caplog.records()]
+    assert messages[-3:] == [
+        'Estimated duration: 2 minute(s) plus mailslot waits.',
+        'No moves measured on previous runs yet, using default move times.',
+        'Ejecting in barcode order instead would take 2 minute(s) (+0 seconds).',
+    ]
+
+    history_file = tmpdir.join('.pv124t_history_124t.json')
+    assert list(json.loads(history_file.read())) == ['query']
+    history_file.write(json.dumps(dict(query=[1, 10], slot=[20, 10], slot_switch=[50, 10])))
+    main(dict(config, rotate=['tape4']))
+    messages = [r.message for r in caplog.records()]
+    assert messages[-6:] == [
+        '1. tape2 from 3 then load tape4',
+        '2. tape1 from 9',
+        '3. tape3 from 10',
+        'Estimated duration: 3 minute(s) plus mailslot waits.',
+        'Based on 20 move(s) measured on previous runs.',
+        'Ejecting in barcode order instead would take 3 minute(s) (+30 seconds).',
+    ]
+
+
+def test_cache(monkeypatch, tmpdir, caplog):
+    requests = list()
+
+    def urlopen(request):
+        requests.append((request.get_full_url(), request.get_data()))
+        if request.get_full_url().endswith('move.cgi'):
+            return StringIO.StringIO('<center><img title="tape1" onclick="from_to(mailslot)" />'
+                                     '<img title="other" onclick="from_to(slot3)" /></center>')
+        return StringIO.StringIO('<center><img title="tape1" onclick="from_to(slot5)" />'
+                                 '<img title="other" onclick="from_to(slot3)" /></center>')
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    tmpdir.join('.pv124t_cache_124t.json').write(
+        '{"time": %f, "inventory": {"tape1": "3"}}' % time.time()
+    )
+
+    # Stale cache is corrected before moving so the right tape is ejected.
+    main({'tapes': ['tape1'], 'host': '124t', 'user': '', 'pass': '', 'cache_ttl': 60})
+    assert [r[0] for r in requests] == ['http://124t/config_ops.html', 'http://124t/commands.html',
+                                        'http://124t/move.cgi']
+    assert requests[-1][1] == 'from=5&to=18&submit=submit'
+    messages = [r.message for r in caplog.records()]
+    assert 'Cached inventory was stale, corrected: other|tape1' in messages
+
+
+def test_metrics(monkeypatch, tmpdir):
+    def urlopen(request):
+        if request.get_full_url().endswith('move.cgi'):
+            return StringIO.StringIO('<center><img title="tape1" onclick="from_to(mailslot)" /></center>')
+        return StringIO.StringIO('<center><img title="tape1" onclick="from_to(slot3)" /></center>')
+    monkeypatch.setattr('urllib2.urlopen', urlopen)
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    json_file, textfile = tmpdir.join('metrics.json'), tmpdir.join('pv124t.prom')
+
+    main({'tapes': ['tape1'], 'host': '124t', 'user': '', 'pass': '', 'metrics': str(json_file),
+          'textfile': str(textfile)})
+    summary = json.loads(json_file.read())
+    requests = dict((s['labels']['page'], s['value'])
+                    for s in summary['counters']['pv124t_requests_total'])
+    assert requests == {'commands.html': 1, 'move.cgi': 1}
+    phases = sorted(s['labels']['phase'] for s in summary['histograms']['pv124t_phase_seconds'])
+    assert phases == ['move', 'network', 'sleep']
+    assert summary['histograms']['pv124t_run_seconds'][0]['count'] == 1
+
+    text = textfile.read()
+    assert '# TYPE pv124t_phase_seconds histogram\n' in text
+    assert 'pv124t_requests_total{host="124t",page="move.cgi",status="200"} 1\n' in text
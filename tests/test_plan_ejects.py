@@ -0,0 +1,48 @@
+from tape_bulk_eject import DurationHistory, estimate_duration, plan_ejects, plan_loads
+
+
+def test():
+    inventory = {
+        'in_drive': 'drive',
+        'in_mailslot': 'mailslot',
+        'in_picker': 'picker',
+        'slot1': '1',
+        'slot2': '2',
+        'slot9': '9',
+        'slot10': '10',
+        'slot16': '16',
+    }
+    tapes = ['slot16', 'in_drive', 'missing', 'slot2', 'in_mailslot', 'slot10', 'slot9', 'slot1',
+             'in_picker', 'slot1']
+    expected = ['in_picker', 'slot1', 'slot2', 'slot9', 'slot10', 'slot16', 'in_drive']
+    assert plan_ejects(inventory, tapes) == expected
+    assert plan_ejects(inventory, ['missing', 'in_mailslot']) == []
+
+
+def test_estimate_duration():
+    inventory = {'in_drive': 'drive', 'in_picker': 'picker', 'slot1': '1'}
+    assert estimate_duration(inventory, [], 10) == 0
+    assert estimate_duration(inventory, ['slot1'], 10) == 40
+    assert estimate_duration(inventory, ['in_picker', 'slot1', 'in_drive'], 10) == 180
+
+
+def test_estimate_duration_history(tmpdir):
+    inventory = {'in_drive': 'drive', 'slot1': '1', 'slot2': '2', 'slot9': '9'}
+    history = DurationHistory('', str(tmpdir.join('history.json')))
+    assert estimate_duration(inventory, ['slot1'], 10, history) == 40  # Nothing measured yet.
+
+    history.observe('query', 1)
+    history.observe('drive', 60)
+    history.observe('slot', 20)
+    history.observe('slot_switch', 35)
+    assert estimate_duration(inventory, ['slot1', 'slot2'], 10, history) == 30 + 30 + 11
+    assert estimate_duration(inventory, ['slot1', 'slot9', 'slot2'], 10, history) == 30 + 45 + 45 + 22
+    assert estimate_duration(inventory, ['in_drive', 'slot9'], 10, history) == 100 + 11
+
+
+def test_plan_loads():
+    inventory = {'a': '1', 'b': '3', 'c': 'drive', 'd': 'mailslot', 'e': '16'}
+    assert plan_loads(inventory)[:3] == ['2', '4', '5']
+    assert len(plan_loads(inventory)) == 13
+    assert plan_loads(inventory, slots=3) == ['2']
+    assert plan_loads(dict((str(i), str(i)) for i in range(1, 17))) == []
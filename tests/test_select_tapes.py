@@ -0,0 +1,52 @@
+import logging
+import StringIO
+
+import pytest
+
+from tape_bulk_eject import expand_range, Inventory, read_selectors, select_tapes
+
+
+def test_expand_range():
+    assert expand_range('00001FA') == ['00001FA']
+    assert expand_range('00001FA..00001FA') == ['00001FA']
+    assert expand_range('00008FA..00011FA') == ['00008FA', '00009FA', '00010FA', '00011FA']
+    assert expand_range('A00009L3..A00010L3') == ['A00009L3', 'A00010L3']
+    assert len(expand_range('00001FA..00500FA')) == 500
+
+    for selector in ('00001FA..0002FA', '00002FA..00001FA', '00001FA..00001FB', '..00001FA'):
+        with pytest.raises(ValueError):
+            expand_range(selector)
+
+
+def test_read_selectors(tmpdir):
+    tapes_txt = tmpdir.join('tapes.txt')
+    tapes_txt.write('00001FA\n\n00002FA 00003FA|00004FA\n')
+    stdin = StringIO.StringIO('00005FA\n0001*\n')
+    selectors = read_selectors(['00006FA|00007FA', '@' + str(tapes_txt), '-'], stdin)
+    assert next(selectors) == '00006FA'  # Lazy.
+    assert list(selectors) == ['00007FA', '00001FA', '00002FA', '00003FA', '00004FA', '00005FA',
+                               '0001*']
+
+    with pytest.raises(IOError):
+        list(read_selectors(['@' + str(tmpdir.join('missing.txt'))]))
+
+
+def test_match():
+    inventory = Inventory({'00010FA': '1', '00011FA': '2', '00012FB': 'drive', '00020FA': '3'})
+    matches = inventory.match(['0001*', '0001?FA', '*FB', '000[2]*', '9*'])
+    assert matches == {
+        '0001*': ['00010FA', '00011FA', '00012FB'],
+        '0001?FA': ['00010FA', '00011FA'],
+        '*FB': ['00012FB'],
+        '000[2]*': ['00020FA'],
+        '9*': [],
+    }
+
+
+def test_select_tapes(caplog):
+    inventory = Inventory({'00010FA': '1', '00011FA': '2', '00020FA': '3'})
+    logger = logging.getLogger('test_select_tapes')
+    actual = select_tapes(inventory, ['00001FA', '0001*', '00011FA', '9*'], logger)
+    assert actual == ['00001FA', '00010FA', '00011FA']
+    messages = [r.message for r in caplog.records()]
+    assert messages == ['No tapes match 9*, skipping.']
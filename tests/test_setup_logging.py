@@ -1,3 +1,4 @@
+import json
 import logging
 import time
 
@@ -37,3 +38,22 @@ def test(capsys, verbose):
     assert 'Test warning.' in stderr
     assert 'Test error.' in stderr
     assert 'Test critical.' in stderr
+
+
+def test_json(capsys):
+    logger = 'test_logger_json'
+    arguments = type('', (), {'verbose': True, 'log_json': True})
+    setup_logging(arguments, logger)
+
+    log = logging.getLogger(logger)
+    log.debug('Test %s.', 'debug', extra=dict(host='124t', request_id=3))
+    log.error('Test error.')
+    stdout, stderr = capsys.readouterr()
+
+    entry = json.loads(stdout)
+    assert entry.pop('time') > 0
+    assert entry == dict(level='DEBUG', logger=logger, message='Test debug.', host='124t',
+                         request_id=3)
+    entry = json.loads(stderr)
+    assert (entry['level'], entry['message']) == ('ERROR', 'Test error.')
+    assert 'host' not in entry
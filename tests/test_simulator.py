@@ -0,0 +1,248 @@
+import logging
+import os
+import re
+import sys
+import time
+
+import pytest
+
+from tape_bulk_eject import (Autoloader, EventLoop, HandledError, Journal, MailslotWaiter, main,
+                             Session)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'benchmarks'))
+
+from pv124t_simulator import Simulator  # noqa pylint:disable=wrong-import-position
+
+SCALE = 0.002
+
+
+@pytest.fixture
+def simulator(monkeypatch, tmpdir):
+    monkeypatch.setattr('os.path.expanduser', lambda _: str(tmpdir))
+    monkeypatch.setattr(Autoloader, 'DELAY', 5 * SCALE)
+    monkeypatch.setattr(Autoloader, 'DELAY_ERROR', 15 * SCALE)
+    monkeypatch.setattr(MailslotWaiter, 'MAXIMUM', 30 * SCALE)
+    positions = {1: 'tape1', 9: 'tape2', 17: 'tape3'}
+    instance = Simulator(positions, scale=SCALE, drive_lock_seconds=300)
+    instance.host_name = instance.serve()
+    yield instance
+    instance.close()
+
+
+def test_main(simulator, caplog):
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape3', 'tape2', 'tape1'],
+                  keep_alive=True, **{'pass': 'password'})
+    main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'Ejected 3 tapes.' in messages
+    assert any(m.startswith('Failed, drive locked?') for m in messages)
+
+    assert simulator.positions == {18: 'tape3'}
+    assert simulator.ejected == ['tape1', 'tape2']  # Drive last.
+    assert simulator.moves == 3
+    assert simulator.failed_moves > 0
+    assert simulator.unauthorized == 0
+
+
+def test_unauthorized(simulator, caplog):
+    autoloader = Autoloader(simulator.host_name, 'admin', 'wrong')
+    with pytest.raises(HandledError):
+        autoloader.check_creds()
+    assert caplog.records()[-1].message.endswith('Possibly rate limiting or invalid credentials.')
+
+    autoloader = Autoloader(simulator.host_name, 'admin', 'password')
+    autoloader.check_creds()
+    autoloader.update_inventory()
+    assert autoloader.inventory == dict(tape1='1', tape2='9', tape3='drive')
+    autoloader.rate_limiter.delay = 0
+    simulator.min_interval = 1000
+    with pytest.raises(Exception) as exc:
+        autoloader.update_inventory()  # Too soon.
+    assert exc.typename == 'AutoloaderError'
+    assert simulator.unauthorized == 2
+
+
+def test_retries(simulator, caplog):
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape3', 'tape2', 'tape1'],
+                  keep_alive=True, retries=2, **{'pass': 'password'})
+    with pytest.raises(HandledError):
+        main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'Giving up on tape3 (drive_locked): failed 2 times. Continuing with the rest.' in messages
+    assert 'Ejected 2 tapes.' in messages
+    assert messages[-1] == 'Skipped 1 tape: tape3'
+    assert simulator.positions[17] == 'tape3'
+    assert 1 not in simulator.positions and 9 not in simulator.positions
+
+
+@pytest.mark.parametrize('rotate', [False, True])
+def test_lockout(monkeypatch, simulator, caplog, rotate):
+    def connect(autoloader):
+        original(autoloader)
+        simulator.auth = 'Basic changed'  # Password changed on the front panel.
+    original = Autoloader.connect
+    monkeypatch.setattr(Autoloader, 'connect', connect)
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape3', 'tape2', 'tape1'],
+                  rotate=['new1'] if rotate else None, keep_alive=True, **{'pass': 'password'})
+    with pytest.raises(HandledError):
+        main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'Giving up on tape1 and the remaining tapes: locked out or invalid credentials.' in \
+        messages
+    expected = 'Skipped 4 tapes: tape1|tape2|tape3|new1' if rotate else \
+        'Skipped 3 tapes: tape1|tape2|tape3'
+    assert messages[-1] == expected
+    assert simulator.unauthorized == 3  # Two eject attempts then the probe, nothing after.
+    assert simulator.moves == 0
+
+
+def test_resume(simulator, caplog):
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape3', 'tape2', 'tape1'],
+                  keep_alive=True, retries=2, journal=True, **{'pass': 'password'})
+    with pytest.raises(HandledError):
+        main(config)
+    assert simulator.positions[17] == 'tape3'
+
+    simulator.drive_unlock = 0
+    del simulator.positions[17]
+    simulator.positions[5] = 'tape3'  # Moved through the front panel since.
+    main(dict(config, tapes=[], resume=True))
+    messages = [r.message for r in caplog.records()]
+    assert 'Resuming the last batch with 1 tape(s) to eject and 0 to load.' in messages
+    assert 'Ejected 1 tape.' in messages
+    assert simulator.positions == {18: 'tape3'}
+
+    with pytest.raises(HandledError):
+        main(dict(config, tapes=[], resume=True))
+    assert caplog.records()[-1].message == 'Nothing to resume, the last batch finished.'
+
+
+def test_resume_nothing_left(simulator, caplog):
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape3', 'tape2', 'tape1'],
+                  keep_alive=True, retries=2, journal=True, **{'pass': 'password'})
+    with pytest.raises(HandledError):
+        main(config)
+    del simulator.positions[17]  # Taken out through the front panel.
+
+    main(dict(config, tapes=[], resume=True))
+    assert 'No tapes to eject. Nothing to do.' in [r.message for r in caplog.records()]
+    with pytest.raises(HandledError):
+        main(dict(config, tapes=[], resume=True))
+    assert caplog.records()[-1].message == 'Nothing to resume, the last batch finished.'
+
+
+def test_record_replay(simulator, caplog, tmpdir):
+    cassette = str(tmpdir.join('124t.jsonl'))
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape3', 'tape2', 'tape1'],
+                  keep_alive=True, record=cassette, **{'pass': 'password'})
+    main(config)
+    recorded = [re.sub(r'[\d.]+ seconds', 'N seconds', r.message) for r in caplog.records()
+                if r.levelno >= logging.INFO]  # Replay waits are scaled.
+    assert 'Ejected 3 tapes.' in recorded
+    simulator.close()  # Replay must not need the autoloader.
+
+    config.update(host='127.0.0.1:1', record=None, replay=cassette, replay_speed=0)
+    start = time.time()
+    main(config)
+    replayed = [re.sub(r'[\d.]+ seconds', 'N seconds', r.message) for r in caplog.records()
+                if r.levelno >= logging.INFO]
+    assert replayed[len(recorded):] == recorded
+    assert time.time() - start < 0.5
+
+
+def test_prestage(simulator, caplog):
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape1', 'tape2'],
+                  keep_alive=True, prestage=True, **{'pass': 'password'})
+    main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'Staging tape2 from 9 into the picker...' in messages
+    assert 'Ejecting tape2 (0 others left)...' in messages
+    assert simulator.ejected == ['tape1']
+    assert simulator.positions == {17: 'tape3', 18: 'tape2'}
+    assert simulator.moves == 3
+
+
+def test_load(simulator, caplog):
+    simulator.arrivals = ['new1', 'new2']
+    simulator.operator_seconds = 100  # Slower than loading so the operator never beats an eject.
+    config = dict(host=simulator.host_name, user='admin', tapes=[], keep_alive=True, load=2,
+                  **{'pass': 'password'})
+    main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'Insert a tape into the mailslot to continue...' in messages
+    assert 'Loading new1 into slot 2 (1 other left)...' in messages
+    assert 'Loading new2 into slot 3 (0 others left)...' in messages
+    assert 'Loaded 2 tapes.' in messages
+    assert simulator.positions[2] == 'new1'
+    assert simulator.positions[3] == 'new2'
+    assert simulator.unauthorized == 0
+
+
+def test_rotate(simulator, caplog):
+    simulator.arrivals = ['new1', 'new2']
+    simulator.operator_seconds = 100  # Slower than loading so the operator never beats an eject.
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape1', 'tape2'],
+                  rotate=['new1', 'new2', 'tape3'], keep_alive=True, **{'pass': 'password'})
+    main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'tape3 already in autoloader, skipping.' in messages
+    assert 'Swap tape1 in the mailslot for new1.' in messages
+    assert 'Loading new1 into slot 1 (1 other left)...' in messages
+    assert 'Loading new2 into slot 9 (0 others left)...' in messages
+    assert 'Ejected 2 tapes and loaded 2 tapes.' in messages
+    assert simulator.ejected == ['tape1', 'tape2']
+    assert simulator.positions == {1: 'new1', 9: 'new2', 17: 'tape3'}
+    assert simulator.trips == 2  # Each trip swapped an ejected tape for a new one.
+    assert simulator.moves == 4
+
+
+def test_rotate_retries(simulator, caplog):
+    simulator.arrivals = ['new1']
+    simulator.operator_seconds = 100
+    config = dict(host=simulator.host_name, user='admin', tapes=['tape1', 'tape3'],
+                  rotate=['new1'], keep_alive=True, retries=2, journal=True,
+                  **{'pass': 'password'})
+    with pytest.raises(HandledError):
+        main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'Giving up on tape3 (drive_locked): failed 2 times. Continuing with the rest.' in messages
+    assert 'Ejected 1 tape and loaded 1 tape.' in messages
+    assert messages[-1] == 'Skipped 1 tape: tape3'
+    assert Journal(simulator.host_name).resume()['ejects'] == ['tape3']
+
+
+def test_rotate_mailslot_occupied(simulator, caplog):
+    simulator.positions = {1: 'tape1', 18: 'old'}
+    simulator.arrivals = ['new1']
+    config = dict(host=simulator.host_name, user='admin', tapes=['old'], rotate=['new1'],
+                  keep_alive=True, **{'pass': 'password'})
+    main(config)
+    messages = [r.message for r in caplog.records()]
+    assert 'old already in mailslot, skipping.' in messages
+    assert 'old is not a tape to load, remove it from the mailslot.' in messages
+    assert not [m for m in messages if m.startswith('Loading old')]
+    assert 'Ejected 0 tapes and loaded 1 tape.' in messages
+    assert simulator.ejected == ['old']
+    assert sorted(simulator.positions.values()) == ['new1', 'tape1']
+
+
+def test_async(monkeypatch):
+    """One event loop ejects from two autoloaders at once without threads."""
+    monkeypatch.setattr(Autoloader, 'DELAY', 0.01)
+    simulators = [Simulator({1: 'tape1'}, scale=0.002, move_seconds=dict(slot=250)),
+                  Simulator({1: 'tape2'}, scale=0.002, move_seconds=dict(slot=250))]
+    try:
+        loop, tasks = EventLoop(), list()
+        for simulator, tape in zip(simulators, ('tape1', 'tape2')):
+            host_name = simulator.serve()
+            autoloader = Autoloader(host_name, 'admin', 'password', session=Session(host_name))
+            autoloader.inventory[tape] = '1'
+            tasks.append(loop.spawn(autoloader.eject_async(tape)))
+        start = time.time()
+        loop.run()
+        assert time.time() - start < 0.9  # Each move takes 0.5 seconds.
+    finally:
+        for simulator in simulators:
+            simulator.close()
+    assert [t.result for t in tasks] == [True, True]
+    assert [s.positions for s in simulators] == [{18: 'tape1'}, {18: 'tape2'}]